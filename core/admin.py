@@ -0,0 +1,10 @@
+from django.contrib import admin
+from .models import DocumentSequence
+
+
+@admin.register(DocumentSequence)
+class DocumentSequenceAdmin(admin.ModelAdmin):
+    list_display = ['prefix', 'period', 'next_value', 'updated_at']
+    list_filter = ['prefix']
+    search_fields = ['prefix', 'period']
+    readonly_fields = ['updated_at']
@@ -0,0 +1,122 @@
+"""
+Customer and supplier balances maintained from their ledger entries.
+
+Each ledger entry moves its party's current_balance by its signed amount:
+the amount times the sign of its transaction type in the ledger model's
+BALANCE_SIGNS (types without a sign leave the balance alone). Saving an
+entry applies the change as one UPDATE ... SET current_balance =
+current_balance + delta in the same transaction, reversing the stored
+version of an edited entry first, and the ledger apps' post_delete
+receivers take deleted entries back out. Posting therefore costs the same
+however long a party's history is.
+
+Queryset update() calls on ledger entries bypass this; find_balance_drift()
+(``python manage.py verify_balances``) recomputes every balance with one
+grouped query per party type to catch such drift.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models import Case, F, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+
+def signed_amount(ledger_model, transaction_type, amount):
+    return amount * ledger_model.BALANCE_SIGNS.get(transaction_type, 0)
+
+
+def signed_amount_expression(ledger_model, prefix=''):
+    """SQL for the signed amount of ledger entries, ``prefix`` reaching them through a relation"""
+    whens = [
+        When(**{f'{prefix}transaction_type__in': [kind for kind, kind_sign in ledger_model.BALANCE_SIGNS.items() if kind_sign == sign]},
+             then=F(f'{prefix}amount') * sign)
+        for sign in sorted(set(ledger_model.BALANCE_SIGNS.values()))
+    ]
+    return Case(*whens, default=Value(Decimal('0')), output_field=models.DecimalField(max_digits=15, decimal_places=2))
+
+
+def apply_balance_changes(party_model, changes):
+    """Add {party id: Decimal} to the parties' current_balance, in id order so concurrent posts cannot deadlock"""
+    for party_id in sorted(changes):
+        if changes[party_id]:
+            party_model.objects.filter(pk=party_id).update(current_balance=F('current_balance') + changes[party_id])
+
+
+class LedgerBalanceMixin:
+    """
+    For ledger models with a ``BALANCE_PARTY`` foreign key to a model with
+    current_balance and ``BALANCE_SIGNS`` per transaction type: save()
+    posts the entry's effect on the balance atomically.
+    """
+
+    def save(self, *args, **kwargs):
+        party_field = self._meta.get_field(self.BALANCE_PARTY)
+        with transaction.atomic():
+            previous = None
+            if not self._state.adding:
+                previous = type(self).objects.select_for_update().filter(pk=self.pk).values_list(
+                    party_field.attname, 'transaction_type', 'amount'
+                ).first()
+            super().save(*args, **kwargs)
+
+            changes = defaultdict(Decimal)
+            if previous is not None:
+                party_id, transaction_type, amount = previous
+                changes[party_id] -= signed_amount(type(self), transaction_type, amount)
+            changes[getattr(self, party_field.attname)] += signed_amount(type(self), self.transaction_type, self.amount)
+            apply_balance_changes(party_field.related_model, changes)
+
+
+def ledger_entry_deleted(sender, instance, **kwargs):
+    """post_delete receiver: take a deleted entry back out of its party's balance"""
+    party_id = getattr(instance, sender._meta.get_field(sender.BALANCE_PARTY).attname)
+    apply_balance_changes(
+        sender._meta.get_field(sender.BALANCE_PARTY).related_model,
+        {party_id: -signed_amount(sender, instance.transaction_type, instance.amount)},
+    )
+
+
+class BalanceHolderMixin:
+    """
+    For parties whose current_balance is maintained from ledger entries:
+    saving an existing party leaves current_balance out of the UPDATE, so a
+    stale instance (e.g. from an edit form) cannot overwrite postings made
+    since it was loaded. Pass update_fields to write it explicitly.
+    """
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and not args and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'current_balance'
+            ]
+        super().save(*args, **kwargs)
+
+
+def find_balance_drift(party_model, ledger_model):
+    """
+    [(party, ledger balance)] for every party whose current_balance differs
+    from the sum of its ledger entries, computed in one grouped query.
+    """
+    relation = ledger_model._meta.get_field(ledger_model.BALANCE_PARTY).related_query_name()
+    parties = party_model.objects.annotate(
+        ledger_balance=Coalesce(
+            Sum(signed_amount_expression(ledger_model, prefix=f'{relation}__')),
+            Value(Decimal('0')),
+            output_field=models.DecimalField(max_digits=15, decimal_places=2),
+        )
+    ).order_by('pk')
+    cent = Decimal('0.01')
+    return [
+        (party, party.ledger_balance.quantize(cent)) for party in parties
+        if party.current_balance != party.ledger_balance
+    ]
+
+
+def fix_balance_drift(party_model, drift):
+    """
+    Correct the balances found by find_balance_drift() by their difference,
+    so entries posted since the check are kept.
+    """
+    apply_balance_changes(party_model, {party.pk: ledger_balance - party.current_balance for party, ledger_balance in drift})
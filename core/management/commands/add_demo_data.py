@@ -96,7 +96,6 @@ class Command(BaseCommand):
                     'phone': data['phone'],
                     'address': data['address'],
                     'opening_balance': data['opening_balance'],
-                    'current_balance': data['opening_balance']
                 }
             )
             
@@ -163,7 +162,6 @@ class Command(BaseCommand):
                     'phone': data['phone'],
                     'address': data['address'],
                     'opening_balance': data['opening_balance'],
-                    'current_balance': data['opening_balance']
                 }
             )
             
@@ -172,7 +170,7 @@ class Command(BaseCommand):
                 SupplierLedger.objects.create(
                     supplier=supplier,
                     transaction_type='opening_balance',
-                    amount=abs(data['opening_balance']),
+                    amount=data['opening_balance'],
                     description='Opening Balance',
                     transaction_date=timezone.now() - timedelta(days=30),
                     payment_method='cash',
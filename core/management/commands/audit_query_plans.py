@@ -0,0 +1,247 @@
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.contrib.sessions.backends.base import SessionBase
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+
+# Report and list pages with representative filters: (label, url name, GET parameters).
+# {start}/{end} expand to the current month to date.
+AUDIT_TARGETS = [
+    ('Dashboard', 'dashboard', {}),
+    ('Sales orders', 'sales:order_list', {'status': 'delivered'}),
+    ('Sales daily report', 'sales:sales_daily_report', {}),
+    ('Sales monthly report', 'sales:sales_monthly_report', {}),
+    ('Sales customer report', 'sales:sales_customer_report', {'start_date': '{start}', 'end_date': '{end}'}),
+    ('Purchase orders', 'purchases:order_list', {'status': 'goods-received'}),
+    ('Purchase daily report', 'purchases:purchase_daily_report', {}),
+    ('Purchase monthly report', 'purchases:purchase_monthly_report', {}),
+    ('Purchase supplier report', 'purchases:purchase_supplier_report', {'start_date': '{start}', 'end_date': '{end}'}),
+    ('Products', 'stock:product_list', {'search': 'cement'}),
+    ('Stock list', 'stock:stock_list', {}),
+    ('Stock report', 'stock:stock_report', {}),
+    ('Stock valuation', 'stock:stock_valuation_report', {}),
+    ('Expenses', 'expenses:expense_list', {'start_date': '{start}', 'end_date': '{end}'}),
+    ('Customer ledgers', 'customers:ledger_list', {}),
+    ('Supplier ledgers', 'suppliers:ledger_list', {}),
+    ('Sales report', 'reports:sales_report_enhanced', {'start_date': '{start}', 'end_date': '{end}'}),
+    ('Top products', 'reports:top_selling_products', {'start_date': '{start}', 'end_date': '{end}'}),
+    ('Top customers', 'reports:top_selling_customers', {'start_date': '{start}', 'end_date': '{end}'}),
+    ('Receivables', 'reports:accounts_receivable', {}),
+    ('Profit & loss', 'reports:profit_loss', {'start_date': '{start}', 'end_date': '{end}'}),
+]
+
+
+class AuditSession(SessionBase):
+    """In-memory session so views that use messages can run outside the middleware"""
+
+    def exists(self, session_key):
+        return False
+
+    def create(self):
+        self._session_key = None
+
+    def save(self, must_create=False):
+        pass
+
+    def delete(self, session_key=None):
+        pass
+
+    def load(self):
+        return {}
+
+
+class Command(BaseCommand):
+    help = (
+        'Run EXPLAIN on the queries issued by report and list pages, flag full scans '
+        'and temporary sort B-trees, and propose (or --apply) missing model indexes'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--apply',
+            action='store_true',
+            help=(
+                'Create indexes declared on models but missing from the database, then re-time the pages. '
+                'For trying indexes out: this bypasses migrations, which must still be generated with makemigrations'
+            ),
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Timing runs per query; the fastest run is reported (default: 5)',
+        )
+        parser.add_argument(
+            '--target',
+            action='append',
+            dest='targets',
+            help='Only audit pages whose label contains this text (can be repeated)',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            raise CommandError(f'Query plan auditing supports SQLite and PostgreSQL, not {connection.vendor}.')
+
+        targets = AUDIT_TARGETS
+        if options.get('targets'):
+            wanted = [text.lower() for text in options['targets']]
+            targets = [target for target in targets if any(text in target[0].lower() for text in wanted)]
+
+        before = self.audit(targets, options['repeat'])
+        self.print_findings(before)
+
+        missing = self.missing_indexes()
+        if not missing:
+            self.stdout.write(self.style.SUCCESS('All indexes declared on models exist in the database.'))
+        else:
+            self.stdout.write(self.style.WARNING(f'\n{len(missing)} declared indexes are missing from the database:'))
+            with connection.schema_editor(collect_sql=True) as editor:
+                for model, index in missing:
+                    editor.add_index(model, index)
+            for statement in editor.collected_sql:
+                self.stdout.write(f'  {statement}')
+
+        after = None
+        if options['apply'] and missing:
+            with connection.schema_editor() as editor:
+                for model, index in missing:
+                    editor.add_index(model, index)
+            self.stdout.write(self.style.SUCCESS(f'Created {len(missing)} indexes.'))
+            after = self.audit(targets, options['repeat'])
+        elif missing:
+            self.stdout.write(
+                'Create them with makemigrations && migrate (the app ships no migration files); '
+                '--apply adds them directly to try them out, outside migration state.'
+            )
+
+        self.print_timings(before, after)
+
+    def audit(self, targets, repeat):
+        """Render each target page, capture its SELECTs and explain/time them"""
+        results = []
+        for label, url_name, params in targets:
+            try:
+                queries = self.capture_queries(url_name, params)
+            except Exception as exc:
+                results.append({'label': label, 'error': str(exc), 'queries': [], 'findings': [], 'ms': 0.0})
+                continue
+            findings = []
+            total_ms = 0.0
+            for sql, sql_params in queries:
+                for problem in self.explain(sql, sql_params):
+                    findings.append((problem, sql))
+                total_ms += self.time_query(sql, sql_params, repeat)
+            results.append({'label': label, 'error': None, 'queries': queries, 'findings': findings, 'ms': total_ms})
+        return results
+
+    def capture_queries(self, url_name, params):
+        today = timezone.localdate()
+        values = {'start': today.replace(day=1).isoformat(), 'end': today.isoformat()}
+        query = {key: value.format(**values) for key, value in params.items()}
+
+        request = RequestFactory().get(reverse(url_name), query)
+        request.user = User(username='query-audit', is_staff=True, is_superuser=True, is_active=True)
+        request.session = AuditSession()
+        request._messages = FallbackStorage(request)
+
+        captured = []
+
+        def capture(execute, sql, sql_params, many, context):
+            if not many and sql.lstrip().upper().startswith('SELECT'):
+                captured.append((sql, tuple(sql_params or ())))
+            return execute(sql, sql_params, many, context)
+
+        match = resolve(request.path)
+        with connection.execute_wrapper(capture):
+            response = match.func(request, *match.args, **match.kwargs)
+            if hasattr(response, 'render'):
+                response.render()
+
+        # Identical statements are explained and timed once
+        return list(dict.fromkeys(captured))
+
+    def explain(self, sql, sql_params):
+        """Problems in the query plan: full table scans and temporary sorts"""
+        problems = []
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}', sql_params)
+                for row in cursor.fetchall():
+                    detail = row[-1]
+                    if detail.startswith('SCAN ') and 'INDEX' not in detail and 'CONSTANT ROW' not in detail:
+                        problems.append(f'full scan: {detail}')
+                    elif 'USE TEMP B-TREE' in detail:
+                        problems.append(f'temp b-tree: {detail}')
+            else:
+                cursor.execute(f'EXPLAIN {sql}', sql_params)
+                for (line,) in cursor.fetchall():
+                    text = line.strip().lstrip('-> ').strip()
+                    if text.startswith('Seq Scan on'):
+                        problems.append(f'full scan: {text}')
+                    elif text.startswith('Sort'):
+                        problems.append(f'sort: {text}')
+        return problems
+
+    def time_query(self, sql, sql_params, repeat):
+        best = None
+        with connection.cursor() as cursor:
+            for _ in range(max(repeat, 1)):
+                started = time.perf_counter()
+                cursor.execute(sql, sql_params)
+                cursor.fetchall()
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+        return best * 1000
+
+    def missing_indexes(self):
+        """(model, index) pairs declared in Meta.indexes of local apps but absent from the database"""
+        missing = []
+        with connection.cursor() as cursor:
+            existing_tables = set(connection.introspection.table_names(cursor))
+            for model in apps.get_models():
+                if not str(apps.get_app_config(model._meta.app_label).path).startswith(str(settings.BASE_DIR)):
+                    continue
+                table = model._meta.db_table
+                if table not in existing_tables or not model._meta.indexes:
+                    continue
+                constraints = connection.introspection.get_constraints(cursor, table)
+                for index in model._meta.indexes:
+                    if index.name not in constraints:
+                        missing.append((model, index))
+        return missing
+
+    def print_findings(self, results):
+        for result in results:
+            if result['error']:
+                self.stdout.write(self.style.ERROR(f"{result['label']}: could not render ({result['error']})"))
+                continue
+            if not result['findings']:
+                continue
+            self.stdout.write(self.style.WARNING(f"\n{result['label']}:"))
+            for problem, sql in result['findings']:
+                self.stdout.write(f'  {problem}')
+                self.stdout.write(f'    {sql[:160]}')
+
+    def print_timings(self, before, after):
+        self.stdout.write('')
+        header = f"{'Page':<28}{'Queries':>8}{'Flags':>7}{'Before ms':>11}"
+        if after:
+            header += f"{'Flags':>7}{'After ms':>10}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for index, result in enumerate(before):
+            if result['error']:
+                continue
+            line = f"{result['label']:<28}{len(result['queries']):>8}{len(result['findings']):>7}{result['ms']:>11.2f}"
+            if after:
+                later = after[index]
+                line += f"{len(later['findings']):>7}{later['ms']:>10.2f}"
+            self.stdout.write(line)
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.ledgers import find_balance_drift, fix_balance_drift
+from customers.models import Customer, CustomerLedger
+from suppliers.models import Supplier, SupplierLedger
+
+
+class Command(BaseCommand):
+    help = 'Recompute customer and supplier balances from their ledgers and report any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help='Correct drifted balances to their ledger balance',
+        )
+
+    def handle(self, *args, **options):
+        drifted = 0
+        for party_model, ledger_model in ((Customer, CustomerLedger), (Supplier, SupplierLedger)):
+            label = party_model._meta.verbose_name
+            with transaction.atomic():
+                drift = find_balance_drift(party_model, ledger_model)
+                for party, ledger_balance in drift:
+                    self.stdout.write(self.style.WARNING(
+                        f'{label} #{party.pk} {party.name}: stored ৳{party.current_balance}, '
+                        f'ledger ৳{ledger_balance} (difference ৳{party.current_balance - ledger_balance})'
+                    ))
+                if drift and options['fix']:
+                    fix_balance_drift(party_model, drift)
+            drifted += len(drift)
+            self.stdout.write(f'Checked {party_model._meta.verbose_name_plural}: {len(drift)} drifted.')
+
+        if drifted and not options['fix']:
+            raise CommandError(f'{drifted} balances differ from their ledgers; rerun with --fix to correct them.')
+        if drifted:
+            self.stdout.write(self.style.SUCCESS(f'Corrected {drifted} balances.'))
+        else:
+            self.stdout.write(self.style.SUCCESS('All balances match their ledgers.'))
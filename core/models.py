@@ -0,0 +1,25 @@
+from django.db import models
+
+
+class DocumentSequence(models.Model):
+    """
+    Counter behind human-readable document numbers (core.sequences) for one
+    prefix and period: a fiscal year such as '2025', or a day such as
+    '20250114' for prefixes numbered per day. next_value is the first
+    number not yet handed to any worker; workers reserve blocks of numbers
+    from it, so unused numbers of a block leave gaps.
+    """
+    prefix = models.CharField(max_length=10)
+    period = models.CharField(max_length=10)
+    next_value = models.PositiveBigIntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.prefix}-{self.period}: {self.next_value}"
+
+    class Meta:
+        verbose_name = "Document Sequence"
+        verbose_name_plural = "Document Sequences"
+        constraints = [
+            models.UniqueConstraint(fields=['prefix', 'period'], name='unique_document_sequence'),
+        ]
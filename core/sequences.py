@@ -0,0 +1,104 @@
+"""
+Sequential document numbers such as SO-2025-00042 or IS-20250114-00007.
+
+Numbers restart every fiscal year (FISCAL_YEAR_START_MONTH), or every day
+for the prefixes in DOCUMENT_SEQUENCE_DAILY_PREFIXES. Each thread reserves
+DOCUMENT_SEQUENCE_BLOCK_SIZE numbers at a time with a single atomic
+increment of the DocumentSequence row and hands them out from memory, so
+most documents get their number without touching the database and
+concurrent workers never receive the same number. Numbers reserved but not
+used before the worker exits are skipped; the sequence has gaps, never
+duplicates.
+
+A block reserved inside a transaction is kept for later calls only once
+that transaction commits (a transaction.on_commit() callback stores it);
+until then it serves just the number it was reserved for. If the
+transaction rolls back, the increment is undone and the callback discarded
+with it, so the rest of the block is never handed out.
+"""
+import threading
+from functools import partial
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import DocumentSequence
+
+_local = threading.local()
+
+
+def fiscal_year(day):
+    """Fiscal year a date falls in, named by the calendar year it starts in"""
+    start_month = settings.FISCAL_YEAR_START_MONTH
+    return day.year if day.month >= start_month else day.year - 1
+
+
+def sequence_period(prefix, day):
+    if prefix in settings.DOCUMENT_SEQUENCE_DAILY_PREFIXES:
+        return day.strftime('%Y%m%d')
+    return str(fiscal_year(day))
+
+
+class _Block:
+    """Numbers [next_value, end) reserved by this thread"""
+
+    def __init__(self, start, end):
+        self.next_value = start
+        self.end = end
+
+    def usable(self):
+        return self.next_value < self.end
+
+
+def reserve_block(prefix, period, size):
+    """Atomically reserve ``size`` numbers; returns (start, end)"""
+    sequences = DocumentSequence.objects.filter(prefix=prefix, period=period)
+    while True:
+        with transaction.atomic():
+            if sequences.update(next_value=F('next_value') + size):
+                end = sequences.values_list('next_value', flat=True).get()
+                return end - size, end
+        try:
+            with transaction.atomic():
+                DocumentSequence.objects.create(prefix=prefix, period=period, next_value=1 + size)
+            return 1, 1 + size
+        except IntegrityError:
+            # Another worker created the row first; increment it instead
+            continue
+
+
+def next_document_number(prefix, day=None):
+    """
+    Next number for ``prefix`` in the period of ``day`` (default today),
+    formatted as PREFIX-PERIOD-NNNNN.
+    """
+    if isinstance(day, str):
+        day = parse_date(day)
+    day = day or timezone.localdate()
+    period = sequence_period(prefix, day)
+    blocks = getattr(_local, 'blocks', None)
+    if blocks is None:
+        blocks = _local.blocks = {}
+
+    key = (prefix, period)
+    block = blocks.get(key)
+    if block is None or not block.usable():
+        size = max(1, settings.DOCUMENT_SEQUENCE_BLOCK_SIZE)
+        block = _Block(*reserve_block(prefix, period, size))
+        if connection.in_atomic_block:
+            transaction.on_commit(partial(blocks.__setitem__, key, block))
+        else:
+            blocks[key] = block
+
+    value = block.next_value
+    block.next_value += 1
+    digits = settings.DOCUMENT_NUMBER_DIGITS
+    return f"{prefix}-{period}-{value:0{digits}d}"
+
+
+def reset_blocks():
+    """Forget this thread's reserved blocks (numbers left in them are skipped)"""
+    _local.blocks = {}
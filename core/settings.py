@@ -75,6 +75,22 @@ DATABASES = {
     }
 }
 
+# Cache
+# Use Redis when REDIS_URL is set so cached data is shared between workers
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -111,6 +127,36 @@ MEDIA_ROOT = BASE_DIR / 'media'
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Inventory costing method used for valuation and cost of goods sold: 'fifo' or 'average'
+STOCK_COSTING_METHOD = os.getenv('STOCK_COSTING_METHOD', 'fifo')
+
+# Deliveries that would take a product below zero on hand are rejected;
+# set to True to let them through (logged as a warning) instead
+STOCK_ALLOW_NEGATIVE = os.getenv('STOCK_ALLOW_NEGATIVE', 'False').lower() == 'true'
+
+# Reorder suggestions (python manage.py compute_reorder_suggestions): days of
+# sales history read, supplier lead time, days of demand to order beyond the
+# lead time, and the safety stock factor (1.65 ~ 95% service level)
+STOCK_REORDER_LOOKBACK_DAYS = int(os.getenv('STOCK_REORDER_LOOKBACK_DAYS', '730'))
+STOCK_REORDER_LEAD_TIME_DAYS = int(os.getenv('STOCK_REORDER_LEAD_TIME_DAYS', '7'))
+STOCK_REORDER_REVIEW_DAYS = int(os.getenv('STOCK_REORDER_REVIEW_DAYS', '30'))
+STOCK_REORDER_SERVICE_FACTOR = float(os.getenv('STOCK_REORDER_SERVICE_FACTOR', '1.65'))
+
+# Document numbers (core.sequences), e.g. SO-2025-00042: numbering restarts
+# each fiscal year, or each day for the listed prefixes; every worker reserves
+# DOCUMENT_SEQUENCE_BLOCK_SIZE numbers per database round trip
+FISCAL_YEAR_START_MONTH = int(os.getenv('FISCAL_YEAR_START_MONTH', '1'))
+DOCUMENT_SEQUENCE_DAILY_PREFIXES = [prefix for prefix in os.getenv('DOCUMENT_SEQUENCE_DAILY_PREFIXES', 'IS').split(',') if prefix]
+DOCUMENT_SEQUENCE_BLOCK_SIZE = int(os.getenv('DOCUMENT_SEQUENCE_BLOCK_SIZE', '20'))
+DOCUMENT_NUMBER_DIGITS = 5
+
+# Sales invoice PDFs (sales.invoices): letterhead, and the directory rendered
+# invoices are cached in (one file per order version, kept out of MEDIA_ROOT)
+INVOICE_COMPANY_NAME = os.getenv('INVOICE_COMPANY_NAME', 'Sun Electric')
+INVOICE_COMPANY_ADDRESS = os.getenv('INVOICE_COMPANY_ADDRESS', '123 Business Street, City, Country')
+INVOICE_COMPANY_PHONE = os.getenv('INVOICE_COMPANY_PHONE', '+1 234 567 8900')
+INVOICE_PDF_CACHE_DIR = Path(os.getenv('INVOICE_PDF_CACHE_DIR', BASE_DIR / 'invoice_cache'))
+
 # Login/Logout URLs
 LOGIN_URL = '/admin/login/'
 LOGIN_REDIRECT_URL = '/dashboard/'
@@ -0,0 +1,52 @@
+"""
+Test cases for the audit_query_plans management command
+"""
+
+from django.test import TestCase, TransactionTestCase
+from django.core.management import call_command
+from django.db import connection
+from io import StringIO
+
+from purchases.models import PurchaseOrder
+
+
+class AuditQueryPlansCommandTest(TestCase):
+    """Every report and list page is explained and timed"""
+
+    def test_reports_timings_for_every_page(self):
+        out = StringIO()
+        call_command('audit_query_plans', repeat=1, stdout=out)
+        output = out.getvalue()
+
+        self.assertIn('Before ms', output)
+        self.assertIn('Purchase orders', output)
+        self.assertIn('Profit & loss', output)
+        self.assertNotIn('Sales report: could not render', output)
+        self.assertIn('All indexes declared on models exist', output)
+
+
+class AuditQueryPlansApplyTest(TransactionTestCase):
+    """--apply creates declared indexes missing from the database"""
+
+    def status_date_index(self):
+        return next(index for index in PurchaseOrder._meta.indexes if index.fields == ['status', 'order_date'])
+
+    def index_exists(self, index):
+        with connection.cursor() as cursor:
+            return index.name in connection.introspection.get_constraints(cursor, PurchaseOrder._meta.db_table)
+
+    def test_missing_index_is_proposed_and_applied(self):
+        index = self.status_date_index()
+        with connection.schema_editor() as editor:
+            editor.remove_index(PurchaseOrder, index)
+
+        out = StringIO()
+        call_command('audit_query_plans', repeat=1, target=['purchase'], stdout=out)
+        self.assertIn(index.name, out.getvalue())
+        self.assertFalse(self.index_exists(index))
+
+        out = StringIO()
+        call_command('audit_query_plans', repeat=1, target=['purchase'], apply=True, stdout=out)
+        self.assertIn('Created 1 indexes', out.getvalue())
+        self.assertIn('After ms', out.getvalue())
+        self.assertTrue(self.index_exists(index))
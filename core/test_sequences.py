@@ -0,0 +1,124 @@
+"""
+Test cases for block-allocated document number sequences
+"""
+
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.db import connection, transaction
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+import threading
+
+from core.models import DocumentSequence
+from core.sequences import next_document_number, reset_blocks
+from customers.models import Customer
+from purchases.models import PurchaseOrder
+from sales.models import SalesOrder
+from suppliers.models import Supplier
+
+
+@override_settings(FISCAL_YEAR_START_MONTH=1, DOCUMENT_SEQUENCE_DAILY_PREFIXES=['IS'], DOCUMENT_SEQUENCE_BLOCK_SIZE=20)
+class DocumentSequenceTest(TestCase):
+    """Numbers are sequential per prefix and period and reserved in blocks"""
+
+    def setUp(self):
+        reset_blocks()
+
+    def committed_number(self, prefix, day):
+        """Number taken in a transaction of its own that commits"""
+        with self.captureOnCommitCallbacks(execute=True):
+            return next_document_number(prefix, day)
+
+    def test_sequential_numbers(self):
+        day = date(2025, 3, 14)
+        self.assertEqual(self.committed_number('SO', day), 'SO-2025-00001')
+        self.assertEqual(self.committed_number('SO', day), 'SO-2025-00002')
+        self.assertEqual(self.committed_number('PO', day), 'PO-2025-00001')
+        self.assertEqual(self.committed_number('SO', date(2026, 1, 2)), 'SO-2026-00001')
+
+    def test_block_reserved_with_one_round_trip(self):
+        day = date(2025, 3, 14)
+        self.committed_number('SO', day)
+        with self.assertNumQueries(0):
+            numbers = [next_document_number('SO', day) for _ in range(19)]
+        self.assertEqual(numbers[-1], 'SO-2025-00020')
+        self.assertEqual(DocumentSequence.objects.get(prefix='SO').next_value, 21)
+
+        reset_blocks()
+        # Unused numbers of a dropped block are skipped, never reissued
+        self.assertEqual(next_document_number('SO', day), 'SO-2025-00021')
+
+    @override_settings(FISCAL_YEAR_START_MONTH=7)
+    def test_fiscal_year_boundary(self):
+        self.assertEqual(next_document_number('SO', date(2025, 6, 30)), 'SO-2024-00001')
+        self.assertEqual(next_document_number('SO', date(2025, 7, 1)), 'SO-2025-00001')
+
+    def test_daily_prefix(self):
+        self.assertEqual(next_document_number('IS', date(2025, 1, 14)), 'IS-20250114-00001')
+        self.assertEqual(next_document_number('IS', date(2025, 1, 15)), 'IS-20250115-00001')
+
+    def test_block_from_rolled_back_transaction_dropped(self):
+        day = date(2025, 3, 14)
+        try:
+            with transaction.atomic():
+                next_document_number('SO', day)
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertFalse(DocumentSequence.objects.exists())
+        # The reservation was undone with the transaction, so it is made again
+        self.assertEqual(next_document_number('SO', day), 'SO-2025-00001')
+        self.assertEqual(DocumentSequence.objects.get(prefix='SO').next_value, 21)
+
+    def test_block_kept_once_transaction_commits(self):
+        day = date(2025, 3, 14)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertEqual(next_document_number('SO', day), 'SO-2025-00001')
+            # Not committed yet: the next number reserves a block of its own
+            self.assertEqual(next_document_number('SO', day), 'SO-2025-00021')
+        for callback in callbacks:
+            callback()
+        with self.assertNumQueries(0):
+            self.assertEqual(next_document_number('SO', day), 'SO-2025-00022')
+
+    def test_orders_numbered_on_save(self):
+        supplier = Supplier.objects.create(name='Test Supplier')
+        purchase = PurchaseOrder.objects.create(supplier=supplier, order_date=date(2025, 2, 1), expected_date=date(2025, 2, 5))
+        self.assertEqual(purchase.order_number, 'PO-2025-00001')
+
+        customer = Customer.objects.create(name='Test Customer', customer_type='retail')
+        order = SalesOrder.objects.create(customer=customer, order_date=date(2025, 2, 1))
+        instant = SalesOrder.objects.create(customer_name='Walk-in', order_date=date(2025, 2, 1), sales_type='instant')
+        self.assertEqual(order.order_number, 'SO-2025-00001')
+        self.assertEqual(instant.order_number, 'IS-20250201-00001')
+
+        order.save()
+        self.assertEqual(order.order_number, 'SO-2025-00001')
+
+
+@override_settings(DOCUMENT_SEQUENCE_BLOCK_SIZE=5)
+class ConcurrentDocumentSequenceTest(TransactionTestCase):
+    """Parallel workers never receive the same number"""
+
+    def setUp(self):
+        reset_blocks()
+
+    def allocate(self, count):
+        numbers = []
+        try:
+            for _ in range(count):
+                # The in-memory test database cannot take concurrent writes, so calls
+                # take turns; each thread still reserves blocks on its own connection
+                with self.turn:
+                    numbers.append(next_document_number('SO', date(2025, 3, 14)))
+            return numbers
+        finally:
+            reset_blocks()
+            connection.close()
+
+    def test_parallel_workers(self):
+        self.turn = threading.Lock()
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            batches = list(pool.map(self.allocate, [23] * 4))
+        numbers = [number for batch in batches for number in batch]
+        self.assertEqual(len(numbers), len(set(numbers)))
+        self.assertEqual(DocumentSequence.objects.get(prefix='SO').next_value, 1 + 4 * 25)
@@ -7,7 +7,8 @@ from django.utils import timezone
 from datetime import datetime, timedelta
 from customers.models import Customer, CustomerLedger
 from suppliers.models import Supplier, SupplierLedger
-from stock.models import Product, get_low_stock_products
+from stock.models import Product, get_low_stock_alerts
+from stock.costing import get_cost_of_goods_sold
 from sales.models import SalesOrder
 from purchases.models import PurchaseOrder
 from expenses.models import Expense
@@ -70,8 +71,8 @@ class DashboardView(LoginRequiredMixin, TemplateView):
         
         context['total_purchases'] = monthly_purchases
         
-        # Profit margin calculation (simplified)
-        gross_profit = monthly_sales - monthly_purchases
+        # Profit margin calculation from the cost of goods actually sold
+        gross_profit = monthly_sales - get_cost_of_goods_sold(this_month_start, today)
         profit_margin = (gross_profit / monthly_sales * 100) if monthly_sales > 0 else 0
         context['profit_margin'] = round(profit_margin, 2)
         
@@ -79,8 +80,8 @@ class DashboardView(LoginRequiredMixin, TemplateView):
         context['recent_orders'] = SalesOrder.objects.select_related('customer').order_by('-created_at')[:5]
         context['recent_purchases'] = PurchaseOrder.objects.select_related('supplier').order_by('-created_at')[:5]
         
-        # Low stock alerts (calculated dynamically)
-        context['low_stock_alerts'] = get_low_stock_products()[:5]
+        # Low stock alerts (most severe first, briefly cached)
+        context['low_stock_alerts'] = get_low_stock_alerts(limit=5)
         
         # Top customers by balance
         context['top_customers'] = Customer.objects.filter(
@@ -161,5 +162,5 @@ def dashboard_redirect(request):
         'total_products': Product.objects.count(),
         'total_sales': SalesOrder.objects.filter(status='delivered').aggregate(total=Sum('total_amount'))['total'] or 0,
         'recent_orders': SalesOrder.objects.select_related('customer').order_by('-created_at')[:5],
-        'low_stock_alerts': get_low_stock_products()[:5],
+        'low_stock_alerts': get_low_stock_alerts(limit=5),
     })
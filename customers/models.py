@@ -1,10 +1,12 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.utils import timezone
 from decimal import Decimal
 
+from core.ledgers import BalanceHolderMixin, LedgerBalanceMixin
 
-class Customer(models.Model):
+
+class Customer(BalanceHolderMixin, models.Model):
     CUSTOMER_TYPES = [
         ('retail', 'Retail'),
         ('wholesale', 'Wholesale'),
@@ -26,21 +28,23 @@ class Customer(models.Model):
         return f"{self.name} ({self.customer_type})"
     
     def set_opening_balance(self, amount, user=None):
-        """Set opening balance and create ledger entry"""
-        self.opening_balance = amount
-        self.current_balance = amount
-        self.save()
-        
-        # Create opening balance ledger entry
-        CustomerLedger.objects.create(
-            customer=self,
-            transaction_type='opening_balance',
-            amount=amount,
-            description=f"Opening balance set to ৳{amount}",
-            reference="OPENING",
-            transaction_date=timezone.now(),
-            created_by=user
-        )
+        """Set opening balance, replacing the opening balance ledger entry"""
+        with transaction.atomic():
+            self.opening_balance = amount
+            self.save(update_fields=['opening_balance', 'updated_at'])
+
+            # The ledger entries post the change to current_balance
+            CustomerLedger.objects.filter(customer=self, transaction_type='opening_balance').delete()
+            CustomerLedger.objects.create(
+                customer=self,
+                transaction_type='opening_balance',
+                amount=amount,
+                description=f"Opening balance set to ৳{amount}",
+                reference="OPENING",
+                transaction_date=timezone.now(),
+                created_by=user
+            )
+        self.refresh_from_db(fields=['current_balance'])
 
     class Meta:
         verbose_name = "Customer"
@@ -54,7 +58,7 @@ class Customer(models.Model):
         ]
 
 
-class CustomerLedger(models.Model):
+class CustomerLedger(LedgerBalanceMixin, models.Model):
     TRANSACTION_TYPES = [
         ('opening_balance', 'Opening Balance'),
         ('sale', 'Sale'),
@@ -71,6 +75,17 @@ class CustomerLedger(models.Model):
         ('other', 'Other'),
     ]
     
+    # Effect of each transaction type on Customer.current_balance (see core.ledgers);
+    # commission entries are informational
+    BALANCE_PARTY = 'customer'
+    BALANCE_SIGNS = {
+        'opening_balance': 1,
+        'sale': 1,
+        'adjustment': 1,
+        'payment': -1,
+        'return': -1,
+    }
+
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE)
     transaction_type = models.CharField(max_length=20, choices=TRANSACTION_TYPES)
     amount = models.DecimalField(max_digits=15, decimal_places=2)
@@ -88,6 +103,10 @@ class CustomerLedger(models.Model):
         verbose_name = "Customer Ledger"
         verbose_name_plural = "Customer Ledgers"
         ordering = ['-transaction_date', '-id']
+        indexes = [
+            models.Index(fields=['customer', 'transaction_date']),
+            models.Index(fields=['transaction_date']),
+        ]
 
 
 
@@ -0,0 +1,12 @@
+# Take deleted ledger entries back out of Customer.current_balance (core.ledgers);
+# saves post themselves in CustomerLedger.save().
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from core.ledgers import ledger_entry_deleted
+from .models import CustomerLedger
+
+
+@receiver(post_delete, sender=CustomerLedger)
+def unpost_deleted_entry(sender, instance, **kwargs):
+    ledger_entry_deleted(sender, instance)
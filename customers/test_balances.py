@@ -0,0 +1,151 @@
+"""
+Test cases for customer and supplier balances posted from ledger entries
+"""
+
+from io import StringIO
+
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.urls import reverse
+from django.utils import timezone
+from decimal import Decimal
+
+from customers.models import Customer, CustomerLedger
+from suppliers.models import Supplier, SupplierLedger
+
+
+class PartyBalanceTest(TestCase):
+    """Ledger inserts, edits and deletes move current_balance by deltas"""
+
+    def setUp(self):
+        self.customer = Customer.objects.create(name='Rahim Traders', customer_type='retail')
+        self.other = Customer.objects.create(name='Karim Stores', customer_type='retail')
+        self.supplier = Supplier.objects.create(name='Cement Mills')
+
+    def post(self, transaction_type, amount, customer=None):
+        return CustomerLedger.objects.create(
+            customer=customer or self.customer,
+            transaction_type=transaction_type,
+            amount=Decimal(amount),
+            description=transaction_type,
+            transaction_date=timezone.now(),
+        )
+
+    def balance(self, party=None):
+        party = party or self.customer
+        return type(party).objects.get(pk=party.pk).current_balance
+
+    def test_insert(self):
+        self.customer.set_opening_balance(Decimal('200.00'))
+        self.post('sale', '500.00')
+        self.post('payment', '150.00')
+        self.post('return', '50.00')
+        self.post('adjustment', '-25.00')
+        self.post('commission', '30.00')
+        self.assertEqual(self.balance(), Decimal('475.00'))
+
+    def test_update(self):
+        entry = self.post('sale', '500.00')
+        entry.amount = Decimal('300.00')
+        entry.save()
+        self.assertEqual(self.balance(), Decimal('300.00'))
+
+        entry.transaction_type = 'payment'
+        entry.save()
+        self.assertEqual(self.balance(), Decimal('-300.00'))
+
+        entry.customer = self.other
+        entry.save()
+        self.assertEqual(self.balance(), Decimal('0.00'))
+        self.assertEqual(self.balance(self.other), Decimal('-300.00'))
+
+    def test_delete(self):
+        entry = self.post('sale', '500.00')
+        self.post('sale', '100.00')
+        self.post('sale', '70.00', customer=self.other)
+        entry.delete()
+        self.assertEqual(self.balance(), Decimal('100.00'))
+
+        CustomerLedger.objects.all().delete()
+        self.assertEqual(self.balance(), Decimal('0.00'))
+        self.assertEqual(self.balance(self.other), Decimal('0.00'))
+
+    def test_opening_balance_replaces_previous(self):
+        self.post('sale', '500.00')
+        self.customer.set_opening_balance(Decimal('200.00'))
+        self.customer.set_opening_balance(Decimal('100.00'))
+        self.assertEqual(self.customer.current_balance, Decimal('600.00'))
+        self.assertEqual(CustomerLedger.objects.filter(transaction_type='opening_balance').count(), 1)
+
+    def test_stale_party_save_keeps_balance(self):
+        stale = Customer.objects.get(pk=self.customer.pk)
+        self.post('sale', '500.00')
+        stale.phone = '01700000000'
+        stale.save()
+        self.assertEqual(self.balance(), Decimal('500.00'))
+
+    def test_supplier_balance(self):
+        self.supplier.set_opening_balance(Decimal('1000.00'))
+        entry = SupplierLedger.objects.create(
+            supplier=self.supplier, transaction_type='purchase', amount=Decimal('400.00'),
+            description='Cement', transaction_date=timezone.now(),
+        )
+        SupplierLedger.objects.create(
+            supplier=self.supplier, transaction_type='payment', amount=Decimal('600.00'),
+            description='Paid', transaction_date=timezone.now(),
+        )
+        self.assertEqual(self.balance(self.supplier), Decimal('800.00'))
+        entry.delete()
+        self.assertEqual(self.balance(self.supplier), Decimal('400.00'))
+
+    def test_ledger_pages_match_stored_balance(self):
+        self.supplier.set_opening_balance(Decimal('1000.00'))
+        for transaction_type, amount in (('purchase', '400.00'), ('return', '100.00'), ('payment', '250.00'), ('commission', '30.00')):
+            SupplierLedger.objects.create(
+                supplier=self.supplier, transaction_type=transaction_type, amount=Decimal(amount),
+                description=transaction_type, transaction_date=timezone.now(),
+            )
+        self.post('sale', '500.00')
+        self.post('return', '50.00')
+
+        for party, url_name in ((self.supplier, 'suppliers:supplier_ledger_detail'), (self.customer, 'customers:customer_ledger_detail')):
+            response = self.client.get(reverse(url_name, args=[party.pk]))
+            self.assertEqual(response.context['current_balance'], self.balance(party))
+        returned = next(row for row in response.context['transactions'] if row['type'] == 'Return')
+        self.assertEqual((returned['debit'], returned['credit']), (Decimal('0.00'), Decimal('50.00')))
+
+    def test_posting_cost_does_not_grow_with_history(self):
+        def queries_for_one_post():
+            with CaptureQueriesContext(connection) as queries:
+                self.post('sale', '10.00')
+            return len(queries)
+
+        first = queries_for_one_post()
+        for _ in range(20):
+            self.post('sale', '10.00')
+        self.assertEqual(queries_for_one_post(), first)
+
+    def test_verify_balances_command(self):
+        self.post('sale', '500.00')
+        SupplierLedger.objects.create(
+            supplier=self.supplier, transaction_type='purchase', amount=Decimal('400.00'),
+            description='Cement', transaction_date=timezone.now(),
+        )
+        call_command('verify_balances', stdout=StringIO())
+
+        # Queryset updates bypass the postings
+        CustomerLedger.objects.filter(customer=self.customer).update(amount=Decimal('450.00'))
+        stdout = StringIO()
+        with CaptureQueriesContext(connection) as queries:
+            with self.assertRaises(CommandError):
+                call_command('verify_balances', stdout=stdout)
+        self.assertIn('Rahim Traders: stored ৳500.00, ledger ৳450.00', stdout.getvalue())
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('SELECT')]), 2)
+
+        call_command('verify_balances', '--fix', stdout=StringIO())
+        self.assertEqual(self.balance(), Decimal('450.00'))
+        self.assertEqual(self.balance(self.supplier), Decimal('400.00'))
+        call_command('verify_balances', stdout=StringIO())
@@ -4,6 +4,7 @@ from django.urls import reverse_lazy
 from django.contrib import messages
 from django.db.models import Q, Sum
 from decimal import Decimal
+from core.ledgers import signed_amount
 from .models import Customer, CustomerLedger, CustomerCommitment
 from .forms import CustomerForm, CustomerLedgerForm, CustomerCommitmentForm, SetOpeningBalanceForm
 from sales.models import SalesOrder
@@ -95,18 +96,10 @@ class CustomerLedgerDetailView(DetailView):
         # Manual Ledger Entries
         ledger_entries = CustomerLedger.objects.filter(customer=customer).order_by('-transaction_date')
         for entry in ledger_entries:
-            if entry.transaction_type == 'sale':
-                debit = entry.amount
-                credit = Decimal('0.00')
-            elif entry.transaction_type == 'payment':
-                debit = Decimal('0.00')
-                credit = entry.amount
-            elif entry.transaction_type == 'opening_balance':
-                debit = entry.amount if entry.amount > 0 else Decimal('0.00')
-                credit = abs(entry.amount) if entry.amount < 0 else Decimal('0.00')
-            else:
-                debit = entry.amount if entry.amount > 0 else Decimal('0.00')
-                credit = abs(entry.amount) if entry.amount < 0 else Decimal('0.00')
+            # Same effect as on current_balance: payments and returns are credits
+            amount = signed_amount(CustomerLedger, entry.transaction_type, entry.amount)
+            debit = amount if amount > 0 else Decimal('0.00')
+            credit = -amount if amount < 0 else Decimal('0.00')
             
             transactions.append({
                 'date': entry.transaction_date.date(),
@@ -175,9 +168,9 @@ class CustomerLedgerCreateView(CreateView):
         # Save the ledger entry first
         response = super().form_valid(form)
         
-        # Update customer balance
+        # Saving the entry posted it to the customer's balance
         customer = form.instance.customer
-        self.update_customer_balance(customer)
+        customer.refresh_from_db(fields=['current_balance'])
         
         # Add success message
         messages.success(
@@ -187,29 +180,6 @@ class CustomerLedgerCreateView(CreateView):
         )
         
         return response
-    
-    def update_customer_balance(self, customer):
-        """Update customer current balance based on all ledger entries"""
-        from decimal import Decimal
-        
-        # Get all ledger entries for this customer
-        ledger_entries = CustomerLedger.objects.filter(customer=customer)
-        
-        total_balance = Decimal('0.00')
-        for entry in ledger_entries:
-            if entry.transaction_type in ['sale', 'opening_balance']:
-                # These increase the balance (debit)
-                total_balance += entry.amount
-            elif entry.transaction_type in ['payment', 'return']:
-                # These decrease the balance (credit)
-                total_balance -= entry.amount
-            elif entry.transaction_type == 'adjustment':
-                # Adjustments can be positive or negative
-                total_balance += entry.amount
-        
-        # Update customer balance
-        customer.current_balance = total_balance
-        customer.save()
 
 
 
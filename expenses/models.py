@@ -76,4 +76,9 @@ class Expense(models.Model):
     class Meta:
         verbose_name = "Expense"
         verbose_name_plural = "Expenses"
-        ordering = ['-expense_date', '-created_at']
\ No newline at end of file
+        ordering = ['-expense_date', '-created_at']
+        indexes = [
+            models.Index(fields=['expense_date']),
+            models.Index(fields=['category', 'expense_date']),
+            models.Index(fields=['status', 'expense_date']),
+        ]
\ No newline at end of file
@@ -1,9 +1,10 @@
 from django import forms
 from django.forms import inlineformset_factory
+from django.urls import reverse_lazy
 from decimal import Decimal, ROUND_HALF_UP
 from .models import PurchaseOrder, PurchaseOrderItem
 from suppliers.models import Supplier
-from stock.models import Product, ProductCategory, ProductBrand
+from stock.forms import ProductAutocompleteWidget, ProductChoiceField, ProductLineFormSet
 
 
 class RoundedDecimalField(forms.DecimalField):
@@ -60,6 +61,13 @@ class PurchaseOrderForm(forms.ModelForm):
 class PurchaseOrderItemForm(forms.ModelForm):
     """Form for purchase order items"""
     
+    # Searched through the product endpoint instead of rendering every product;
+    # the purchase variants carry cost_price to prefill the unit price
+    product = ProductChoiceField(label='Product', widget=ProductAutocompleteWidget(
+        search_url=reverse_lazy('stock:product_purchase_search_json'),
+        catalog_url=reverse_lazy('stock:product_purchase_catalog_json'),
+    ))
+
     # Override fields to handle decimal places properly
     quantity = RoundedDecimalField(
         max_digits=10,
@@ -86,22 +94,11 @@ class PurchaseOrderItemForm(forms.ModelForm):
     class Meta:
         model = PurchaseOrderItem
         fields = ['product', 'quantity', 'unit_price', 'total_price']
-        widgets = {
-            'product': forms.Select(attrs={'class': 'form-select product-select'}),
-        }
-        labels = {
-            'product': 'Product',
-        }
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.fields['product'].queryset = Product.objects.filter(is_active=True).select_related('category', 'brand')
-        
-        # Add data attributes for JavaScript filtering
-        if 'product' in self.fields:
-            self.fields['product'].widget.attrs.update({
-                'class': 'form-select product-select',
-            })
+        # An existing line keeps its product even if it was deactivated since
+        self.fields['product'].current_product_id = self.instance.product_id
 
     def clean_quantity(self):
         quantity = self.cleaned_data.get('quantity')
@@ -150,6 +147,7 @@ PurchaseOrderItemFormSet = inlineformset_factory(
     PurchaseOrder,
     PurchaseOrderItem,
     form=PurchaseOrderItemForm,
+    formset=ProductLineFormSet,
     fields=['product', 'quantity', 'unit_price', 'total_price'],
     extra=1,
     can_delete=True,
@@ -1,10 +1,23 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from decimal import Decimal
+from collections import defaultdict
+from core.sequences import next_document_number
 from suppliers.models import Supplier
-from stock.models import Product
-import uuid
-from datetime import datetime
+from stock.models import Product, StockBalance, StockMovement, summarize_quantities, diff_quantities
+
+
+def weighted_unit_costs(items):
+    """Quantity-weighted unit price per product id of purchase order items"""
+    quantities = defaultdict(Decimal)
+    values = defaultdict(Decimal)
+    for item in items:
+        quantities[item.product_id] += item.quantity
+        values[item.product_id] += item.quantity * item.unit_price
+    return {
+        product_id: (values[product_id] / quantity).quantize(Decimal('0.01'))
+        for product_id, quantity in quantities.items() if quantity
+    }
 
 
 class PurchaseOrder(models.Model):
@@ -31,47 +44,99 @@ class PurchaseOrder(models.Model):
 
     def save(self, *args, **kwargs):
         if not self.order_number:
-            # Generate unique order number
-            while True:
-                # Create order number with timestamp and random component
-                timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-                random_part = str(uuid.uuid4().hex[:6].upper())
-                self.order_number = f"PO-{timestamp}-{random_part}"
-                
-                # Check if this order number already exists
-                if not PurchaseOrder.objects.filter(order_number=self.order_number).exists():
-                    break
-        
+            self.order_number = next_document_number('PO', self.order_date)
         super().save(*args, **kwargs)
 
+    def stock_quantities(self):
+        """Quantities per product this order adds to stock (only once goods are received)"""
+        if not self.pk or self.status != 'goods-received':
+            return {}
+        return summarize_quantities(self.items.all())
+
+    def receipt_unit_costs(self):
+        """Quantity-weighted unit price per product on this order"""
+        return weighted_unit_costs(self.items.all())
+
+    @property
+    def stock_date(self):
+        """Date this order's stock movements are posted on, here and by StockMovement.rebuild()"""
+        return self.order_date
+
+    def sync_stock(self, before, after=None, refresh_costs=True, before_date=None):
+        """
+        Apply the change in this order's stock effect to the stock balances
+        and post it to the stock movement journal.
+        ``before`` is the result of stock_quantities() taken before the change;
+        ``after`` defaults to the current stock_quantities(). When the stock
+        date changed from ``before_date``, ``before`` is reversed on that date
+        and ``after`` posted on the new one. Without ``refresh_costs`` the
+        caller refreshes last received costs itself.
+        """
+        if after is None:
+            after = self.stock_quantities()
+        changes = diff_quantities(before, after)
+        StockBalance.apply_deltas(received=changes)
+        if before_date is not None and before_date != self.stock_date:
+            postings = [
+                (self.order_number, self.pk, {product_id: -quantity for product_id, quantity in before.items()}, None, before_date),
+                (self.order_number, self.pk, dict(after), self.receipt_unit_costs() if after else None, self.stock_date),
+            ]
+        else:
+            received = any(change > 0 for change in changes.values())
+            postings = [(self.order_number, self.pk, changes, self.receipt_unit_costs() if received else None, self.stock_date)]
+        StockMovement.post_many(StockMovement.PURCHASE, postings)
+        # Prices can change without quantities changing, so refresh every line's product
+        affected = set(before) | set(after)
+        if affected and refresh_costs:
+            StockBalance.refresh_last_received_cost(affected)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            # A deleted received order no longer adds its items to stock
+            before = self.stock_quantities()
+            self.sync_stock(before, after={}, refresh_costs=False)
+            deleted = super().delete(*args, **kwargs)
+            # Only once its items are gone does the previous receipt become the last one
+            if before:
+                StockBalance.refresh_last_received_cost(before)
+            return deleted
+
     def update_inventory_on_status_change(self, old_status, new_status, user=None):
         """
-        Inventory is now calculated in real-time from transaction status.
-        No need to update pre-calculated stock - inventory increases automatically
-        when status changes to 'goods-received' and decreases when cancelled.
+        Update stock balances for a status change whose items did not change.
+        Inventory increases when status changes to 'goods-received' and
+        decreases again when a received order is cancelled.
         """
-        # Real-time inventory calculation is handled by Product.get_realtime_quantity()
-        # which sums purchase orders with status='goods-received' and subtracts sales.
-        # No action needed here - inventory updates automatically based on status.
-        pass
+        if old_status == new_status:
+            return
+        before = summarize_quantities(self.items.all()) if old_status == 'goods-received' else {}
+        self.sync_stock(before)
     
     def receive_goods(self, user=None):
         """Receive goods and update inventory (legacy method for compatibility)"""
-        old_status = self.status
-        self.status = 'goods-received'
-        self.save()
-        self.update_inventory_on_status_change(old_status, 'goods-received', user)
+        with transaction.atomic():
+            old_status = self.status
+            self.status = 'goods-received'
+            self.save()
+            self.update_inventory_on_status_change(old_status, 'goods-received', user)
     
     def cancel_order(self, user=None):
         """Cancel the purchase order"""
-        old_status = self.status
-        self.status = 'canceled'
-        self.save()
-        self.update_inventory_on_status_change(old_status, 'canceled', user)
+        with transaction.atomic():
+            old_status = self.status
+            self.status = 'canceled'
+            self.save()
+            self.update_inventory_on_status_change(old_status, 'canceled', user)
 
     class Meta:
         verbose_name = "Purchase Order"
         verbose_name_plural = "Purchase Orders"
+        indexes = [
+            models.Index(fields=['status', 'order_date']),
+            models.Index(fields=['order_date']),
+            models.Index(fields=['supplier', 'order_date']),
+            models.Index(fields=['created_at']),
+        ]
 
 
 class PurchaseOrderItem(models.Model):
@@ -87,6 +152,9 @@ class PurchaseOrderItem(models.Model):
     class Meta:
         verbose_name = "Purchase Order Item"
         verbose_name_plural = "Purchase Order Items"
+        indexes = [
+            models.Index(fields=['product', 'purchase_order']),
+        ]
 
 
 # GoodsReceipt model removed - simplified to use only PurchaseOrder
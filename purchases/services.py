@@ -0,0 +1,78 @@
+"""
+Saving purchase orders with their lines. Views, imports and APIs create
+and edit orders through save_purchase_order() so the header, lines, total
+and stock posting are written together in one transaction.
+
+transition_purchase_orders() receives or cancels many orders in one go.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+
+from stock.models import StockBalance, StockMovement, summarize_quantities
+from stock.orders import bulk_transition, write_order
+from .models import PurchaseOrder, weighted_unit_costs
+
+# Bulk status changes: target status -> statuses an order may move from
+PURCHASE_TRANSITIONS = {
+    'goods-received': ('purchase-order',),
+    'canceled': ('purchase-order', 'goods-received'),
+}
+
+
+def save_purchase_order(order, lines, user=None):
+    """
+    Create or update ``order`` with ``lines`` (PurchaseOrderItem instances,
+    new or already on the order) as its complete set of items, then post the
+    change in its stock effect. Raises ValidationError for invalid lines, in
+    which case nothing is saved. ``user`` becomes created_by of a new order.
+    """
+    with transaction.atomic():
+        if order._state.adding:
+            before, before_date = {}, None
+            if user is not None and order.created_by_id is None:
+                order.created_by = user
+        else:
+            # Stock effect of the order as stored, before status or items change
+            stored = PurchaseOrder.objects.get(pk=order.pk)
+            before, before_date = stored.stock_quantities(), stored.stock_date
+        write_order(order, lines, 'purchase_order')
+        after = summarize_quantities(lines) if order.status == 'goods-received' else {}
+        order.sync_stock(before, after, before_date=before_date)
+    return order
+
+
+def transition_purchase_orders(order_ids, status, user=None):
+    """
+    Receive ('goods-received') or cancel ('canceled') many purchase orders
+    in one transaction and post their stock in bulk: receipts add stock at
+    the orders' prices, cancelling a received order takes it out again.
+    Orders in another status are reported and left unchanged. Returns
+    bulk_transition()'s per-order report; raises ValueError for an unknown
+    status.
+    """
+    if status not in PURCHASE_TRANSITIONS:
+        raise ValueError(f'Purchase orders cannot be moved to "{status}" in bulk.')
+
+    def post_stock(orders, items):
+        received = defaultdict(Decimal)
+        postings = []
+        stock_dates = dict(PurchaseOrder.objects.filter(pk__in=[pk for pk, _, _ in orders]).values_list('pk', 'order_date'))
+        for pk, order_number, previous in orders:
+            if status == 'goods-received':
+                sign = 1
+            elif previous == 'goods-received':
+                sign = -1
+            else:
+                continue
+            changes = {product_id: sign * quantity for product_id, quantity in summarize_quantities(items[pk]).items()}
+            for product_id, change in changes.items():
+                received[product_id] += change
+            postings.append((order_number, pk, changes, weighted_unit_costs(items[pk]) if sign > 0 else None, stock_dates[pk]))
+        StockBalance.apply_deltas(received=received)
+        StockMovement.post_many(StockMovement.PURCHASE, postings)
+        if received:
+            StockBalance.refresh_last_received_cost(received)
+
+    return bulk_transition(PurchaseOrder, order_ids, status, PURCHASE_TRANSITIONS[status], post_stock)
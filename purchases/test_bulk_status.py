@@ -0,0 +1,61 @@
+"""
+Test cases for bulk purchase order status changes
+"""
+
+import json
+
+from django.test import Client, TestCase
+from django.urls import reverse
+from decimal import Decimal
+
+from stock.models import StockMovement
+from stock.test_balance import StockBalanceTestMixin
+from purchases.models import PurchaseOrder
+from purchases.services import transition_purchase_orders
+
+
+class BulkPurchaseStatusTest(StockBalanceTestMixin, TestCase):
+    """Receiving and cancelling many purchase orders at once"""
+
+    def test_receive_and_cancel(self):
+        orders = [self.create_purchase('10', unit_price='400.00'), self.create_purchase('20', unit_price='450.00')]
+        canceled = self.create_purchase('5')
+        canceled.cancel_order()
+
+        report = transition_purchase_orders([order.pk for order in orders] + [canceled.pk], 'goods-received')
+
+        self.assertEqual([result['changed'] for result in report], [True, True, False])
+        self.assertEqual(self.balance().quantity, Decimal('30'))
+        self.assertEqual(self.balance().last_received_cost, Decimal('450.00'))
+        self.assertEqual(
+            sorted(StockMovement.objects.filter(movement_type=StockMovement.PURCHASE).values_list('quantity', 'unit_cost')),
+            [(Decimal('10'), Decimal('400.00')), (Decimal('20'), Decimal('450.00'))],
+        )
+
+        report = transition_purchase_orders([orders[1].pk], 'canceled')
+        self.assertTrue(report[0]['changed'])
+        self.assertEqual(self.balance().quantity, Decimal('10'))
+        self.assertEqual(self.balance().last_received_cost, Decimal('400.00'))
+
+    def test_json_api(self):
+        order = self.create_purchase('10')
+        response = self.client.post(
+            reverse('purchases:bulk_order_status_json'),
+            data=json.dumps({'orders': [order.pk], 'status': 'goods-received'}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['changed'], 1)
+        self.assertEqual(PurchaseOrder.objects.get(pk=order.pk).status, 'goods-received')
+
+    def test_json_api_requires_csrf_token(self):
+        order = self.create_purchase('10')
+        url = reverse('purchases:bulk_order_status_json')
+        body = json.dumps({'orders': [order.pk], 'status': 'goods-received'})
+        client = Client(enforce_csrf_checks=True)
+        self.assertEqual(client.post(url, data=body, content_type='application/json').status_code, 403)
+
+        client.get(reverse('purchases:order_list'))
+        response = client.post(url, data=body, content_type='application/json',
+                               headers={'X-CSRFToken': client.cookies['csrftoken'].value})
+        self.assertEqual(response.json()['changed'], 1)
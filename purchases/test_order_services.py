@@ -0,0 +1,64 @@
+"""
+Test cases for the purchase order service
+"""
+
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.urls import reverse
+from decimal import Decimal
+from datetime import date
+
+from core.sequences import reset_blocks
+from stock.test_balance import StockBalanceTestMixin
+from purchases.models import PurchaseOrder, PurchaseOrderItem
+from purchases.services import save_purchase_order
+
+
+class PurchaseOrderServiceTest(StockBalanceTestMixin, TestCase):
+    """Purchase orders are written in one pass and received stock is posted"""
+
+    def setUp(self):
+        super().setUp()
+        reset_blocks()
+
+    def line(self, quantity, unit_price='450.00'):
+        return PurchaseOrderItem(product=self.product, quantity=Decimal(quantity), unit_price=Decimal(unit_price))
+
+    def test_received_order_adds_stock(self):
+        order = PurchaseOrder(supplier=self.supplier, order_date=date(2025, 1, 10),
+                              expected_date=date(2025, 1, 15), status='goods-received')
+        save_purchase_order(order, [self.line('10'), self.line('5', '460.00')])
+        order.refresh_from_db()
+        self.assertEqual(order.total_amount, Decimal('6800.00'))
+        self.assertEqual(self.balance().quantity, Decimal('15'))
+
+        order.status = 'canceled'
+        save_purchase_order(order, list(order.items.all()))
+        self.assertEqual(self.balance().quantity, Decimal('0'))
+
+    def test_update_view_receives_goods(self):
+        user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.force_login(user)
+        order = self.create_purchase('8')
+        item = order.items.get()
+        response = self.client.post(reverse('purchases:order_edit', args=[order.pk]), {
+            'supplier': str(self.supplier.pk),
+            'order_date': '2025-01-10',
+            'expected_date': '2025-01-15',
+            'status': 'goods-received',
+            'invoice_id': '',
+            'notes': '',
+            'items-TOTAL_FORMS': '1',
+            'items-INITIAL_FORMS': '1',
+            'items-MIN_NUM_FORMS': '0',
+            'items-MAX_NUM_FORMS': '1000',
+            'items-0-id': str(item.pk),
+            'items-0-product': str(self.product.pk),
+            'items-0-quantity': '9',
+            'items-0-unit_price': '450.00',
+            'items-0-total_price': '4050.00',
+        })
+        self.assertEqual(response.status_code, 302)
+        order.refresh_from_db()
+        self.assertEqual(order.total_amount, Decimal('4050.00'))
+        self.assertEqual(self.balance().quantity, Decimal('9'))
@@ -17,6 +17,8 @@ urlpatterns = [
     path('orders/<int:pk>/', views.PurchaseOrderDetailView.as_view(), name='order_detail'),
     path('orders/<int:pk>/edit/', views.PurchaseOrderUpdateView.as_view(), name='order_edit'),
     path('orders/<int:pk>/delete/', views.PurchaseOrderDeleteView.as_view(), name='order_delete'),
+    path('orders/bulk-status/', views.bulk_order_status, name='bulk_order_status'),
+    path('orders/bulk-status.json', views.bulk_order_status_json, name='bulk_order_status_json'),
     
     # Simplified flow - no separate goods receipts needed
     
@@ -1,17 +1,20 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.contrib import messages
-from django.db import transaction
 from django.http import JsonResponse
 from django.utils import timezone
+from django.views.decorators.http import require_POST
 from .models import PurchaseOrder, PurchaseOrderItem
+from .services import save_purchase_order, transition_purchase_orders, PURCHASE_TRANSITIONS
 from .forms import (
     PurchaseOrderForm, PurchaseOrderItemFormSet, PurchaseOrderSearchForm, PurchaseOrderItemForm
 )
 from suppliers.models import Supplier
-from stock.models import Product, ProductCategory, ProductBrand
+from stock.models import ProductCategory, ProductBrand
 from django.contrib.auth.models import User
+from stock.orders import parse_order_ids
+import json
 import uuid
 
 
@@ -42,6 +45,66 @@ class PurchaseOrderListView(ListView):
         return context
 
 
+# Failed orders spelled out in the bulk status message
+BULK_REPORT_LIMIT = 10
+
+
+@require_POST
+def bulk_order_status(request):
+    """Receive or cancel the orders ticked on the order list, then return to it"""
+    order_ids = parse_order_ids(request.POST.getlist('orders'))
+    status = request.POST.get('status')
+    redirect_to = reverse('purchases:order_list')
+    if request.POST.get('query'):
+        redirect_to += '?' + request.POST['query']
+    if not order_ids or status not in PURCHASE_TRANSITIONS:
+        messages.error(request, "Select the orders and the status to move them to.")
+        return redirect(redirect_to)
+    try:
+        report = transition_purchase_orders(order_ids, status, user=request.user)
+    except Exception as e:
+        messages.error(request, f"Error updating purchase orders: {str(e)}")
+        return redirect(redirect_to)
+
+    changed = sum(1 for result in report if result['changed'])
+    failed = [result for result in report if not result['changed']]
+    if changed:
+        messages.success(request, f"{changed} purchase orders marked as {dict(PurchaseOrder.ORDER_STATUS)[status]}.")
+    if failed:
+        details = '; '.join(f"{result['order_number'] or result['id']}: {result['error']}" for result in failed[:BULK_REPORT_LIMIT])
+        more = f" (and {len(failed) - BULK_REPORT_LIMIT} more)" if len(failed) > BULK_REPORT_LIMIT else ''
+        messages.error(request, f"{len(failed)} purchase orders were not changed. {details}{more}")
+    return redirect(redirect_to)
+
+
+@require_POST
+def bulk_order_status_json(request):
+    """
+    Bulk status API: POST {"orders": [ids], "status": "goods-received" or
+    "canceled"}. Responds with the number changed and a result per order.
+    Send the csrftoken cookie (set by the order list page) in an X-CSRFToken
+    header.
+    """
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        payload = None
+    order_ids = parse_order_ids(payload.get('orders')) if isinstance(payload, dict) else None
+    status = payload.get('status') if isinstance(payload, dict) else None
+    if not order_ids or status not in PURCHASE_TRANSITIONS:
+        return JsonResponse({
+            'error': 'invalid',
+            'message': f"Send order ids in \"orders\" and a status in {sorted(PURCHASE_TRANSITIONS)}.",
+        }, status=400)
+
+    report = transition_purchase_orders(order_ids, status, user=request.user if request.user.is_authenticated else None)
+    return JsonResponse({
+        'status': status,
+        'changed': sum(1 for result in report if result['changed']),
+        'results': report,
+    })
+
+
 class PurchaseOrderDetailView(DetailView):
     model = PurchaseOrder
     template_name = 'purchases/order_detail.html'
@@ -63,37 +126,23 @@ class PurchaseOrderCreateView(CreateView):
         
         context['categories'] = ProductCategory.objects.filter(is_active=True)
         context['brands'] = ProductBrand.objects.filter(is_active=True)
-        context['products'] = Product.objects.filter(is_active=True).select_related('category', 'brand')
         return context
     
     def form_valid(self, form):
-        context = self.get_context_data()
-        formset = context['formset']
-        
-        if formset.is_valid():
-            with transaction.atomic():
-                # Set created_by
-                form.instance.created_by = self.request.user
-                
-                # Save the order first
-                self.object = form.save()
-                
-                # Set the instance for the formset
-                formset.instance = self.object
-                
-                # Save formset
-                formset.save()
-                
-                # Calculate total amount and round to 2 decimal places
-                total_amount = sum(item.total_price for item in self.object.items.all())
-                self.object.total_amount = round(total_amount, 2)
-                self.object.save()
-                
-                messages.success(self.request, f'✅ Purchase Order {self.object.order_number} created successfully!')
-                return redirect(self.success_url)
-        else:
+        formset = PurchaseOrderItemFormSet(self.request.POST, instance=form.instance)
+        if not formset.is_valid():
             messages.error(self.request, '❌ Please correct the errors below.')
             return self.form_invalid(form)
+        
+        try:
+            # Header, lines, total and stock are written in one transaction
+            self.object = save_purchase_order(form.instance, formset.get_lines(), user=self.request.user)
+        except Exception as e:
+            messages.error(self.request, f'❌ Error creating purchase order: {str(e)}')
+            return self.form_invalid(form)
+        
+        messages.success(self.request, f'✅ Purchase Order {self.object.order_number} created successfully!')
+        return redirect(self.success_url)
 
 
 class PurchaseOrderUpdateView(UpdateView):
@@ -108,11 +157,12 @@ class PurchaseOrderUpdateView(UpdateView):
             context['formset'] = PurchaseOrderItemFormSet(self.request.POST, instance=self.object)
         else:
             # For edit view, don't show extra empty forms
-            from .forms import inlineformset_factory
+            from .forms import inlineformset_factory, ProductLineFormSet
             EditFormSet = inlineformset_factory(
                 PurchaseOrder,
                 PurchaseOrderItem,
                 form=PurchaseOrderItemForm,
+                formset=ProductLineFormSet,
                 fields=['product', 'quantity', 'unit_price', 'total_price'],
                 extra=0,  # No extra forms for edit
                 can_delete=True,
@@ -123,48 +173,31 @@ class PurchaseOrderUpdateView(UpdateView):
         
         context['categories'] = ProductCategory.objects.filter(is_active=True)
         context['brands'] = ProductBrand.objects.filter(is_active=True)
-        context['products'] = Product.objects.filter(is_active=True).select_related('category', 'brand')
         return context
     
     def form_valid(self, form):
-        context = self.get_context_data()
-        formset = context['formset']
-        
-        if formset.is_valid():
-            with transaction.atomic():
-                # Store the old status before saving
-                old_status = self.object.status
-                new_status = form.cleaned_data.get('status')
-                
-                # Save the order first
-                response = super().form_valid(form)
-                
-                # Save formset
-                formset.save()
-                
-                # Calculate total amount and round to 2 decimal places
-                total_amount = sum(item.total_price for item in self.object.items.all())
-                self.object.total_amount = round(total_amount, 2)
-                self.object.save()
-                
-                # Update inventory based on status change
-                self.object.update_inventory_on_status_change(old_status, new_status, user=self.request.user)
-                
-                # Show appropriate success message
-                if old_status != new_status:
-                    if new_status == 'goods-received':
-                        messages.success(self.request, f'✅ Purchase Order {self.object.order_number} marked as received! Inventory updated.')
-                    elif new_status == 'canceled':
-                        messages.success(self.request, f'✅ Purchase Order {self.object.order_number} cancelled! Inventory adjusted.')
-                    else:
-                        messages.success(self.request, f'✅ Purchase Order {self.object.order_number} updated successfully!')
-                else:
-                    messages.success(self.request, f'✅ Purchase Order {self.object.order_number} updated successfully!')
-                
-                return response
-        else:
+        formset = PurchaseOrderItemFormSet(self.request.POST, instance=self.object)
+        if not formset.is_valid():
             messages.error(self.request, '❌ Please correct the errors below.')
             return self.form_invalid(form)
+        
+        old_status = form.initial.get('status')
+        new_status = form.cleaned_data.get('status')
+        try:
+            # Updates inventory for both status and item changes
+            self.object = save_purchase_order(form.instance, formset.get_lines())
+        except Exception as e:
+            messages.error(self.request, f'❌ Error updating purchase order: {str(e)}')
+            return self.form_invalid(form)
+        
+        # Show appropriate success message
+        if old_status != new_status and new_status == 'goods-received':
+            messages.success(self.request, f'✅ Purchase Order {self.object.order_number} marked as received! Inventory updated.')
+        elif old_status != new_status and new_status == 'canceled':
+            messages.success(self.request, f'✅ Purchase Order {self.object.order_number} cancelled! Inventory adjusted.')
+        else:
+            messages.success(self.request, f'✅ Purchase Order {self.object.order_number} updated successfully!')
+        return redirect(self.get_success_url())
 
 
 class PurchaseOrderDeleteView(DeleteView):
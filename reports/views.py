@@ -15,8 +15,8 @@ from django.utils.dateparse import parse_date
 
 from .models import ReportLog
 from sales.models import SalesOrder
-from purchases.models import PurchaseOrder
 from stock.models import Product
+from stock.costing import get_cost_of_goods_sold
 from customers.models import Customer
 from expenses.models import Expense
 
@@ -375,11 +375,8 @@ class ProfitLossReportView(LoginRequiredMixin, ListView):
                 order_date__range=[start_date, end_date]
             ).aggregate(total=Sum('total_amount'))['total'] or Decimal('0')
             
-            # Cost of Goods Sold (COGS) - Purchase orders for goods received
-            cost_of_goods_sold = PurchaseOrder.objects.filter(
-                status='goods-received',
-                order_date__range=[start_date, end_date]
-            ).aggregate(total=Sum('total_amount'))['total'] or Decimal('0')
+            # Cost of Goods Sold (COGS) - cost engine's per-line cost of delivered sales
+            cost_of_goods_sold = get_cost_of_goods_sold(start_date, end_date)
             
             # Operating Expenses
             operating_expenses = Expense.objects.filter(
@@ -420,10 +417,7 @@ class ProfitLossReportView(LoginRequiredMixin, ListView):
                 order_date__range=[previous_month_start, previous_month_end]
             ).aggregate(total=Sum('total_amount'))['total'] or Decimal('0')
             
-            previous_cogs = PurchaseOrder.objects.filter(
-                status='goods-received',
-                order_date__range=[previous_month_start, previous_month_end]
-            ).aggregate(total=Sum('total_amount'))['total'] or Decimal('0')
+            previous_cogs = get_cost_of_goods_sold(previous_month_start, previous_month_end)
             
             previous_expenses = Expense.objects.filter(
                 expense_date__range=[previous_month_start, previous_month_end]
@@ -719,10 +713,7 @@ def download_profit_loss_csv(request):
         order_date__range=[start_date, end_date]
     ).aggregate(total=Sum('total_amount'))['total'] or Decimal('0')
     
-    cost_of_goods_sold = PurchaseOrder.objects.filter(
-        status='goods-received',
-        order_date__range=[start_date, end_date]
-    ).aggregate(total=Sum('total_amount'))['total'] or Decimal('0')
+    cost_of_goods_sold = get_cost_of_goods_sold(start_date, end_date)
     
     operating_expenses = Expense.objects.filter(
         expense_date__range=[start_date, end_date]
@@ -1,6 +1,6 @@
 from django.contrib import admin
 from .models import (
-    SalesOrder, SalesOrderItem
+    SalesOrder, SalesOrderItem, DailySalesFact
 )
 
 
@@ -16,3 +16,13 @@ class SalesOrderAdmin(admin.ModelAdmin):
     search_fields = ['order_number', 'customer__name', 'notes']
     readonly_fields = ['created_at', 'updated_at']
     inlines = [SalesOrderItemInline]
+
+
+@admin.register(DailySalesFact)
+class DailySalesFactAdmin(admin.ModelAdmin):
+    list_display = ['date', 'customer', 'product', 'sales_type', 'status', 'quantity', 'amount', 'line_count']
+    list_filter = ['status', 'sales_type', 'date']
+    search_fields = ['customer__name', 'product__name']
+    list_select_related = ['customer', 'product']
+    date_hierarchy = 'date'
+    readonly_fields = ['date', 'customer', 'product', 'sales_type', 'status', 'quantity', 'amount', 'line_count']
@@ -3,7 +3,7 @@ from django.forms import inlineformset_factory
 from decimal import Decimal, ROUND_HALF_UP
 from .models import SalesOrder, SalesOrderItem
 from customers.models import Customer
-from stock.models import Product, ProductCategory, ProductBrand
+from stock.forms import ProductChoiceField, ProductLineFormSet
 
 
 class RoundedDecimalField(forms.DecimalField):
@@ -124,6 +124,9 @@ class InstantSalesForm(forms.ModelForm):
 class SalesOrderItemForm(forms.ModelForm):
     """Form for sales order items"""
     
+    # Searched through the product endpoint instead of rendering every product
+    product = ProductChoiceField(label='Product')
+
     # Override fields to handle decimal places properly
     quantity = RoundedDecimalField(
         max_digits=10,
@@ -150,22 +153,11 @@ class SalesOrderItemForm(forms.ModelForm):
     class Meta:
         model = SalesOrderItem
         fields = ['product', 'quantity', 'unit_price', 'total_price']
-        widgets = {
-            'product': forms.Select(attrs={'class': 'form-select product-select'}),
-        }
-        labels = {
-            'product': 'Product',
-        }
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.fields['product'].queryset = Product.objects.filter(is_active=True).select_related('category', 'brand')
-        
-        # Add data attributes for JavaScript filtering
-        if 'product' in self.fields:
-            self.fields['product'].widget.attrs.update({
-                'class': 'form-select product-select',
-            })
+        # An existing line keeps its product even if it was deactivated since
+        self.fields['product'].current_product_id = self.instance.product_id
 
     def clean_quantity(self):
         quantity = self.cleaned_data.get('quantity')
@@ -214,6 +206,7 @@ SalesOrderItemFormSet = inlineformset_factory(
     SalesOrder,
     SalesOrderItem,
     form=SalesOrderItemForm,
+    formset=ProductLineFormSet,
     fields=['product', 'quantity', 'unit_price', 'total_price'],
     extra=0,  # No extra forms by default
     can_delete=True,
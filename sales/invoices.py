@@ -0,0 +1,229 @@
+"""
+Sales order invoices as PDF, drawn with reportlab.
+
+Rendered invoices are cached on disk under INVOICE_PDF_CACHE_DIR, in a
+directory per order id with one file named after the order's updated_at. Every edit saves the order
+header (status changes and item edits included), which moves updated_at
+and so makes the old file unreachable; it is removed the next time the
+invoice is rendered.
+
+render_invoice_batch() writes many invoices at once for month-end
+reprints: a zip of per-order PDFs rendered across a process pool (reusing
+the cache), or one merged PDF drawn page after page in this process.
+"""
+import os
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import mm
+from reportlab.pdfgen import canvas
+
+from .models import SalesOrder
+
+PAGE_WIDTH, PAGE_HEIGHT = A4
+MARGIN = 18 * mm
+ROW_HEIGHT = 6.5 * mm
+# Right edges of the amount columns; product text runs from MARGIN
+COLUMNS = (('Qty', 118 * mm), ('Unit Price', 148 * mm), ('Amount', PAGE_WIDTH - MARGIN))
+BATCH_CHUNK_SIZE = 100
+
+
+def format_amount(value):
+    return f'Tk {value:,.2f}'
+
+
+def format_quantity(value):
+    text = f'{value:,.2f}'
+    return text.rstrip('0').rstrip('.')
+
+
+def invoice_queryset():
+    return SalesOrder.objects.select_related('customer').prefetch_related('items__product__unit_type')
+
+
+def invoice_cache_path(order):
+    return Path(settings.INVOICE_PDF_CACHE_DIR) / str(order.pk) / f"{order.updated_at.strftime('%Y%m%d%H%M%S%f')}.pdf"
+
+
+def draw_items_header(pdf, y):
+    pdf.setFillColor(colors.HexColor('#495057'))
+    pdf.rect(MARGIN, y - 2 * mm, PAGE_WIDTH - 2 * MARGIN, ROW_HEIGHT, stroke=0, fill=1)
+    pdf.setFillColor(colors.white)
+    pdf.setFont('Helvetica-Bold', 9)
+    pdf.drawString(MARGIN + 2 * mm, y, 'Product')
+    for label, right in COLUMNS:
+        pdf.drawRightString(right - 2 * mm, y, label)
+    pdf.setFillColor(colors.black)
+    return y - ROW_HEIGHT
+
+
+def draw_invoice(pdf, order):
+    """Draw ``order`` on ``pdf`` starting a new page, continuing over as many pages as its items need"""
+    pdf.setFillColor(colors.HexColor('#2c3e50'))
+    pdf.rect(0, PAGE_HEIGHT - 28 * mm, PAGE_WIDTH, 28 * mm, stroke=0, fill=1)
+    pdf.setFillColor(colors.white)
+    pdf.setFont('Helvetica-Bold', 20)
+    pdf.drawCentredString(PAGE_WIDTH / 2, PAGE_HEIGHT - 17 * mm, 'INVOICE')
+
+    y = PAGE_HEIGHT - 40 * mm
+    pdf.setFillColor(colors.black)
+    pdf.setFont('Helvetica-Bold', 11)
+    pdf.drawString(MARGIN, y, settings.INVOICE_COMPANY_NAME)
+    if order.customer_id:
+        customer_lines = [order.customer.name, order.customer.address or 'Address not provided',
+                          f"Phone: {order.customer.phone or 'Not provided'}"]
+    else:
+        customer_lines = [order.customer_name or 'Anonymous Customer']
+    pdf.drawString(PAGE_WIDTH / 2, y, 'Bill To')
+    pdf.setFont('Helvetica', 9)
+    company_lines = [settings.INVOICE_COMPANY_ADDRESS, f'Phone: {settings.INVOICE_COMPANY_PHONE}']
+    for offset, line in enumerate(company_lines, start=1):
+        pdf.drawString(MARGIN, y - offset * 5 * mm, line)
+    for offset, line in enumerate(customer_lines, start=1):
+        pdf.drawString(PAGE_WIDTH / 2, y - offset * 5 * mm, str(line)[:60])
+
+    y -= 24 * mm
+    details = [
+        ('Invoice No', order.order_number),
+        ('Date', order.order_date.strftime('%b %d, %Y')),
+        ('Status', order.get_status_display()),
+    ]
+    if order.delivery_date:
+        details.append(('Delivery Date', order.delivery_date.strftime('%b %d, %Y')))
+    for index, (label, value) in enumerate(details):
+        x = MARGIN + index * (PAGE_WIDTH - 2 * MARGIN) / len(details)
+        pdf.setFont('Helvetica-Bold', 9)
+        pdf.drawString(x, y, label)
+        pdf.setFont('Helvetica', 9)
+        pdf.drawString(x, y - 5 * mm, str(value))
+
+    y = draw_items_header(pdf, y - 15 * mm)
+    pdf.setFont('Helvetica', 9)
+    for item in order.items.all():
+        if y < MARGIN + 2 * ROW_HEIGHT:
+            pdf.showPage()
+            y = draw_items_header(pdf, PAGE_HEIGHT - MARGIN)
+            pdf.setFont('Helvetica', 9)
+        pdf.drawString(MARGIN + 2 * mm, y, f'{item.product.name} ({item.product.unit_type.code})'[:70])
+        values = (format_quantity(item.quantity), format_amount(item.unit_price), format_amount(item.total_price))
+        for (_, right), value in zip(COLUMNS, values):
+            pdf.drawRightString(right - 2 * mm, y, value)
+        pdf.setStrokeColor(colors.HexColor('#e9ecef'))
+        pdf.line(MARGIN, y - 2 * mm, PAGE_WIDTH - MARGIN, y - 2 * mm)
+        y -= ROW_HEIGHT
+
+    pdf.setFont('Helvetica-Bold', 11)
+    pdf.drawString(COLUMNS[0][1], y - 4 * mm, 'Total')
+    pdf.drawRightString(PAGE_WIDTH - MARGIN - 2 * mm, y - 4 * mm, format_amount(order.total_amount))
+    pdf.setFont('Helvetica', 8)
+    pdf.setFillColor(colors.grey)
+    pdf.drawCentredString(
+        PAGE_WIDTH / 2, MARGIN / 2,
+        f"Thank you for your business! | Generated: {timezone.localtime().strftime('%b %d, %Y %I:%M %p')}",
+    )
+    pdf.showPage()
+
+
+def render_invoices_pdf(orders, title='Invoices'):
+    """One PDF (bytes) with the invoices of ``orders``, each starting on a new page"""
+    buffer = BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    pdf.setTitle(title)
+    pdf.setAuthor(settings.INVOICE_COMPANY_NAME)
+    for order in orders:
+        draw_invoice(pdf, order)
+    pdf.save()
+    return buffer.getvalue()
+
+
+def cached_invoice_path(order):
+    """
+    Path of ``order``'s invoice PDF, rendering it into the cache unless the
+    current version is already there. Load ``order`` from invoice_queryset().
+    """
+    path = invoice_cache_path(order)
+    if path.exists():
+        return path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    content = render_invoices_pdf([order], title=f'Invoice {order.order_number}')
+    # Written under a temporary name and renamed, so readers never see half a file
+    handle, temporary = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    with os.fdopen(handle, 'wb') as output:
+        output.write(content)
+    os.replace(temporary, path)
+    for stale in path.parent.glob('*.pdf'):
+        if stale != path:
+            stale.unlink(missing_ok=True)
+    return path
+
+
+def get_invoice_pdf(order):
+    """Invoice PDF (bytes) of ``order``, from the cache when it has not changed since"""
+    return cached_invoice_path(order).read_bytes()
+
+
+def cache_invoices(order_ids):
+    """{order id: (order_number, cache path)} of the given orders, rendering any not cached"""
+    return {
+        order.pk: (order.order_number, str(cached_invoice_path(order)))
+        for order in invoice_queryset().filter(pk__in=order_ids)
+    }
+
+
+def cache_invoices_in_worker(order_ids):
+    """Process pool task: cache_invoices() on the worker's own connection"""
+    try:
+        return cache_invoices(order_ids)
+    finally:
+        connections.close_all()
+
+
+def render_invoice_batch(orders, output, fmt='zip', workers=None):
+    """
+    Write the invoices of ``orders`` (a SalesOrder queryset) to ``output``
+    (a path or binary file) as a zip of per-order PDFs ('zip') or one merged
+    PDF ('pdf'), by order date. Zip entries are rendered by ``workers``
+    processes (default: CPU count; 1 renders in this process) and cached.
+    Returns the number of invoices written.
+    """
+    if fmt not in ('zip', 'pdf'):
+        raise ValueError(f'Unknown invoice batch format: {fmt}')
+    order_ids = list(orders.order_by('order_date', 'order_number').values_list('pk', flat=True))
+
+    if fmt == 'pdf':
+        merged = invoice_queryset().filter(pk__in=order_ids).order_by('order_date', 'order_number')
+        content = render_invoices_pdf(merged.iterator(chunk_size=BATCH_CHUNK_SIZE))
+        if hasattr(output, 'write'):
+            output.write(content)
+        else:
+            Path(output).write_bytes(content)
+        return len(order_ids)
+
+    chunks = [order_ids[start:start + BATCH_CHUNK_SIZE] for start in range(0, len(order_ids), BATCH_CHUNK_SIZE)]
+    workers = min(workers or os.cpu_count() or 1, len(chunks))
+    invoices = {}
+    if workers <= 1:
+        for chunk in chunks:
+            invoices.update(cache_invoices(chunk))
+    else:
+        # Forked workers must not share this process's database connections;
+        # spawned ones load Django before unpickling their task
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+            for chunk in pool.map(cache_invoices_in_worker, chunks):
+                invoices.update(chunk)
+
+    with zipfile.ZipFile(output, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for order_id in order_ids:
+            order_number, path = invoices[order_id]
+            archive.write(path, f'{order_number}.pdf')
+    return len(order_ids)
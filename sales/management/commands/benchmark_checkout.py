@@ -0,0 +1,120 @@
+import statistics
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, transaction
+
+from purchases.models import PurchaseOrder, PurchaseOrderItem
+from sales.models import SalesOrder
+from sales.services import checkout_instant_sale, CheckoutError
+from stock.models import Product, UnitType, StockBalance
+from suppliers.models import Supplier
+
+
+class Command(BaseCommand):
+    help = (
+        'Post many instant-sale checkouts for scratch products from parallel tills and report '
+        'latency percentiles. Every checkout is sent twice with the same idempotency key to check '
+        'that retries never double-post. Each till thread uses its own database connection. '
+        'Writes to the configured database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tills', type=int, default=20, help='Parallel tills (default: 20)')
+        parser.add_argument('--sales', type=int, default=500, help='Checkouts to post (default: 500)')
+        parser.add_argument('--lines', type=int, default=5, help='Cart lines per checkout (default: 5)')
+        parser.add_argument('--keep', action='store_true', help='Keep the scratch products and sales')
+
+    def handle(self, *args, **options):
+        if min(options['tills'], options['sales'], options['lines']) < 1:
+            raise CommandError('--tills, --sales and --lines must be positive')
+
+        products = self.create_fixtures(options['lines'], stock=options['sales'])
+        carts = [
+            (uuid.uuid4().hex, {'items': [{'product': product.pk, 'quantity': '1'} for product in products]})
+            for _ in range(options['sales'])
+        ]
+        try:
+            started = time.perf_counter()
+            requests = carts + carts
+            queues = [requests[index::options['tills']] for index in range(options['tills'])]
+            with ThreadPoolExecutor(max_workers=options['tills']) as pool:
+                results = [result for till in pool.map(self.till, queues) for result in till]
+            elapsed = time.perf_counter() - started
+
+            latencies = sorted(latency for latency, _ in results)
+            outcomes = [outcome for _, outcome in results]
+            counts = {outcome: outcomes.count(outcome) for outcome in ('posted', 'replayed', 'rejected', 'error')}
+            p50 = statistics.median(latencies) * 1000
+            p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)] * 1000
+            self.stdout.write(
+                f"{len(results)} checkouts ({options['lines']} lines) from {options['tills']} tills in {elapsed:.2f}s "
+                f"({len(results) / elapsed:.1f}/s): p50 {p50:.1f} ms, p95 {p95:.1f} ms; "
+                f"{counts['posted']} posted, {counts['replayed']} replayed, "
+                f"{counts['rejected']} rejected, {counts['error']} database errors"
+            )
+
+            sales = SalesOrder.objects.filter(idempotency_key__in=[key for key, _ in carts]).count()
+            if sales != counts['posted'] or sales > len(carts):
+                raise CommandError(f'{sales} sales stored for {len(carts)} distinct checkouts.')
+            on_hand = set(StockBalance.objects.filter(product__in=products).values_list('quantity', flat=True))
+            if on_hand != {Decimal(options['sales'] - sales)}:
+                raise CommandError('Stock balances do not match the posted sales.')
+            self.stdout.write(self.style.SUCCESS('No checkout was posted twice.'))
+        finally:
+            if not options['keep']:
+                self.delete_fixtures(products)
+
+    def create_fixtures(self, lines, stock):
+        tag = uuid.uuid4().hex[:8].upper()
+        today = date.today()
+        with transaction.atomic():
+            unit, _ = UnitType.objects.get_or_create(code='pcs', defaults={'name': 'Pieces'})
+            products = [
+                Product.objects.create(name=f'Benchmark {tag} {index}', unit_type=unit, selling_price=Decimal('10.00'))
+                for index in range(lines)
+            ]
+            supplier = Supplier.objects.create(name=f'Benchmark {tag}')
+            purchase = PurchaseOrder.objects.create(supplier=supplier, order_date=today, expected_date=today)
+            PurchaseOrderItem.objects.bulk_create([
+                PurchaseOrderItem(
+                    purchase_order=purchase, product=product,
+                    quantity=Decimal(stock), unit_price=Decimal('5.00'), total_price=Decimal(stock) * 5,
+                )
+                for product in products
+            ])
+            purchase.receive_goods()
+        return products
+
+    def till(self, requests):
+        """Checkouts of one till in turn on its own connection: [(seconds, outcome)]"""
+        results = []
+        try:
+            for idempotency_key, cart in requests:
+                started = time.perf_counter()
+                try:
+                    _, created = checkout_instant_sale(cart, idempotency_key=idempotency_key)
+                    outcome = 'posted' if created else 'replayed'
+                except CheckoutError:
+                    outcome = 'rejected'
+                except DatabaseError:
+                    outcome = 'error'
+                results.append((time.perf_counter() - started, outcome))
+        finally:
+            connection.close()
+        return results
+
+    def delete_fixtures(self, products):
+        with transaction.atomic():
+            orders = SalesOrder.objects.filter(items__product__in=products)
+            purchases = PurchaseOrder.objects.filter(items__product__in=products)
+            supplier_ids = set(purchases.values_list('supplier_id', flat=True))
+            # Queryset deletes skip the stock postings of the orders' delete()
+            SalesOrder.objects.filter(pk__in=list(orders.values_list('pk', flat=True))).delete()
+            PurchaseOrder.objects.filter(pk__in=list(purchases.values_list('pk', flat=True))).delete()
+            Product.objects.filter(pk__in=[product.pk for product in products]).delete()
+            Supplier.objects.filter(pk__in=supplier_ids).delete()
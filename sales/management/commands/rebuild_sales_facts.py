@@ -0,0 +1,25 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from sales.models import DailySalesFact
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily sales facts behind the sales reports from the sales orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', type=date.fromisoformat,
+                            help='First order date to rebuild (YYYY-MM-DD), defaults to the first order')
+        parser.add_argument('--to', dest='date_to', type=date.fromisoformat,
+                            help='Last order date to rebuild (YYYY-MM-DD), defaults to the last order')
+
+    def handle(self, *args, **options):
+        date_from, date_to = options['date_from'], options['date_to']
+        if date_from and date_to and date_from > date_to:
+            raise CommandError('--from must not be after --to')
+        self.stdout.write('Rebuilding daily sales facts...')
+        count = DailySalesFact.rebuild(date_from, date_to)
+        self.stdout.write(
+            self.style.SUCCESS(f'Wrote {count} daily sales facts.')
+        )
@@ -0,0 +1,44 @@
+import time
+from datetime import date
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from sales.invoices import render_invoice_batch
+from sales.models import SalesOrder
+
+
+class Command(BaseCommand):
+    help = 'Render the invoices of sales orders in a date range into a zip of PDFs or one merged PDF'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', type=date.fromisoformat, required=True,
+                            help='First order date (YYYY-MM-DD)')
+        parser.add_argument('--to', dest='date_to', type=date.fromisoformat, required=True,
+                            help='Last order date (YYYY-MM-DD)')
+        parser.add_argument('--output', help='Output file (default: invoices-FROM-TO.zip or .pdf)')
+        parser.add_argument(
+            '--format',
+            choices=['zip', 'pdf'],
+            default='zip',
+            help='zip: one PDF per order, rendered in parallel and cached; pdf: one merged PDF (default: zip)',
+        )
+        parser.add_argument('--workers', type=int, help='Rendering processes for zip output (default: CPU count)')
+        parser.add_argument('--include-cancelled', action='store_true', help='Also render cancelled orders')
+
+    def handle(self, *args, **options):
+        if options['date_from'] > options['date_to']:
+            raise CommandError('--from must not be after --to')
+        if options['workers'] is not None and options['workers'] < 1:
+            raise CommandError('--workers must be at least 1')
+
+        orders = SalesOrder.objects.filter(order_date__range=(options['date_from'], options['date_to']))
+        if not options['include_cancelled']:
+            orders = orders.exclude(status='cancel')
+        output = Path(options['output'] or f"invoices-{options['date_from']}-{options['date_to']}.{options['format']}")
+
+        started = time.perf_counter()
+        count = render_invoice_batch(orders, output, fmt=options['format'], workers=options['workers'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Rendered {count} invoices to {output} in {time.perf_counter() - started:.1f}s.')
+        )
@@ -1,8 +1,12 @@
-from django.db import models
+from collections import defaultdict
+from django.db import models, transaction
+from django.db.models import Case, Count, F, Sum, Value, When
 from django.contrib.auth.models import User
+from django.utils import timezone
 from decimal import Decimal
+from core.sequences import next_document_number
 from customers.models import Customer
-from stock.models import Product
+from stock.models import Product, StockBalance, StockMovement, summarize_quantities, diff_quantities
 
 
 class SalesOrder(models.Model):
@@ -26,6 +30,7 @@ class SalesOrder(models.Model):
     status = models.CharField(max_length=20, choices=ORDER_STATUS, default='order')
     total_amount = models.DecimalField(max_digits=15, decimal_places=2, default=0)
     notes = models.TextField(blank=True)
+    idempotency_key = models.CharField(max_length=64, unique=True, null=True, blank=True, editable=False, help_text="Client key of a checkout request; a retry with the same key returns this order")
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -34,30 +39,99 @@ class SalesOrder(models.Model):
         customer_name = self.customer.name if self.customer else self.customer_name or "Anonymous"
         return f"SO-{self.order_number} - {customer_name}"
 
+    def save(self, *args, **kwargs):
+        if not self.order_number:
+            prefix = 'IS' if self.sales_type == 'instant' else 'SO'
+            self.order_number = next_document_number(prefix, self.order_date)
+        super().save(*args, **kwargs)
+
+    def stock_quantities(self):
+        """Quantities per product this order takes out of stock (only once delivered)"""
+        if not self.pk or self.status != 'delivered':
+            return {}
+        return summarize_quantities(self.items.all())
+
+    @property
+    def stock_date(self):
+        """Date this order's stock movements are posted on, here and by StockMovement.rebuild()"""
+        return self.delivery_date or self.order_date
+
+    def sync_stock(self, before, after=None, before_date=None):
+        """
+        Apply the change in this order's stock effect to the stock balances
+        and post it to the stock movement journal.
+        ``before`` is the result of stock_quantities() taken before the change;
+        ``after`` defaults to the current stock_quantities(). When the stock
+        date changed from ``before_date``, ``before`` is reversed on that date
+        and ``after`` posted on the new one.
+        """
+        if after is None:
+            after = self.stock_quantities()
+        changes = diff_quantities(before, after)
+        # Raises InsufficientStockError rather than delivering stock that isn't there
+        StockBalance.apply_deltas(delivered=changes, prevent_negative=True)
+        if before_date is not None and before_date != self.stock_date:
+            postings = [
+                (self.order_number, self.pk, dict(before), None, before_date),
+                (self.order_number, self.pk, {product_id: -quantity for product_id, quantity in after.items()}, None, self.stock_date),
+            ]
+        else:
+            postings = [(self.order_number, self.pk, {product_id: -change for product_id, change in changes.items()}, None, self.stock_date)]
+        StockMovement.post_many(StockMovement.SALE, postings)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            # A deleted delivered order no longer takes its items out of stock
+            self.sync_stock(self.stock_quantities(), after={})
+            facts = DailySalesFact.for_orders([self.pk])
+            deleted = super().delete(*args, **kwargs)
+            DailySalesFact.post(facts, {})
+            return deleted
+
     def mark_delivered(self, user=None):
         """
         Mark order as delivered.
-        Inventory is calculated in real-time - no need to update pre-calculated stock.
-        Inventory decreases automatically when status changes to 'delivered'.
+        Inventory decreases when status changes to 'delivered'.
+        The status flips with a conditional UPDATE, so of two concurrent
+        requests only one delivers; returns False if the order was no longer
+        open. Raises InsufficientStockError (rolling back, and leaving this
+        instance as it was) when stock is short.
         """
-        if self.status == 'order':
-            self.status = 'delivered'
-            self.save()
-            
-            # Low stock alerts are now calculated dynamically based on min_stock_level
-            # No need to create/store alerts - they're computed in real-time
-    
+        if self.status != 'order':
+            return False
+        return self._claim_status('delivered')
+
     def cancel_order(self, user=None):
         """
         Cancel the order.
-        Inventory is calculated in real-time - cancelling a delivered order
-        automatically restores inventory because it's no longer counted in the calculation.
+        Cancelling a delivered order restores its quantities to inventory.
+        Claimed with a conditional UPDATE like mark_delivered(), so concurrent
+        cancels restore stock once; returns False if the order had already
+        moved on.
         """
-        if self.status in ['order', 'delivered']:
-            self.status = 'cancel'
-            self.save()
-            
-            # No need to manually update stock - real-time calculation handles it automatically
+        if self.status not in ['order', 'delivered']:
+            return False
+        return self._claim_status('cancel')
+
+    def _claim_status(self, status):
+        """Move the order from its current status to ``status`` unless another request got there first"""
+        previous, previous_updated_at = self.status, self.updated_at
+        try:
+            with transaction.atomic():
+                # First statement is a write: SQLite takes its write lock up front
+                now = timezone.now()
+                claimed = SalesOrder.objects.filter(pk=self.pk, status=previous).update(status=status, updated_at=now)
+                if not claimed:
+                    self.refresh_from_db(fields=['status', 'updated_at'])
+                    return False
+                before = self.stock_quantities()
+                self.status, self.updated_at = status, now
+                self.sync_stock(before)
+                DailySalesFact.post_status_change({self.pk: previous})
+        except BaseException:
+            self.status, self.updated_at = previous, previous_updated_at
+            raise
+        return True
 
     class Meta:
         verbose_name = "Sales Order"
@@ -66,6 +140,7 @@ class SalesOrder(models.Model):
         indexes = [
             models.Index(fields=['order_date']),
             models.Index(fields=['status']),
+            models.Index(fields=['status', 'order_date']),
             models.Index(fields=['customer']),
             models.Index(fields=['sales_type']),
             models.Index(fields=['created_at']),
@@ -78,6 +153,7 @@ class SalesOrderItem(models.Model):
     quantity = models.DecimalField(max_digits=10, decimal_places=2)
     unit_price = models.DecimalField(max_digits=15, decimal_places=2)
     total_price = models.DecimalField(max_digits=15, decimal_places=2)
+    cost_amount = models.DecimalField(max_digits=15, decimal_places=2, null=True, blank=True, help_text="Cost of goods sold, set by stock.costing once delivered")
 
     def __str__(self):
         return f"{self.sales_order.order_number} - {self.product.name}"
@@ -88,6 +164,169 @@ class SalesOrderItem(models.Model):
         indexes = [
             models.Index(fields=['sales_order']),
             models.Index(fields=['product']),
+            models.Index(fields=['product', 'sales_order']),
         ]
 
 
+class DailySalesFact(models.Model):
+    """
+    Sales order lines summed per order date, customer, product, sales type
+    and status, for the sales reports. Kept current by the order posting
+    paths in the same transaction: they snapshot an order's facts with
+    for_orders() before a change and post() the difference afterwards,
+    like sync_stock() does for stock. Rebuild with
+    ``python manage.py rebuild_sales_facts``.
+    """
+    KEY_FIELDS = ('date', 'customer_id', 'product_id', 'sales_type', 'status')
+
+    date = models.DateField()
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, null=True, blank=True, help_text="Empty for walk-in sales")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    sales_type = models.CharField(max_length=20, choices=SalesOrder.SALES_TYPE)
+    status = models.CharField(max_length=20, choices=SalesOrder.ORDER_STATUS)
+    quantity = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    amount = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    line_count = models.IntegerField(default=0, help_text="Order lines summed into this row")
+
+    def __str__(self):
+        return f"{self.date} {self.product_id} {self.status}: {self.amount}"
+
+    @staticmethod
+    def summarize(rows, statuses=None):
+        """{key: (quantity, amount, lines)} from _order_lines() rows, ``statuses`` ({order id: status}) overriding theirs"""
+        statuses = statuses or {}
+        facts = defaultdict(lambda: [Decimal('0'), Decimal('0'), 0])
+        for order_id, order_date, customer_id, product_id, sales_type, status, quantity, amount in rows:
+            fact = facts[(order_date, customer_id, product_id, sales_type, statuses.get(order_id, status))]
+            fact[0] += quantity
+            fact[1] += amount
+            fact[2] += 1
+        return {key: tuple(fact) for key, fact in facts.items()}
+
+    @classmethod
+    def _order_lines(cls, order_ids):
+        return list(SalesOrderItem.objects.filter(sales_order_id__in=list(order_ids)).values_list(
+            'sales_order_id', 'sales_order__order_date', 'sales_order__customer_id', 'product',
+            'sales_order__sales_type', 'sales_order__status', 'quantity', 'total_price',
+        ))
+
+    @classmethod
+    def for_orders(cls, order_ids, statuses=None):
+        """
+        The facts of the stored orders as {(date, customer id, product id,
+        sales type, status): (quantity, amount, lines)}; ``statuses``
+        ({order id: status}) stands in for the stored status of those orders.
+        """
+        return cls.summarize(cls._order_lines(order_ids), statuses)
+
+    @classmethod
+    def for_lines(cls, order, lines):
+        """The facts of ``order`` with ``lines`` (its saved SalesOrderItems), without a query"""
+        return cls.summarize([
+            (order.pk, order.order_date, order.customer_id, line.product_id, order.sales_type, order.status,
+             line.quantity, line.total_price)
+            for line in lines
+        ])
+
+    @classmethod
+    def post(cls, before, after):
+        """
+        Apply the difference between two fact snapshots in the caller's
+        transaction: missing rows are inserted empty (skipping any a
+        concurrent posting just added), then one UPDATE adds the F() deltas
+        to every changed row: two queries for up to 500 changed rows, however
+        many orders and lines they sum.
+        """
+        changes = {}
+        for key in set(before) | set(after):
+            old = before.get(key, (Decimal('0'), Decimal('0'), 0))
+            new = after.get(key, (Decimal('0'), Decimal('0'), 0))
+            delta = tuple(new_value - old_value for new_value, old_value in zip(new, old))
+            if any(delta):
+                changes[key] = delta
+        if not changes:
+            return
+        with transaction.atomic(savepoint=False):
+            cls.objects.bulk_create(
+                [cls(**dict(zip(cls.KEY_FIELDS, key))) for key in changes],
+                batch_size=500,
+                ignore_conflicts=True,
+            )
+            keys = sorted(changes, key=str)
+            for start in range(0, len(keys), 500):
+                batch = {key: models.Q(**dict(zip(cls.KEY_FIELDS, key))) for key in keys[start:start + 500]}
+
+                def delta_of(index, output_field):
+                    return Case(
+                        *[When(match, then=Value(changes[key][index])) for key, match in batch.items()],
+                        default=Value(0), output_field=output_field,
+                    )
+
+                matches = models.Q()
+                for match in batch.values():
+                    matches |= match
+                cls.objects.filter(matches).update(
+                    quantity=F('quantity') + delta_of(0, models.DecimalField(max_digits=15, decimal_places=2)),
+                    amount=F('amount') + delta_of(1, models.DecimalField(max_digits=15, decimal_places=2)),
+                    line_count=F('line_count') + delta_of(2, models.IntegerField()),
+                )
+
+    @classmethod
+    def post_status_change(cls, previous):
+        """Move the facts of orders whose status was just changed from ``previous`` ({order id: status})"""
+        rows = cls._order_lines(previous)
+        cls.post(cls.summarize(rows, previous), cls.summarize(rows))
+
+    @classmethod
+    def rebuild(cls, date_from=None, date_to=None):
+        """
+        Recompute the facts from the orders, for order dates in the range
+        when given, with one grouped query. Returns the number of rows written.
+        """
+        dates = {}
+        if date_from:
+            dates['gte'] = date_from
+        if date_to:
+            dates['lte'] = date_to
+        items = SalesOrderItem.objects.filter(**{f'sales_order__order_date__{lookup}': day for lookup, day in dates.items()})
+        grouped = items.values(
+            'sales_order__order_date', 'sales_order__customer', 'product',
+            'sales_order__sales_type', 'sales_order__status',
+        ).annotate(
+            total_quantity=Sum('quantity'), total_amount=Sum('total_price'), lines=Count('pk'),
+        ).order_by().values_list(
+            'sales_order__order_date', 'sales_order__customer', 'product',
+            'sales_order__sales_type', 'sales_order__status', 'total_quantity', 'total_amount', 'lines',
+        )
+        count = 0
+        with transaction.atomic():
+            cls.objects.filter(**{f'date__{lookup}': day for lookup, day in dates.items()}).delete()
+            batch = []
+            for *key, quantity, amount, lines in grouped.iterator(chunk_size=2000):
+                batch.append(cls(**dict(zip(cls.KEY_FIELDS, key)), quantity=quantity, amount=amount, line_count=lines))
+                if len(batch) == 2000:
+                    cls.objects.bulk_create(batch, batch_size=500)
+                    count += len(batch)
+                    batch = []
+            cls.objects.bulk_create(batch, batch_size=500)
+            count += len(batch)
+        return count
+
+    class Meta:
+        verbose_name = "Daily Sales Fact"
+        verbose_name_plural = "Daily Sales Facts"
+        ordering = ['-date']
+        constraints = [
+            # Rows of named customers; walk-in rows (no customer) need their own
+            # constraint as NULLs never conflict
+            models.UniqueConstraint(fields=['date', 'customer', 'product', 'sales_type', 'status'], name='unique_daily_sales_fact'),
+            models.UniqueConstraint(
+                fields=['date', 'product', 'sales_type', 'status'],
+                condition=models.Q(customer__isnull=True),
+                name='unique_walk_in_daily_sales_fact',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['customer', 'date']),
+            models.Index(fields=['product', 'date']),
+        ]
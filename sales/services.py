@@ -0,0 +1,270 @@
+"""
+Saving sales orders with their lines. Views, imports and APIs create and
+edit orders through save_sales_order() so the header, lines, total,
+stock posting and daily sales facts are written together in one transaction.
+
+checkout_instant_sale() is the point-of-sale entry: it checks a cart's
+prices and stock against one batched product query, then posts the sale,
+and replays the original order for a repeated idempotency key.
+
+transition_sales_orders() delivers or cancels many orders in one go.
+"""
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from stock.models import Product, StockBalance, StockMovement, InsufficientStockError, summarize_quantities
+from stock.orders import MONEY, bulk_transition, write_order
+from .models import DailySalesFact, SalesOrder, SalesOrderItem
+
+CHECKOUT_MAX_LINES = 200
+# Bulk status changes: target status -> statuses an order may move from
+SALES_TRANSITIONS = {
+    'delivered': ('order',),
+    'cancel': ('order', 'delivered'),
+}
+
+
+class CheckoutError(Exception):
+    """
+    A cart that cannot be sold as it stands. ``code`` is 'invalid',
+    'price_changed' or 'insufficient_stock'; ``details`` maps product ids
+    to the current price or to (requested, available) quantities.
+    """
+
+    def __init__(self, code, message, details=None):
+        super().__init__(message)
+        self.code = code
+        self.details = details or {}
+
+
+def save_sales_order(order, lines, user=None):
+    """
+    Create or update ``order`` with ``lines`` (SalesOrderItem instances,
+    new or already on the order) as its complete set of items, then post the
+    change in its stock effect. Raises ValidationError for invalid lines and
+    InsufficientStockError when a delivery would oversell; either way
+    nothing is saved. ``user`` becomes created_by of a new order.
+    """
+    with transaction.atomic():
+        if order._state.adding:
+            before, before_date = {}, None
+            facts = {}
+            if user is not None and order.created_by_id is None:
+                order.created_by = user
+        else:
+            # Stock effect and sales facts of the order as stored, before status or items change
+            stored = SalesOrder.objects.get(pk=order.pk)
+            before, before_date = stored.stock_quantities(), stored.stock_date
+            facts = DailySalesFact.for_orders([order.pk])
+        write_order(order, lines, 'sales_order')
+        after = summarize_quantities(lines) if order.status == 'delivered' else {}
+        order.sync_stock(before, after, before_date=before_date)
+        DailySalesFact.post(facts, DailySalesFact.for_lines(order, lines))
+    return order
+
+
+def save_instant_sale(order, lines, user=None):
+    """An instant sale is delivered as it is saved"""
+    order.sales_type = 'instant'
+    order.status = 'delivered'
+    return save_sales_order(order, lines, user=user)
+
+
+def parse_decimal(value, label):
+    try:
+        number = Decimal(str(value))
+    except (InvalidOperation, ValueError):
+        raise CheckoutError('invalid', f'{label} "{value}" is not a number.')
+    if not number.is_finite() or number <= 0 or number != number.quantize(MONEY):
+        raise CheckoutError('invalid', f'{label} must be a positive amount with at most two decimal places.')
+    return number
+
+
+def parse_cart(cart):
+    """[(product_id, quantity, unit_price or None)] from a checkout request body"""
+    items = cart.get('items') if isinstance(cart, dict) else None
+    if not isinstance(items, list) or not items:
+        raise CheckoutError('invalid', 'The cart has no items.')
+    if len(items) > CHECKOUT_MAX_LINES:
+        raise CheckoutError('invalid', f'A sale can have at most {CHECKOUT_MAX_LINES} lines.')
+    lines = []
+    for number, item in enumerate(items, start=1):
+        if not isinstance(item, dict) or not str(item.get('product', '')).isdigit():
+            raise CheckoutError('invalid', f'Line {number}: product id is required.')
+        unit_price = item.get('unit_price')
+        lines.append((
+            int(item['product']),
+            parse_decimal(item.get('quantity'), f'Line {number} quantity'),
+            None if unit_price in (None, '') else parse_decimal(unit_price, f'Line {number} unit price'),
+        ))
+    return lines
+
+
+def check_cart(lines):
+    """
+    Build SalesOrderItems for parsed cart lines, checking every product is
+    active, every quoted price is still the selling price and, unless
+    negative stock is allowed, that enough is on hand: one query in all.
+    The stock check is repeated under lock when the sale is posted.
+    Details of errors are keyed by product id.
+    """
+    product_ids = {product_id for product_id, _, _ in lines}
+    products = {
+        pk: (is_active, selling_price, on_hand)
+        for pk, is_active, selling_price, on_hand in Product.objects.filter(pk__in=product_ids).values_list(
+            'pk', 'is_active', 'selling_price', 'stock_balance__quantity'
+        )
+    }
+    unknown = sorted(pk for pk in product_ids if pk not in products or not products[pk][0])
+    if unknown:
+        raise CheckoutError('invalid', f"Unknown or inactive products: {', '.join(map(str, unknown))}")
+
+    changed = {
+        product_id: str(products[product_id][1])
+        for product_id, _, unit_price in lines
+        if unit_price is not None and unit_price != products[product_id][1]
+    }
+    if changed:
+        raise CheckoutError('price_changed', 'Prices have changed since the cart was priced.', changed)
+
+    items = [
+        SalesOrderItem(
+            product_id=product_id,
+            quantity=quantity,
+            unit_price=products[product_id][1] if unit_price is None else unit_price,
+        )
+        for product_id, quantity, unit_price in lines
+    ]
+    if not settings.STOCK_ALLOW_NEGATIVE:
+        shortages = {
+            product_id: (str(requested), str(products[product_id][2]))
+            for product_id, requested in summarize_quantities(items).items()
+            # Products without a balance row yet are checked when posting
+            if products[product_id][2] is not None and requested > products[product_id][2]
+        }
+        if shortages:
+            raise CheckoutError('insufficient_stock', 'Not enough stock for this sale.', shortages)
+    return items
+
+
+def checkout_instant_sale(cart, idempotency_key=None, user=None):
+    """
+    Post an instant sale for a cart ({'items': [{'product', 'quantity',
+    'unit_price'?}], 'customer_name'?, 'notes'?}); unit_price defaults to
+    the selling price. Returns (order, created): a key seen before returns
+    its order with created=False and posts nothing. Raises CheckoutError.
+    """
+    if idempotency_key:
+        if len(idempotency_key) > 64:
+            raise CheckoutError('invalid', 'The idempotency key is longer than 64 characters.')
+        existing = SalesOrder.objects.filter(idempotency_key=idempotency_key).first()
+        if existing is not None:
+            return existing, False
+
+    items = check_cart(parse_cart(cart))
+    order = SalesOrder(
+        customer_name=str(cart.get('customer_name') or '')[:100],
+        notes=str(cart.get('notes') or ''),
+        order_date=timezone.localdate(),
+        idempotency_key=idempotency_key or None,
+    )
+    try:
+        save_instant_sale(order, items, user=user)
+    except InsufficientStockError as e:
+        # Sold by another till between the check and the posting
+        product_ids = dict(Product.objects.filter(
+            pk__in={item.product_id for item in items}, name__in=e.shortages
+        ).values_list('name', 'pk'))
+        raise CheckoutError('insufficient_stock', str(e), {
+            product_ids.get(name, name): (str(requested), str(available))
+            for name, (requested, available) in e.shortages.items()
+        })
+    except IntegrityError:
+        # A concurrent retry with the same key posted first
+        existing = SalesOrder.objects.filter(idempotency_key=idempotency_key).first() if idempotency_key else None
+        if existing is None:
+            raise
+        return existing, False
+    return order, True
+
+
+def refuse_short_deliveries(orders, items):
+    """
+    {order id: reason} for orders that cannot be delivered from the stock on
+    hand, giving stock to the earliest orders first. Locks the balances.
+    """
+    if settings.STOCK_ALLOW_NEGATIVE:
+        return {}
+    product_ids = {item.product_id for lines in items.values() for item in lines}
+    StockBalance.lock(product_ids)
+    on_hand = dict(StockBalance.objects.filter(product_id__in=product_ids).values_list('product_id', 'quantity'))
+    missing = product_ids - set(on_hand)
+    if missing:
+        StockBalance.refresh(missing)
+        on_hand.update(StockBalance.objects.filter(product_id__in=missing).values_list('product_id', 'quantity'))
+
+    shortages = {}
+    for pk, _, _ in orders:
+        requested = summarize_quantities(items[pk])
+        short = {product_id: (quantity, on_hand[product_id]) for product_id, quantity in requested.items()
+                 if quantity > on_hand[product_id]}
+        if short:
+            shortages[pk] = short
+        else:
+            for product_id, quantity in requested.items():
+                on_hand[product_id] -= quantity
+    if not shortages:
+        return {}
+    names = dict(Product.objects.filter(
+        pk__in={product_id for short in shortages.values() for product_id in short}
+    ).values_list('pk', 'name'))
+    return {
+        pk: str(InsufficientStockError({names[product_id]: amounts for product_id, amounts in short.items()}))
+        for pk, short in shortages.items()
+    }
+
+
+def transition_sales_orders(order_ids, status, user=None):
+    """
+    Deliver ('delivered') or cancel ('cancel') many sales orders in one
+    transaction and post their stock in bulk: deliveries take stock out,
+    cancelling a delivered order puts it back. Orders in another status,
+    or whose delivery would oversell, are reported and left unchanged.
+    Returns bulk_transition()'s per-order report; raises ValueError for an
+    unknown status.
+    """
+    if status not in SALES_TRANSITIONS:
+        raise ValueError(f'Sales orders cannot be moved to "{status}" in bulk.')
+
+    def post_stock(orders, items):
+        delivered = defaultdict(Decimal)
+        postings = []
+        stock_dates = {
+            pk: delivery_date or order_date
+            for pk, order_date, delivery_date in SalesOrder.objects.filter(
+                pk__in=[pk for pk, _, _ in orders]
+            ).values_list('pk', 'order_date', 'delivery_date')
+        }
+        for pk, order_number, previous in orders:
+            if status == 'delivered':
+                sign = 1
+            elif previous == 'delivered':
+                sign = -1
+            else:
+                continue
+            changes = {product_id: sign * quantity for product_id, quantity in summarize_quantities(items[pk]).items()}
+            for product_id, change in changes.items():
+                delivered[product_id] += change
+            postings.append((order_number, pk, {product_id: -change for product_id, change in changes.items()}, None, stock_dates[pk]))
+        StockBalance.apply_deltas(delivered=delivered, prevent_negative=True)
+        StockMovement.post_many(StockMovement.SALE, postings)
+        DailySalesFact.post_status_change({pk: previous for pk, _, previous in orders})
+
+    return bulk_transition(
+        SalesOrder, order_ids, status, SALES_TRANSITIONS[status], post_stock,
+        refuse=refuse_short_deliveries if status == 'delivered' else None,
+    )
@@ -0,0 +1,127 @@
+"""
+Test cases for bulk sales order status changes
+"""
+
+import json
+
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.contrib.messages import get_messages
+from django.db import connection
+from django.urls import reverse
+from decimal import Decimal
+from datetime import date
+
+from stock.models import StockBalance, StockMovement
+from stock.test_balance import StockBalanceTestMixin
+from sales.models import SalesOrder
+from sales.services import transition_sales_orders
+
+
+class BulkSalesStatusTest(StockBalanceTestMixin, TestCase):
+    """Many orders change status in one transaction with bulk stock posting"""
+
+    def setUp(self):
+        super().setUp()
+        self.create_purchase('100').receive_goods()
+
+    def test_deliver_many(self):
+        orders = [self.create_sale(quantity) for quantity in ('10', '20', '5')]
+        delivered = self.create_sale('1')
+        delivered.mark_delivered()
+        updated_at = orders[0].updated_at
+
+        report = transition_sales_orders([orders[0].pk, orders[1].pk, delivered.pk, 999999, orders[2].pk], 'delivered')
+
+        self.assertEqual([result['changed'] for result in report], [True, True, False, False, True])
+        self.assertEqual(report[2]['error'], 'Cannot change an order that is Delivered.')
+        self.assertEqual(report[3]['error'], 'Order not found.')
+        self.assertEqual(self.balance().quantity, Decimal('64'))
+        self.assertEqual(set(SalesOrder.objects.filter(pk__in=[o.pk for o in orders]).values_list('status', flat=True)), {'delivered'})
+        self.assertGreater(SalesOrder.objects.get(pk=orders[0].pk).updated_at, updated_at)
+        movements = StockMovement.objects.filter(movement_type=StockMovement.SALE, source_id__in=[o.pk for o in orders])
+        self.assertEqual(
+            sorted(movements.values_list('reference', 'quantity')),
+            sorted((o.order_number, -Decimal(q)) for o, q in zip(orders, ('10', '20', '5'))),
+        )
+        self.assertFalse(movements.filter(cost_amount__isnull=True).exists())
+
+    def test_oversold_orders_are_refused(self):
+        first = self.create_sale('60', order_date=date(2025, 1, 20))
+        second = self.create_sale('60', order_date=date(2025, 1, 21))
+        third = self.create_sale('30', order_date=date(2025, 1, 22))
+
+        report = transition_sales_orders([third.pk, second.pk, first.pk], 'delivered')
+
+        # Stock goes to the earliest orders first
+        self.assertEqual([result['changed'] for result in report], [True, False, True])
+        self.assertIn('Not enough stock', report[1]['error'])
+        self.assertEqual(report[1]['status'], 'order')
+        self.assertEqual(self.balance().quantity, Decimal('10'))
+
+    def test_cancel_restores_delivered_stock(self):
+        delivered = self.create_sale('30')
+        delivered.mark_delivered()
+        open_order = self.create_sale('10')
+
+        report = transition_sales_orders([delivered.pk, open_order.pk], 'cancel')
+
+        self.assertTrue(all(result['changed'] for result in report))
+        self.assertEqual(self.balance().quantity, Decimal('100'))
+        self.assertEqual(
+            list(StockMovement.objects.filter(movement_type=StockMovement.SALE, source_id=delivered.pk).order_by('pk').values_list('quantity', flat=True)),
+            [Decimal('-30'), Decimal('30')],
+        )
+        self.assertFalse(StockMovement.objects.filter(movement_type=StockMovement.SALE, source_id=open_order.pk).exists())
+        self.assertEqual(StockBalance.objects.get(product=self.product).quantity, self.product.get_realtime_quantity())
+
+    def test_query_count_does_not_grow_with_orders(self):
+        def deliver(count):
+            orders = [self.create_sale('1') for _ in range(count)]
+            with CaptureQueriesContext(connection) as queries:
+                transition_sales_orders([order.pk for order in orders], 'delivered')
+            return len(queries)
+
+        self.assertEqual(deliver(2), deliver(8))
+
+    def test_unknown_status(self):
+        with self.assertRaises(ValueError):
+            transition_sales_orders([self.create_sale('1').pk], 'order')
+
+    def test_list_form(self):
+        orders = [self.create_sale('10'), self.create_sale('200')]
+        response = self.client.post(reverse('sales:bulk_order_status'), {
+            'orders': [order.pk for order in orders], 'status': 'delivered', 'query': 'status=order',
+        })
+        self.assertRedirects(response, reverse('sales:order_list') + '?status=order', fetch_redirect_response=False)
+        messages = [str(message) for message in get_messages(response.wsgi_request)]
+        self.assertIn('1 orders marked as Delivered.', messages)
+        self.assertTrue(any(orders[1].order_number in message for message in messages))
+
+        response = self.client.get(reverse('sales:order_list'))
+        self.assertContains(response, 'name="orders"')
+
+    def test_json_api(self):
+        order = self.create_sale('10')
+        url = reverse('sales:bulk_order_status_json')
+        response = self.client.post(url, data=json.dumps({'orders': [order.pk], 'status': 'delivered'}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['changed'], 1)
+        self.assertEqual(response.json()['results'][0]['status'], 'delivered')
+
+        response = self.client.post(url, data=json.dumps({'orders': ['x'], 'status': 'delivered'}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_json_api_requires_csrf_token(self):
+        order = self.create_sale('10')
+        url = reverse('sales:bulk_order_status_json')
+        body = json.dumps({'orders': [order.pk], 'status': 'delivered'})
+        client = Client(enforce_csrf_checks=True)
+        self.assertEqual(client.post(url, data=body, content_type='application/json').status_code, 403)
+
+        client.get(reverse('sales:order_list'))
+        response = client.post(url, data=body, content_type='application/json',
+                               headers={'X-CSRFToken': client.cookies['csrftoken'].value})
+        self.assertEqual(response.json()['changed'], 1)
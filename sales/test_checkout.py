@@ -0,0 +1,99 @@
+"""
+Test cases for the instant sale checkout API
+"""
+
+import json
+
+from django.test import Client, TestCase
+from django.urls import reverse
+from decimal import Decimal
+
+from core.sequences import reset_blocks
+from stock.models import Product
+from stock.test_balance import StockBalanceTestMixin
+from sales.models import SalesOrder
+from sales.services import checkout_instant_sale, check_cart, parse_cart, CheckoutError
+
+
+class InstantSaleCheckoutTest(StockBalanceTestMixin, TestCase):
+    """Carts are checked in one query and posted at most once per key"""
+
+    def setUp(self):
+        super().setUp()
+        reset_blocks()
+        Product.objects.filter(pk=self.product.pk).update(selling_price=Decimal('500.00'))
+        self.create_purchase('10').receive_goods()
+        self.url = reverse('sales:instant_sale_checkout')
+
+    def post(self, cart, key=None):
+        headers = {'Idempotency-Key': key} if key else {}
+        return self.client.post(self.url, data=json.dumps(cart), content_type='application/json', headers=headers)
+
+    def cart(self, quantity='2', **item):
+        return {'items': [{'product': self.product.pk, 'quantity': quantity, **item}], 'customer_name': 'Walk-in'}
+
+    def test_checkout_posts_delivered_sale(self):
+        response = self.post(self.cart(unit_price='500.00'), key='till-1-0001')
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        self.assertFalse(data['replayed'])
+        self.assertEqual(data['total_amount'], '1000.00')
+
+        order = SalesOrder.objects.get(pk=data['order_id'])
+        self.assertEqual((order.sales_type, order.status, order.customer_name), ('instant', 'delivered', 'Walk-in'))
+        self.assertTrue(order.order_number.startswith('IS-'))
+        self.assertEqual(self.balance().quantity, Decimal('8'))
+
+    def test_retry_with_same_key_replays_order(self):
+        first = self.post(self.cart(), key='till-1-0002').json()
+        response = self.post(self.cart(), key='till-1-0002')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['order_id'], first['order_id'])
+        self.assertTrue(response.json()['replayed'])
+        self.assertEqual(SalesOrder.objects.count(), 1)
+        self.assertEqual(self.balance().quantity, Decimal('8'))
+
+    def test_stale_price_is_rejected(self):
+        response = self.post(self.cart(unit_price='450.00'), key='till-1-0003')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['error'], 'price_changed')
+        self.assertEqual(response.json()['details'], {str(self.product.pk): '500.00'})
+        self.assertFalse(SalesOrder.objects.exists())
+
+    def test_shortage_is_rejected(self):
+        response = self.post(self.cart(quantity='11'))
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['error'], 'insufficient_stock')
+        self.assertEqual(self.balance().quantity, Decimal('10'))
+        self.assertFalse(SalesOrder.objects.exists())
+
+    def test_invalid_requests(self):
+        response = self.client.post(self.url, data='not json', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.post({'items': []}).status_code, 400)
+        self.assertEqual(self.post(self.cart(quantity='-1')).json()['error'], 'invalid')
+        self.assertEqual(self.client.get(self.url).status_code, 405)
+        with self.assertRaises(CheckoutError):
+            checkout_instant_sale({'items': [{'product': 999999, 'quantity': '1'}]})
+
+    def test_csrf_token_required(self):
+        client = Client(enforce_csrf_checks=True)
+        body = json.dumps(self.cart())
+        response = client.post(self.url, data=body, content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+
+        # Tills take the token from the cookie the instant sales page sets
+        client.get(reverse('sales:instant_sales'))
+        token = client.cookies['csrftoken'].value
+        response = client.post(self.url, data=body, content_type='application/json', headers={'X-CSRFToken': token})
+        self.assertEqual(response.status_code, 201)
+
+    def test_cart_is_checked_in_one_query(self):
+        products = [self.product] + [
+            Product.objects.create(name=f'Tile {index}', unit_type=self.unit, selling_price=Decimal('50.00'))
+            for index in range(5)
+        ]
+        cart = {'items': [{'product': product.pk, 'quantity': '1'} for product in products]}
+        with self.assertNumQueries(1):
+            items = check_cart(parse_cart(cart))
+        self.assertEqual([item.unit_price for item in items], [Decimal('500.00')] + [Decimal('50.00')] * 5)
@@ -0,0 +1,127 @@
+"""
+Test cases for the daily sales facts behind the sales reports
+"""
+
+from io import StringIO
+
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.core.management import call_command
+from django.db import connection
+from django.urls import reverse
+from decimal import Decimal
+from datetime import date
+
+from core.sequences import reset_blocks
+from stock.test_balance import StockBalanceTestMixin
+from sales.models import DailySalesFact, SalesOrder, SalesOrderItem
+from sales.services import save_sales_order, save_instant_sale, transition_sales_orders
+
+
+class DailySalesFactTest(StockBalanceTestMixin, TestCase):
+    """Order postings keep the facts equal to a rebuild from the orders"""
+
+    def setUp(self):
+        super().setUp()
+        reset_blocks()
+        self.create_purchase('1000').receive_goods()
+
+    def order(self, quantity='2', unit_price='500.00', order_date=date(2025, 1, 20), customer=True, **kwargs):
+        return save_sales_order(
+            SalesOrder(customer=self.customer if customer else None, order_date=order_date, **kwargs),
+            [SalesOrderItem(product=self.product, quantity=Decimal(quantity), unit_price=Decimal(unit_price))],
+        )
+
+    def facts(self):
+        return list(
+            DailySalesFact.objects.exclude(line_count=0).order_by(*DailySalesFact.KEY_FIELDS).values_list(
+                'date', 'customer_id', 'product_id', 'sales_type', 'status', 'quantity', 'amount', 'line_count'
+            )
+        )
+
+    def assertMatchesRebuild(self):
+        maintained = self.facts()
+        DailySalesFact.rebuild()
+        self.assertEqual(maintained, self.facts())
+        return maintained
+
+    def test_order_lifecycle(self):
+        first = self.order('2')
+        second = self.order('3', order_date=date(2025, 1, 21))
+        facts = self.assertMatchesRebuild()
+        self.assertEqual(len(facts), 2)
+
+        save_sales_order(first, [SalesOrderItem(product=self.product, quantity=Decimal('5'), unit_price=Decimal('400.00'))])
+        first.refresh_from_db()
+        first.mark_delivered()
+        second.cancel_order()
+        self.assertEqual(
+            self.assertMatchesRebuild(),
+            [
+                (date(2025, 1, 20), self.customer.pk, self.product.pk, 'regular', 'delivered', Decimal('5'), Decimal('2000'), 1),
+                (date(2025, 1, 21), self.customer.pk, self.product.pk, 'regular', 'cancel', Decimal('3'), Decimal('1500'), 1),
+            ],
+        )
+
+        first.delete()
+        self.assertEqual(len(self.assertMatchesRebuild()), 1)
+
+    def test_walk_in_sales_share_a_row(self):
+        for quantity in ('1', '2'):
+            save_instant_sale(
+                SalesOrder(order_date=date(2025, 1, 20)),
+                [SalesOrderItem(product=self.product, quantity=Decimal(quantity), unit_price=Decimal('500.00'))],
+            )
+        self.assertEqual(DailySalesFact.objects.count(), 1)
+        self.assertEqual(
+            self.assertMatchesRebuild(),
+            [(date(2025, 1, 20), None, self.product.pk, 'instant', 'delivered', Decimal('3'), Decimal('1500'), 2)],
+        )
+
+    def test_bulk_transition(self):
+        orders = [self.order('1'), self.order('2'), self.order('4', customer=False)]
+        transition_sales_orders([order.pk for order in orders], 'delivered')
+        transition_sales_orders([orders[0].pk], 'cancel')
+        self.assertEqual(
+            {(status, line_count) for _, _, _, _, status, _, _, line_count in self.assertMatchesRebuild()},
+            {('delivered', 1), ('cancel', 1)},
+        )
+
+    def test_rebuild_command_range(self):
+        self.order('1', order_date=date(2025, 1, 20))
+        self.order('1', order_date=date(2025, 2, 20))
+        DailySalesFact.objects.update(amount=Decimal('0'))
+
+        stdout = StringIO()
+        call_command('rebuild_sales_facts', '--from', '2025-02-01', '--to', '2025-02-28', stdout=stdout)
+        self.assertIn('Wrote 1 daily sales facts', stdout.getvalue())
+        self.assertEqual(
+            dict(DailySalesFact.objects.values_list('date', 'amount')),
+            {date(2025, 1, 20): Decimal('0'), date(2025, 2, 20): Decimal('500')},
+        )
+
+    def test_reports(self):
+        self.order('2', order_date=date(2025, 1, 20)).mark_delivered()
+        self.order('1', order_date=date(2025, 1, 20))
+        self.order('1', order_date=date(2025, 3, 5), customer=False).cancel_order()
+
+        response = self.client.get(reverse('sales:sales_daily_report'), {'start_date': '2025-01-01', 'end_date': '2025-01-31'})
+        self.assertEqual(len(response.context['reports']), 1)
+        row = response.context['reports'][0]
+        self.assertEqual((row['delivered_amount'], row['open_amount'], row['total_amount']), (Decimal('1000'), Decimal('500'), Decimal('1500')))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('sales:sales_monthly_report'), {'year': '2025'})
+        self.assertEqual([row['month'].month for row in response.context['reports']], [1, 3])
+        self.assertEqual(response.context['totals']['cancelled_amount'], Decimal('500'))
+        self.assertEqual(response.context['totals']['total_amount'], Decimal('1500'))
+        report_sql = [query['sql'] for query in queries if 'sales_dailysalesfact' in query['sql']]
+        self.assertTrue(report_sql)
+        self.assertTrue(all('BETWEEN' in sql and 'sales_salesorder' not in sql for sql in report_sql))
+
+        response = self.client.get(reverse('sales:sales_customer_report'), {'start_date': '2025-01-01', 'end_date': '2025-03-31'})
+        self.assertEqual(
+            [(row['customer'], row['total_amount']) for row in response.context['reports']],
+            [(self.customer.pk, Decimal('1500')), (None, Decimal('0'))],
+        )
+        self.assertContains(response, 'Walk-in customers')
@@ -0,0 +1,103 @@
+"""
+Test cases for PDF invoices and their render cache
+"""
+
+import shutil
+import tempfile
+import zipfile
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.core.management import call_command
+from django.urls import reverse
+from decimal import Decimal
+from datetime import date
+
+from core.sequences import reset_blocks
+from stock.test_balance import StockBalanceTestMixin
+from sales.models import SalesOrder, SalesOrderItem
+from sales import invoices
+from sales.invoices import get_invoice_pdf, invoice_queryset, render_invoice_batch
+from sales.services import save_sales_order
+
+
+class InvoicePdfTest(StockBalanceTestMixin, TestCase):
+    """Invoices are rendered once per order version and batched by date"""
+
+    def setUp(self):
+        super().setUp()
+        reset_blocks()
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        settings_override = override_settings(INVOICE_PDF_CACHE_DIR=Path(self.cache_dir))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def create_order(self, order_date=date(2025, 1, 20), lines=1):
+        lines = [
+            SalesOrderItem(product=self.product, quantity=Decimal('2'), unit_price=Decimal('500.00'))
+            for _ in range(lines)
+        ]
+        return save_sales_order(SalesOrder(customer=self.customer, order_date=order_date), lines)
+
+    def cached_files(self):
+        return sorted(path.name for path in Path(self.cache_dir).glob('*/*.pdf'))
+
+    def test_view_returns_pdf(self):
+        order = self.create_order()
+        response = self.client.get(reverse('sales:order_invoice', args=[order.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertIn(f'{order.order_number}.pdf', response['Content-Disposition'])
+        self.assertTrue(response.content.startswith(b'%PDF'))
+
+    def test_cached_until_order_changes(self):
+        order = invoice_queryset().get(pk=self.create_order().pk)
+        with mock.patch.object(invoices, 'render_invoices_pdf', wraps=invoices.render_invoices_pdf) as render:
+            first = get_invoice_pdf(order)
+            self.assertEqual(get_invoice_pdf(invoice_queryset().get(pk=order.pk)), first)
+            self.assertEqual(render.call_count, 1)
+            self.assertEqual(len(self.cached_files()), 1)
+
+            order.notes = 'Deliver to site'
+            order.save()
+            get_invoice_pdf(invoice_queryset().get(pk=order.pk))
+            self.assertEqual(render.call_count, 2)
+        # The previous version is discarded
+        self.assertEqual(self.cached_files(), [invoices.invoice_cache_path(order).name])
+
+    def test_long_invoice_spans_pages(self):
+        order = invoice_queryset().get(pk=self.create_order(lines=60).pk)
+        self.assertGreater(get_invoice_pdf(order).count(b'/Type /Page\n'), 1)
+
+    def test_batch_zip_in_order_date_order(self):
+        later = self.create_order(order_date=date(2025, 1, 25))
+        earlier = self.create_order(order_date=date(2025, 1, 5))
+        self.create_order(order_date=date(2025, 2, 1))
+
+        output = BytesIO()
+        orders = SalesOrder.objects.filter(order_date__range=(date(2025, 1, 1), date(2025, 1, 31)))
+        self.assertEqual(render_invoice_batch(orders, output, workers=1), 2)
+        with zipfile.ZipFile(output) as archive:
+            self.assertEqual(archive.namelist(), [f'{earlier.order_number}.pdf', f'{later.order_number}.pdf'])
+            self.assertTrue(archive.read(f'{later.order_number}.pdf').startswith(b'%PDF'))
+        self.assertEqual(len(self.cached_files()), 2)
+
+    def test_batch_merged_pdf(self):
+        for day in (5, 6, 7):
+            self.create_order(order_date=date(2025, 1, day))
+        output = BytesIO()
+        self.assertEqual(render_invoice_batch(SalesOrder.objects.all(), output, fmt='pdf'), 3)
+        self.assertEqual(output.getvalue().count(b'/Type /Page\n'), 3)
+
+    def test_render_invoices_command(self):
+        self.create_order()
+        output = Path(self.cache_dir) / 'january.zip'
+        stdout = StringIO()
+        call_command('render_invoices', '--from', '2025-01-01', '--to', '2025-01-31',
+                     '--output', str(output), '--workers', '1', stdout=stdout)
+        self.assertIn('Rendered 1 invoices', stdout.getvalue())
+        with zipfile.ZipFile(output) as archive:
+            self.assertEqual(len(archive.namelist()), 1)
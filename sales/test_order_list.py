@@ -0,0 +1,91 @@
+"""
+Test cases for the paginated, filtered sales order list
+"""
+
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.models import User
+from django.db import connection
+from django.urls import reverse
+from datetime import date, timedelta
+
+from sales.models import SalesOrder
+from customers.models import Customer
+
+
+class SalesOrderListTest(TestCase):
+    """The list issues a fixed number of queries and filters in SQL"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.force_login(self.user)
+        self.retail = Customer.objects.create(name='Retail Customer', customer_type='retail')
+        self.wholesale = Customer.objects.create(name='Wholesale Customer', customer_type='wholesale')
+
+    def create_orders(self, count, customer=None, start=date(2025, 1, 1), **kwargs):
+        offset = SalesOrder.objects.count()
+        return SalesOrder.objects.bulk_create([
+            SalesOrder(
+                order_number=f'SO-LIST-{offset + index}',
+                customer=customer or self.retail,
+                order_date=start + timedelta(days=index),
+                **kwargs
+            )
+            for index in range(count)
+        ])
+
+    def fetch(self, **params):
+        return self.client.get(reverse('sales:order_list'), params)
+
+    def numbers(self, response):
+        return [order.order_number for order in response.context['orders']]
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.fetch()
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_query_count_independent_of_order_count(self):
+        self.create_orders(3)
+        few = self.count_queries()
+        self.create_orders(60, customer=self.wholesale)
+        self.assertEqual(self.count_queries(), few)
+
+    def test_paginated_newest_first(self):
+        self.create_orders(30)
+        response = self.fetch()
+        self.assertTrue(response.context['is_paginated'])
+        self.assertEqual(len(response.context['orders']), 25)
+        self.assertEqual(self.numbers(response)[0], 'SO-LIST-29')
+        self.assertContains(response, 'Wholesale Customer', count=1)  # customer filter option only
+
+        response = self.fetch(page=2)
+        self.assertEqual(self.numbers(response), [f'SO-LIST-{index}' for index in range(4, -1, -1)])
+
+    def test_filters(self):
+        self.create_orders(3)
+        self.create_orders(2, customer=self.wholesale, start=date(2025, 2, 1), status='delivered')
+        self.create_orders(1, start=date(2025, 3, 1), sales_type='instant', status='delivered')
+
+        self.assertEqual(len(self.fetch(status='delivered').context['orders']), 3)
+        self.assertEqual(self.numbers(self.fetch(sales_type='instant')), ['SO-LIST-5'])
+        self.assertEqual(self.numbers(self.fetch(customer=self.wholesale.pk)), ['SO-LIST-4', 'SO-LIST-3'])
+        self.assertEqual(
+            self.numbers(self.fetch(date_from='2025-01-02', date_to='2025-02-01')),
+            ['SO-LIST-3', 'SO-LIST-2', 'SO-LIST-1'],
+        )
+        self.assertEqual(
+            self.numbers(self.fetch(status='delivered', customer=self.retail.pk, date_from='2025-03-01')),
+            ['SO-LIST-5'],
+        )
+
+    def test_invalid_filters_ignored(self):
+        self.create_orders(2)
+        response = self.fetch(status='bogus', sales_type='x', date_from='2025-02-30', customer='abc')
+        self.assertEqual(len(response.context['orders']), 2)
+
+    def test_pagination_links_keep_filters(self):
+        self.create_orders(30)
+        response = self.fetch(status='order')
+        self.assertContains(response, '?page=2&status=order')
@@ -0,0 +1,110 @@
+"""
+Test cases for the sales order service
+"""
+
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.urls import reverse
+from decimal import Decimal
+from datetime import date
+
+from core.sequences import reset_blocks
+from stock.models import Product, InsufficientStockError
+from stock.test_balance import StockBalanceTestMixin
+from sales.models import SalesOrder, SalesOrderItem
+from sales.services import save_sales_order, save_instant_sale
+
+
+class SalesOrderServiceTest(StockBalanceTestMixin, TestCase):
+    """Orders are written in one pass with totals computed in memory"""
+
+    def setUp(self):
+        super().setUp()
+        reset_blocks()
+        self.create_purchase('1000').receive_goods()
+
+    def new_order(self, **kwargs):
+        return SalesOrder(customer=self.customer, order_date=date(2025, 1, 20), **kwargs)
+
+    def line(self, quantity, unit_price='500.00', product=None):
+        return SalesOrderItem(product=product or self.product, quantity=Decimal(quantity), unit_price=Decimal(unit_price))
+
+    def test_create_computes_totals(self):
+        order = save_sales_order(self.new_order(), [self.line('2', '10.005'), self.line('3')])
+        order.refresh_from_db()
+        self.assertEqual(order.total_amount, Decimal('1520.01'))
+        self.assertEqual(sorted(order.items.values_list('total_price', flat=True)), [Decimal('20.01'), Decimal('1500')])
+        self.assertTrue(order.order_number.startswith('SO-'))
+
+    def test_query_count_independent_of_line_count(self):
+        products = Product.objects.bulk_create([
+            Product(name=f'Tile {index}', unit_type=self.unit) for index in range(100)
+        ])
+        with self.captureOnCommitCallbacks(execute=True):
+            save_sales_order(self.new_order(), [self.line('1')])  # reserves the number block
+
+        def count(lines):
+            with CaptureQueriesContext(connection) as context:
+                save_sales_order(self.new_order(), lines)
+            return len(context.captured_queries)
+
+        few = count([self.line('1', product=product) for product in products[:5]])
+        many = count([self.line('1', product=product) for product in products])
+        self.assertEqual(few, many)
+        # Order, lines and the daily sales facts (an insert and an update)
+        self.assertLessEqual(many, 6)
+
+    def test_update_replaces_lines_and_posts_stock(self):
+        order = save_sales_order(self.new_order(status='delivered'), [self.line('10'), self.line('5')])
+        self.assertEqual(self.balance().quantity, Decimal('985'))
+
+        kept = list(order.items.order_by('pk'))[:1]
+        kept[0].quantity = Decimal('4')
+        save_sales_order(order, kept + [self.line('1', '100.00')])
+
+        self.assertEqual(order.items.count(), 2)
+        order.refresh_from_db()
+        self.assertEqual(order.total_amount, Decimal('2100.00'))
+        self.assertEqual(self.balance().quantity, Decimal('995'))
+
+    def test_invalid_lines_save_nothing(self):
+        with self.assertRaises(ValidationError) as raised:
+            save_sales_order(self.new_order(), [self.line('1'), self.line('0')])
+        self.assertIn('Line 2', str(raised.exception))
+        self.assertFalse(SalesOrder.objects.exists())
+
+    def test_instant_sale_oversell_rolls_back(self):
+        with self.assertRaises(InsufficientStockError):
+            save_instant_sale(SalesOrder(customer_name='Walk-in', order_date=date(2025, 1, 20)), [self.line('1001')])
+        self.assertFalse(SalesOrder.objects.exists())
+        self.assertEqual(self.balance().quantity, Decimal('1000'))
+
+    def test_create_view_uses_service(self):
+        user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.force_login(user)
+        response = self.client.post(reverse('sales:order_create'), {
+            'sales_type': 'regular',
+            'customer': str(self.customer.pk),
+            'order_date': '2025-01-20',
+            'status': 'order',
+            'items-TOTAL_FORMS': '2',
+            'items-INITIAL_FORMS': '0',
+            'items-MIN_NUM_FORMS': '0',
+            'items-MAX_NUM_FORMS': '1000',
+            'items-0-product': str(self.product.pk),
+            'items-0-quantity': '3',
+            'items-0-unit_price': '500.00',
+            'items-0-total_price': '1500.00',
+            'items-1-product': '',
+            'items-1-quantity': '',
+            'items-1-unit_price': '',
+            'items-1-total_price': '',
+        })
+        self.assertRedirects(response, reverse('sales:order_list'), fetch_redirect_response=False)
+        order = SalesOrder.objects.get()
+        self.assertEqual(order.created_by, user)
+        self.assertEqual(order.total_amount, Decimal('1500.00'))
+        self.assertEqual(order.items.count(), 1)
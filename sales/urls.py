@@ -21,11 +21,14 @@ urlpatterns = [
     # Instant Sales
     path('instant-sales/', views.InstantSalesCreateView.as_view(), name='instant_sales'),
     path('instant-sales/<int:pk>/edit/', views.InstantSalesUpdateView.as_view(), name='instant_sales_edit'),
+    path('instant-sales/checkout.json', views.instant_sale_checkout, name='instant_sale_checkout'),
     
     # Order Flow Actions
     path('orders/<int:order_id>/mark-delivered/', views.mark_order_delivered, name='mark_order_delivered'),
     path('orders/<int:order_id>/cancel/', views.cancel_sales_order, name='cancel_sales_order'),
     path('orders/<int:order_id>/invoice/', views.sales_order_invoice, name='order_invoice'),
+    path('orders/bulk-status/', views.bulk_order_status, name='bulk_order_status'),
+    path('orders/bulk-status.json', views.bulk_order_status_json, name='bulk_order_status_json'),
     
     # Reports
     path('reports/daily/', views.SalesDailyReportView.as_view(), name='sales_daily_report'),
@@ -1,26 +1,85 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.contrib import messages
 from django.db import transaction
-from django.http import HttpResponse
-from django.template.loader import get_template
+from django.db.models import Q, Sum
+from django.db.models.functions import Coalesce
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.http import require_POST
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.utils.functional import cached_property
 from django.conf import settings
+import json
 import os
+from datetime import date
+from decimal import Decimal
 from .models import (
-    SalesOrder, SalesOrderItem
+    SalesOrder, SalesOrderItem, DailySalesFact
+)
+from .invoices import get_invoice_pdf, invoice_queryset
+from .services import (
+    save_sales_order, save_instant_sale, checkout_instant_sale, CheckoutError,
+    transition_sales_orders, SALES_TRANSITIONS,
 )
 from .forms import SalesOrderForm, SalesOrderItemFormSet, SalesOrderItemFormSetCustom, InstantSalesForm
 from customers.models import Customer
-from stock.models import Product, ProductCategory, ProductBrand
+from stock.models import ProductCategory, ProductBrand, InsufficientStockError
+from stock.orders import parse_order_ids
 from django.contrib.auth.models import User
-import uuid
 
 
 class SalesOrderListView(ListView):
+    """
+    Paginated sales orders filtered by status, sales type, order date range
+    and customer. Each filter maps onto a SalesOrder index; the page loads
+    its customers in the same query and only the columns the list shows.
+    """
     model = SalesOrder
     template_name = 'sales/order_list.html'
     context_object_name = 'orders'
+    paginate_by = 25
+
+    FILTER_PARAMS = ('status', 'sales_type', 'date_from', 'date_to', 'customer')
+    LIST_FIELDS = (
+        'order_number', 'sales_type', 'customer_name', 'order_date', 'status', 'total_amount',
+        'customer__name',
+    )
+
+    def get_date_param(self, name):
+        try:
+            return parse_date(self.request.GET.get(name, ''))
+        except ValueError:
+            return None
+
+    def get_queryset(self):
+        queryset = SalesOrder.objects.select_related('customer').only(*self.LIST_FIELDS)
+        params = self.request.GET
+        if params.get('status') in dict(SalesOrder.ORDER_STATUS):
+            queryset = queryset.filter(status=params['status'])
+        if params.get('sales_type') in dict(SalesOrder.SALES_TYPE):
+            queryset = queryset.filter(sales_type=params['sales_type'])
+        date_from = self.get_date_param('date_from')
+        if date_from:
+            queryset = queryset.filter(order_date__gte=date_from)
+        date_to = self.get_date_param('date_to')
+        if date_to:
+            queryset = queryset.filter(order_date__lte=date_to)
+        if params.get('customer', '').isdigit():
+            queryset = queryset.filter(customer_id=params['customer'])
+        return queryset.order_by('-order_date', '-created_at', '-pk')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        params = self.request.GET.copy()
+        params.pop('page', None)
+        context['query_params'] = params.urlencode()
+        context['current'] = {name: self.request.GET.get(name, '') for name in self.FILTER_PARAMS}
+        context['status_choices'] = SalesOrder.ORDER_STATUS
+        context['sales_type_choices'] = SalesOrder.SALES_TYPE
+        context['customers'] = Customer.objects.filter(is_active=True).order_by('name').only('pk', 'name')
+        return context
 
 
 class SalesOrderDetailView(DetailView):
@@ -44,47 +103,33 @@ class SalesOrderCreateView(CreateView):
             context['formset'] = SalesOrderItemFormSetCustom()
         
         # Add data for filtering
-        context['products'] = Product.objects.filter(is_active=True).select_related('category', 'brand')
         context['categories'] = ProductCategory.objects.filter(is_active=True)
         context['brands'] = ProductBrand.objects.filter(is_active=True)
         
         return context
     
     def form_valid(self, form):
+        formset = SalesOrderItemFormSetCustom(self.request.POST, instance=form.instance)
+        if not formset.is_valid():
+            messages.error(self.request, "Please fix the errors in the product selection.")
+            return self.form_invalid(form)
+        
+        lines = formset.get_lines()
         try:
-            with transaction.atomic():
-                # Generate unique order number
-                order_number = f"SO-{uuid.uuid4().hex[:8].upper()}"
-                form.instance.order_number = order_number
-                form.instance.created_by = self.request.user
-                
-                # Save the order first
-                response = super().form_valid(form)
-                
-                # Handle formset
-                formset = SalesOrderItemFormSetCustom(self.request.POST, instance=self.object)
-                if formset.is_valid():
-                    formset.save()
-                    
-                    # Calculate total amount
-                    total_amount = sum(item.total_price for item in self.object.items.all())
-                    self.object.total_amount = total_amount
-                    self.object.save()
-                    
-                    items_count = self.object.items.count()
-                    if items_count > 0:
-                        messages.success(self.request, f"Sales order {order_number} created successfully with {items_count} products! Total: ৳{total_amount}")
-                    else:
-                        messages.warning(self.request, f"Sales order {order_number} created without items. Please add products to complete the order.")
-                else:
-                    messages.error(self.request, "Please fix the errors in the product selection.")
-                    return self.form_invalid(form)
-                
-                return response
-                
+            # Header, lines, total and stock are written in one transaction
+            self.object = save_sales_order(form.instance, lines, user=self.request.user)
+        except InsufficientStockError as e:
+            messages.error(self.request, f"Sales order not created. {e}")
+            return self.form_invalid(form)
         except Exception as e:
             messages.error(self.request, f"Error creating sales order: {str(e)}")
             return self.form_invalid(form)
+        
+        if lines:
+            messages.success(self.request, f"Sales order {self.object.order_number} created successfully with {len(lines)} products! Total: ৳{self.object.total_amount}")
+        else:
+            messages.warning(self.request, f"Sales order {self.object.order_number} created without items. Please add products to complete the order.")
+        return redirect(self.get_success_url())
 
 
 class SalesOrderUpdateView(UpdateView):
@@ -104,39 +149,29 @@ class SalesOrderUpdateView(UpdateView):
             context['formset'] = SalesOrderItemFormSet(instance=self.object)
         
         # Add data for filtering
-        context['products'] = Product.objects.filter(is_active=True).select_related('category', 'brand')
         context['categories'] = ProductCategory.objects.filter(is_active=True)
         context['brands'] = ProductBrand.objects.filter(is_active=True)
         
         return context
     
     def form_valid(self, form):
+        formset = SalesOrderItemFormSet(self.request.POST, instance=self.object)
+        if not formset.is_valid():
+            messages.error(self.request, "Please fix the errors in the product selection.")
+            return self.form_invalid(form)
+        
+        lines = formset.get_lines()
         try:
-            with transaction.atomic():
-                # Save the order
-                response = super().form_valid(form)
-                
-                # Handle formset
-                formset = SalesOrderItemFormSet(self.request.POST, instance=self.object)
-                if formset.is_valid():
-                    formset.save()
-                    
-                    # Calculate total amount
-                    total_amount = sum(item.total_price for item in self.object.items.all())
-                    self.object.total_amount = total_amount
-                    self.object.save()
-                    
-                    items_count = self.object.items.count()
-                    messages.success(self.request, f"Sales order {self.object.order_number} updated successfully with {items_count} products! Total: ৳{total_amount}")
-                else:
-                    messages.error(self.request, "Please fix the errors in the product selection.")
-                    return self.form_invalid(form)
-                
-                return response
-                
+            self.object = save_sales_order(form.instance, lines)
+        except InsufficientStockError as e:
+            messages.error(self.request, f"Sales order not updated. {e}")
+            return self.form_invalid(form)
         except Exception as e:
             messages.error(self.request, f"Error updating sales order: {str(e)}")
             return self.form_invalid(form)
+        
+        messages.success(self.request, f"Sales order {self.object.order_number} updated successfully with {len(lines)} products! Total: ৳{self.object.total_amount}")
+        return redirect(self.get_success_url())
 
 
 class SalesOrderDeleteView(DeleteView):
@@ -145,60 +180,190 @@ class SalesOrderDeleteView(DeleteView):
     success_url = reverse_lazy('sales:order_list')
 
 
+class SalesFactReportMixin:
+    """
+    Shared filters of the sales reports. They read DailySalesFact (a few
+    rows per day, maintained as orders are posted) with a date range and
+    sum the amounts per status; cancelled sales are shown apart.
+    """
+    model = DailySalesFact
+    context_object_name = 'reports'
+
+    def get_date_param(self, name, default):
+        try:
+            return parse_date(self.request.GET.get(name, '')) or default
+        except ValueError:
+            return default
+
+    def get_date_range(self):
+        """(first, last) order date of the report"""
+        today = timezone.localdate()
+        return self.get_date_param('start_date', today.replace(day=1)), self.get_date_param('end_date', today)
 
+    @cached_property
+    def date_range(self):
+        return self.get_date_range()
 
-class SalesDailyReportView(ListView):
-    model = SalesOrder
+    def get_facts(self):
+        facts = DailySalesFact.objects.filter(date__range=self.date_range)
+        if self.request.GET.get('sales_type') in dict(SalesOrder.SALES_TYPE):
+            facts = facts.filter(sales_type=self.request.GET['sales_type'])
+        return facts
+
+    def get_totals(self):
+        sold = ~Q(status='cancel')
+        return {
+            'delivered_amount': Coalesce(Sum('amount', filter=Q(status='delivered')), Decimal('0')),
+            'open_amount': Coalesce(Sum('amount', filter=Q(status='order')), Decimal('0')),
+            'cancelled_amount': Coalesce(Sum('amount', filter=Q(status='cancel')), Decimal('0')),
+            'total_amount': Coalesce(Sum('amount', filter=sold), Decimal('0')),
+            'total_quantity': Coalesce(Sum('quantity', filter=sold), Decimal('0')),
+            'line_count': Coalesce(Sum('line_count', filter=sold), 0),
+        }
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['start_date'], context['end_date'] = self.date_range
+        context['sales_type'] = self.request.GET.get('sales_type', '')
+        context['sales_type_choices'] = SalesOrder.SALES_TYPE
+        if self.paginate_by:
+            context['totals'] = self.get_facts().aggregate(**self.get_totals())
+        else:
+            # Every row is on the page: add them up rather than scan the range again
+            context['totals'] = {
+                name: sum((row[name] for row in self.object_list), Decimal('0'))
+                for name in self.get_totals()
+            }
+        params = self.request.GET.copy()
+        params.pop('page', None)
+        context['query_params'] = params.urlencode()
+        return context
+
+
+class SalesDailyReportView(SalesFactReportMixin, ListView):
+    """Sales per day, this month to date unless a range is given"""
     template_name = 'sales/sales_daily_report.html'
-    context_object_name = 'reports'
-    
+
     def get_queryset(self):
-        from django.utils import timezone
-        today = timezone.now().date()
-        return SalesOrder.objects.filter(order_date=today)
+        return self.get_facts().values('date').annotate(**self.get_totals()).order_by('-date')
 
 
-class SalesMonthlyReportView(ListView):
-    model = SalesOrder
+class SalesMonthlyReportView(SalesFactReportMixin, ListView):
+    """Sales per month of a year, the current one unless ?year= is given"""
     template_name = 'sales/sales_monthly_report.html'
-    context_object_name = 'reports'
-    
+
+    def get_date_range(self):
+        year = self.request.GET.get('year', '')
+        year = int(year) if year.isdigit() and 1900 <= int(year) <= 9999 else timezone.localdate().year
+        return date(year, 1, 1), date(year, 12, 31)
+
     def get_queryset(self):
-        from django.utils import timezone
-        now = timezone.now()
-        return SalesOrder.objects.filter(
-            order_date__year=now.year,
-            order_date__month=now.month
-        )
+        # Grouped by day in SQL, where truncating each row's date to its
+        # month would be a function call per row, then summed per month
+        months = {}
+        for row in self.get_facts().values('date').annotate(**self.get_totals()).order_by('date'):
+            month = row.pop('date').replace(day=1)
+            if month in months:
+                for name, value in row.items():
+                    months[month][name] += value
+            else:
+                months[month] = {'month': month, **row}
+        return list(months.values())
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['year'] = self.date_range[0].year
+        return context
 
-class SalesCustomerReportView(ListView):
-    model = SalesOrder
-    template_name = 'sales/sales_customer_report.html'
-    context_object_name = 'reports'
 
+class SalesCustomerReportView(SalesFactReportMixin, ListView):
+    """Sales per customer over a date range, largest first; walk-in sales are one row"""
+    template_name = 'sales/sales_customer_report.html'
+    paginate_by = 50
 
+    def get_queryset(self):
+        return self.get_facts().values('customer', 'customer__name').annotate(
+            **self.get_totals()
+        ).order_by('-total_amount', 'customer__name')
 
 
 def mark_order_delivered(request, order_id):
     """Mark sales order as delivered"""
+    order = get_object_or_404(SalesOrder, id=order_id)
     try:
-        with transaction.atomic():
-            order = get_object_or_404(SalesOrder, id=order_id)
-            
-            if order.status != 'order':
-                messages.error(request, f"Order {order.order_number} cannot be marked as delivered. Current status: {order.get_status_display()}")
-                return redirect('sales:order_detail', order_id)
-            
-            order.mark_delivered(user=request.user)
+        # mark_delivered() runs its own transaction and locks what it posts
+        if order.mark_delivered(user=request.user):
             messages.success(request, f"Order {order.order_number} marked as delivered successfully!")
-            
+        else:
+            messages.error(request, f"Order {order.order_number} cannot be marked as delivered. Current status: {order.get_status_display()}")
+    except InsufficientStockError as e:
+        messages.error(request, f"Order {order.order_number} was not delivered. {e}")
     except Exception as e:
         messages.error(request, f"Error marking order as delivered: {str(e)}")
     
     return redirect('sales:order_detail', order_id)
 
 
+# Failed orders spelled out in the bulk status message
+BULK_REPORT_LIMIT = 10
+
+
+@require_POST
+def bulk_order_status(request):
+    """Deliver or cancel the orders ticked on the order list, then return to it"""
+    order_ids = parse_order_ids(request.POST.getlist('orders'))
+    status = request.POST.get('status')
+    redirect_to = reverse('sales:order_list')
+    if request.POST.get('query'):
+        redirect_to += '?' + request.POST['query']
+    if not order_ids or status not in SALES_TRANSITIONS:
+        messages.error(request, "Select the orders and the status to move them to.")
+        return redirect(redirect_to)
+    try:
+        report = transition_sales_orders(order_ids, status, user=request.user)
+    except Exception as e:
+        messages.error(request, f"Error updating orders: {str(e)}")
+        return redirect(redirect_to)
+
+    changed = sum(1 for result in report if result['changed'])
+    failed = [result for result in report if not result['changed']]
+    if changed:
+        messages.success(request, f"{changed} orders marked as {dict(SalesOrder.ORDER_STATUS)[status]}.")
+    if failed:
+        details = '; '.join(f"{result['order_number'] or result['id']}: {result['error']}" for result in failed[:BULK_REPORT_LIMIT])
+        more = f" (and {len(failed) - BULK_REPORT_LIMIT} more)" if len(failed) > BULK_REPORT_LIMIT else ''
+        messages.error(request, f"{len(failed)} orders were not changed. {details}{more}")
+    return redirect(redirect_to)
+
+
+@require_POST
+def bulk_order_status_json(request):
+    """
+    Bulk status API: POST {"orders": [ids], "status": "delivered" or
+    "cancel"}. Responds with the number changed and a result per order.
+    Send the csrftoken cookie (set by the order list page) in an X-CSRFToken
+    header.
+    """
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        payload = None
+    order_ids = parse_order_ids(payload.get('orders')) if isinstance(payload, dict) else None
+    status = payload.get('status') if isinstance(payload, dict) else None
+    if not order_ids or status not in SALES_TRANSITIONS:
+        return JsonResponse({
+            'error': 'invalid',
+            'message': f"Send order ids in \"orders\" and a status in {sorted(SALES_TRANSITIONS)}.",
+        }, status=400)
+
+    report = transition_sales_orders(order_ids, status, user=request.user if request.user.is_authenticated else None)
+    return JsonResponse({
+        'status': status,
+        'changed': sum(1 for result in report if result['changed']),
+        'results': report,
+    })
+
+
 def cancel_sales_order(request, order_id):
     """Cancel sales order"""
     try:
@@ -209,8 +374,10 @@ def cancel_sales_order(request, order_id):
                 messages.warning(request, f"Order {order.order_number} is already cancelled.")
                 return redirect('sales:order_detail', order_id)
             
-            order.cancel_order(user=request.user)
-            messages.success(request, f"Order {order.order_number} cancelled successfully!")
+            if order.cancel_order(user=request.user):
+                messages.success(request, f"Order {order.order_number} cancelled successfully!")
+            else:
+                messages.error(request, f"Order {order.order_number} cannot be cancelled. Current status: {order.get_status_display()}")
             
     except Exception as e:
         messages.error(request, f"Error cancelling order: {str(e)}")
@@ -219,33 +386,59 @@ def cancel_sales_order(request, order_id):
 
 
 def sales_order_invoice(request, order_id):
-    """Generate PDF invoice for sales order"""
+    """PDF invoice for sales order, served from the invoice cache unless the order changed"""
     try:
-        order = get_object_or_404(SalesOrder, id=order_id)
-        
-        # Get template
-        template = get_template('sales/invoice_pdf.html')
-        
-        # Prepare context
-        context = {
-            'order': order,
-            'items': order.items.all(),
-            'company_name': 'Sun Electric',
-            'company_address': '123 Business Street, City, Country',
-            'company_phone': '+1 234 567 8900',
-        }
-        
-        # Render HTML
-        html = template.render(context)
-        
-        # For now, return HTML response (can be enhanced with PDF generation later)
-        return HttpResponse(html, content_type='text/html')
+        order = get_object_or_404(invoice_queryset(), id=order_id)
+        response = HttpResponse(get_invoice_pdf(order), content_type='application/pdf')
+        response['Content-Disposition'] = f'inline; filename="{order.order_number}.pdf"'
+        return response
         
     except Exception as e:
         messages.error(request, f"Error generating invoice: {str(e)}")
         return redirect('sales:order_detail', order_id)
 
 
+CHECKOUT_ERROR_STATUS = {'invalid': 400, 'price_changed': 409, 'insufficient_stock': 409}
+
+
+@require_POST
+def instant_sale_checkout(request):
+    """
+    JSON checkout for point-of-sale tills. The body is a cart:
+    {"items": [{"product": id, "quantity": "2", "unit_price": "450.00"}],
+    "customer_name": "...", "notes": "..."}. Send an Idempotency-Key header
+    (or "idempotency_key" in the body) so a retried request returns the
+    first sale (200) instead of posting it again (201). Like every POST here
+    it needs the CSRF token: send the csrftoken cookie (set by the instant
+    sales page) back in an X-CSRFToken header.
+    """
+    try:
+        cart = json.loads(request.body)
+    except ValueError:
+        cart = None
+    if not isinstance(cart, dict):
+        return JsonResponse({'error': 'invalid', 'message': 'The request body must be a JSON object.'}, status=400)
+
+    idempotency_key = request.headers.get('Idempotency-Key') or cart.get('idempotency_key')
+    try:
+        order, created = checkout_instant_sale(
+            cart,
+            idempotency_key=str(idempotency_key) if idempotency_key else None,
+            user=request.user if request.user.is_authenticated else None,
+        )
+    except CheckoutError as e:
+        return JsonResponse(
+            {'error': e.code, 'message': str(e), 'details': e.details},
+            status=CHECKOUT_ERROR_STATUS[e.code],
+        )
+    return JsonResponse({
+        'order_id': order.pk,
+        'order_number': order.order_number,
+        'total_amount': str(order.total_amount),
+        'replayed': not created,
+    }, status=201 if created else 200)
+
+
 class InstantSalesCreateView(CreateView):
     """View for creating instant sales"""
     model = SalesOrder
@@ -264,76 +457,34 @@ class InstantSalesCreateView(CreateView):
             context['formset'] = SalesOrderItemFormSetCustom()
         
         # Add data for filtering
-        context['products'] = Product.objects.filter(is_active=True).select_related('category', 'brand')
         context['categories'] = ProductCategory.objects.filter(is_active=True)
         context['brands'] = ProductBrand.objects.filter(is_active=True)
         
         return context
     
     def form_valid(self, form):
+        formset = SalesOrderItemFormSetCustom(self.request.POST, instance=form.instance)
+        if not formset.is_valid():
+            messages.error(self.request, "Please fix the errors in the product selection.")
+            return self.form_invalid(form)
+        
+        lines = formset.get_lines()
         try:
-            print(f"DEBUG: Form is valid, data: {form.cleaned_data}")
-            print(f"DEBUG: POST data: {self.request.POST}")
-            
-            with transaction.atomic():
-                # Generate unique order number
-                order_number = f"IS-{uuid.uuid4().hex[:8].upper()}"
-                form.instance.order_number = order_number
-                form.instance.sales_type = 'instant'
-                form.instance.status = 'delivered'  # Instant sales are immediately delivered
-                form.instance.created_by = self.request.user
-                
-                # Save the order first
-                self.object = form.save()
-                print(f"DEBUG: Order saved with ID: {self.object.id}")
-                
-                # Handle formset - create with the saved instance
-                formset = SalesOrderItemFormSetCustom(self.request.POST, instance=self.object)
-                print(f"DEBUG: Formset is_valid: {formset.is_valid()}")
-                print(f"DEBUG: Formset errors: {formset.errors}")
-                
-                if formset.is_valid():
-                    formset.save()
-                    print(f"DEBUG: Formset saved successfully")
-                    
-                    # Calculate total amount
-                    total_amount = sum(item.total_price for item in self.object.items.all())
-                    self.object.total_amount = total_amount
-                    self.object.save()
-                    print(f"DEBUG: Total amount set to: {total_amount}")
-                    
-                    # Inventory is calculated in real-time from sales orders
-                    # Instant sales (sales_type='instant') are automatically included
-                    # in the real-time inventory calculation, so no manual update needed
-                    
-                    # Low stock alerts are now calculated dynamically based on min_stock_level
-                    # No need to create/store alerts - they're computed in real-time
-                    
-                    items_count = self.object.items.count()
-                    print(f"DEBUG: Final items count: {items_count}")
-                    if items_count > 0:
-                        messages.success(self.request, f"Instant sale {order_number} completed successfully with {items_count} products! Total: ৳{total_amount}")
-                    else:
-                        messages.warning(self.request, f"Instant sale {order_number} created without items. Please add products to complete the sale.")
-                else:
-                    print(f"DEBUG: Formset validation failed: {formset.errors}")
-                    messages.error(self.request, f"Please fix the errors in the product selection. Errors: {formset.errors}")
-                    return self.form_invalid(form)
-                
-                # Return redirect response
-                return redirect(self.success_url)
-                
+            # Instant sales are delivered immediately, so stock goes down now
+            self.object = save_instant_sale(form.instance, lines, user=self.request.user)
+        except InsufficientStockError as e:
+            # The order was rolled back with the stock posting
+            messages.error(self.request, f"Instant sale not completed. {e}")
+            return self.form_invalid(form)
         except Exception as e:
-            print(f"DEBUG: Exception occurred: {str(e)}")
             messages.error(self.request, f"Error creating instant sale: {str(e)}")
             return self.form_invalid(form)
-    
-    def form_invalid(self, form):
-        print(f"DEBUG: Form is invalid, errors: {form.errors}")
-        if hasattr(self, 'object') and self.object:
-            formset = SalesOrderItemFormSetCustom(self.request.POST, instance=self.object)
-            print(f"DEBUG: Formset errors: {formset.errors}")
-        return super().form_invalid(form)
+        
+        if lines:
+            messages.success(self.request, f"Instant sale {self.object.order_number} completed successfully with {len(lines)} products! Total: ৳{self.object.total_amount}")
+        else:
+            messages.warning(self.request, f"Instant sale {self.object.order_number} created without items. Please add products to complete the sale.")
+        return redirect(self.success_url)
 
 
 class InstantSalesUpdateView(UpdateView):
@@ -354,40 +505,27 @@ class InstantSalesUpdateView(UpdateView):
             context['formset'] = SalesOrderItemFormSet(instance=self.object)
         
         # Add data for filtering
-        context['products'] = Product.objects.filter(is_active=True).select_related('category', 'brand')
         context['categories'] = ProductCategory.objects.filter(is_active=True)
         context['brands'] = ProductBrand.objects.filter(is_active=True)
         
         return context
     
     def form_valid(self, form):
+        formset = SalesOrderItemFormSet(self.request.POST, instance=self.object)
+        if not formset.is_valid():
+            messages.error(self.request, "Please fix the errors in the product selection.")
+            return self.form_invalid(form)
+        
+        lines = formset.get_lines()
         try:
-            with transaction.atomic():
-                # Ensure sales_type remains 'instant'
-                form.instance.sales_type = 'instant'
-                form.instance.status = 'delivered'  # Instant sales are immediately delivered
-                
-                # Save the order
-                response = super().form_valid(form)
-                
-                # Handle formset
-                formset = SalesOrderItemFormSet(self.request.POST, instance=self.object)
-                if formset.is_valid():
-                    formset.save()
-                    
-                    # Calculate total amount
-                    total_amount = sum(item.total_price for item in self.object.items.all())
-                    self.object.total_amount = total_amount
-                    self.object.save()
-                    
-                    items_count = self.object.items.count()
-                    messages.success(self.request, f"Instant sale {self.object.order_number} updated successfully with {items_count} products! Total: ৳{total_amount}")
-                else:
-                    messages.error(self.request, "Please fix the errors in the product selection.")
-                    return self.form_invalid(form)
-                
-                return response
-                
+            # Stays an instant sale, delivered as saved
+            self.object = save_instant_sale(form.instance, lines)
+        except InsufficientStockError as e:
+            messages.error(self.request, f"Instant sale not updated. {e}")
+            return self.form_invalid(form)
         except Exception as e:
             messages.error(self.request, f"Error updating instant sale: {str(e)}")
             return self.form_invalid(form)
+        
+        messages.success(self.request, f"Instant sale {self.object.order_number} updated successfully with {len(lines)} products! Total: ৳{self.object.total_amount}")
+        return redirect(self.get_success_url())
@@ -0,0 +1,277 @@
+/**
+ * Product autocomplete for order line formsets.
+ *
+ * Works on the markup rendered by stock.forms.ProductAutocompleteWidget:
+ *
+ *   <div class="product-autocomplete" data-search-url="...">
+ *     <input type="hidden" name="form-0-product">
+ *     <input type="text" class="product-autocomplete-input">
+ *     <div class="dropdown-menu product-autocomplete-menu"></div>
+ *   </div>
+ *
+ * Events are delegated from the document, so rows cloned by "Add Product"
+ * work without re-binding. Matches come from the catalog payload at
+ * data-catalog-url, fetched once per page (the browser revalidates it with
+ * its ETag), filtered by the query and the category/brand filter selects of
+ * the surrounding .product-row. If the catalog cannot be loaded the search
+ * endpoint at data-search-url is queried instead. Choosing a product
+ * dispatches a bubbling "product-selected" event whose detail is the product
+ * from the search endpoint (null when the selection is cleared).
+ *
+ * ProductAutocomplete.availability(widget, productId, excludeOrder) resolves
+ * to the available-to-promise figures from data-availability-url. Lookups
+ * made in the same tick are sent as one request for all their products.
+ */
+(function () {
+    'use strict';
+
+    const DEBOUNCE_MS = 250;
+    const RESULT_LIMIT = 15;
+    const cache = new Map();
+    const catalogs = new Map();
+    const timers = new WeakMap();
+
+    function parts(widget) {
+        return {
+            hidden: widget.querySelector('input[type="hidden"]'),
+            input: widget.querySelector('.product-autocomplete-input'),
+            menu: widget.querySelector('.product-autocomplete-menu'),
+        };
+    }
+
+    function filterParams(widget) {
+        const params = new URLSearchParams();
+        const row = widget.closest('.product-row');
+        if (row) {
+            const category = row.querySelector('.category-select');
+            const brand = row.querySelector('.brand-select');
+            if (category && category.value) params.set('category', category.value);
+            if (brand && brand.value) params.set('brand', brand.value);
+        }
+        return params;
+    }
+
+    function searchUrl(widget, query) {
+        const params = filterParams(widget);
+        params.set('q', query);
+        params.set('limit', RESULT_LIMIT);
+        return `${widget.dataset.searchUrl}?${params}`;
+    }
+
+    function hasFilters(widget) {
+        return filterParams(widget).toString() !== '';
+    }
+
+    function fetchProducts(url) {
+        if (!cache.has(url)) {
+            const request = fetch(url, { headers: { 'X-Requested-With': 'XMLHttpRequest' } })
+                .then(response => (response.ok ? response.json() : { results: [] }))
+                .then(data => data.results || [])
+                .catch(() => {
+                    cache.delete(url);
+                    return [];
+                });
+            cache.set(url, request);
+        }
+        return cache.get(url);
+    }
+
+    function loadCatalog(url) {
+        if (!catalogs.has(url)) {
+            const request = fetch(url, { headers: { 'X-Requested-With': 'XMLHttpRequest' } })
+                .then(response => (response.ok ? response.json() : null))
+                .then(data => {
+                    if (!data) return null;
+                    return data.products.map(row => {
+                        const product = {};
+                        data.fields.forEach((field, index) => { product[field] = row[index]; });
+                        product.brand = data.brands[product.brand_id] || '';
+                        product.category = data.categories[product.category_id] || '';
+                        product.text = `${product.name} ${product.brand} ${product.category}`.toLowerCase();
+                        return product;
+                    });
+                })
+                .catch(() => null);
+            catalogs.set(url, request);
+        }
+        return catalogs.get(url);
+    }
+
+    function filterCatalog(widget, catalog, query) {
+        const filters = filterParams(widget);
+        const category = filters.get('category');
+        const brand = filters.get('brand');
+        const terms = query.toLowerCase().split(/\s+/).filter(Boolean);
+        const matches = catalog.filter(product =>
+            (!category || String(product.category_id) === category) &&
+            (!brand || String(product.brand_id) === brand) &&
+            terms.every(term => product.text.includes(term))
+        );
+        if (terms.length) {
+            // Names starting with the first term come first; the catalog is sorted by name
+            const first = terms[0];
+            matches.sort((a, b) =>
+                Number(!a.name.toLowerCase().startsWith(first)) - Number(!b.name.toLowerCase().startsWith(first))
+            );
+        }
+        return matches.slice(0, RESULT_LIMIT);
+    }
+
+    function findProducts(widget, query) {
+        const catalogUrl = widget.dataset.catalogUrl;
+        const catalog = catalogUrl ? loadCatalog(catalogUrl) : Promise.resolve(null);
+        return catalog.then(products => (
+            products ? filterCatalog(widget, products, query) : fetchProducts(searchUrl(widget, query))
+        ));
+    }
+
+    const availabilityQueues = new Map();
+
+    function availability(widget, productId, excludeOrder) {
+        const url = widget.dataset.availabilityUrl;
+        const key = `${url}|${excludeOrder || ''}`;
+        let queue = availabilityQueues.get(key);
+        if (!queue) {
+            queue = { ids: new Set() };
+            queue.request = new Promise(resolve => setTimeout(resolve, 0)).then(() => {
+                availabilityQueues.delete(key);
+                const params = new URLSearchParams({ ids: Array.from(queue.ids).join(',') });
+                if (excludeOrder) params.set('exclude_order', excludeOrder);
+                return fetch(`${url}?${params}`, { headers: { 'X-Requested-With': 'XMLHttpRequest' } })
+                    .then(response => (response.ok ? response.json() : { results: {} }))
+                    .then(data => data.results || {})
+                    .catch(() => ({}));
+            });
+            availabilityQueues.set(key, queue);
+        }
+        queue.ids.add(String(productId));
+        return queue.request.then(results => results[productId] || null);
+    }
+
+    function hideMenu(widget) {
+        const { menu } = parts(widget);
+        menu.classList.remove('show');
+        menu.innerHTML = '';
+    }
+
+    function renderMenu(widget, products) {
+        const { menu } = parts(widget);
+        menu.innerHTML = '';
+        if (!products.length) {
+            const empty = document.createElement('span');
+            empty.className = 'dropdown-item-text text-muted';
+            empty.textContent = 'No matching products';
+            menu.appendChild(empty);
+        }
+        products.forEach((product, index) => {
+            const item = document.createElement('button');
+            item.type = 'button';
+            item.className = 'dropdown-item' + (index === 0 ? ' active' : '');
+            const name = document.createElement('div');
+            name.textContent = `${product.name} (${product.unit})`;
+            const details = document.createElement('small');
+            details.className = 'text-muted';
+            details.textContent = [product.brand, product.category, `Stock: ${product.on_hand}`]
+                .filter(Boolean).join(' · ');
+            item.appendChild(name);
+            item.appendChild(details);
+            item.productData = product;
+            menu.appendChild(item);
+        });
+        menu.classList.add('show');
+    }
+
+    function search(widget) {
+        const { input } = parts(widget);
+        const query = input.value.trim();
+        if (!query && !hasFilters(widget)) {
+            hideMenu(widget);
+            return;
+        }
+        findProducts(widget, query).then(products => {
+            // Ignore responses for text the user has already changed
+            if (input.value.trim() === query && document.activeElement === input) {
+                renderMenu(widget, products);
+            }
+        });
+    }
+
+    function select(widget, product) {
+        const { hidden, input } = parts(widget);
+        hidden.value = product ? product.id : '';
+        input.value = product ? `${product.name} (${product.unit})` : '';
+        hideMenu(widget);
+        widget.dispatchEvent(new CustomEvent('product-selected', { bubbles: true, detail: product }));
+    }
+
+    function clear(widget) {
+        const { hidden, input } = parts(widget);
+        hidden.value = '';
+        input.value = '';
+        hideMenu(widget);
+    }
+
+    function moveActive(widget, step) {
+        const items = Array.from(parts(widget).menu.querySelectorAll('.dropdown-item'));
+        if (!items.length) return;
+        const current = items.findIndex(item => item.classList.contains('active'));
+        const next = (current + step + items.length) % items.length;
+        items.forEach((item, index) => item.classList.toggle('active', index === next));
+        items[next].scrollIntoView({ block: 'nearest' });
+    }
+
+    document.addEventListener('input', function (e) {
+        if (!e.target.classList.contains('product-autocomplete-input')) return;
+        const widget = e.target.closest('.product-autocomplete');
+        const { hidden } = parts(widget);
+        if (hidden.value) {
+            // Typing over a chosen product drops the selection
+            hidden.value = '';
+            widget.dispatchEvent(new CustomEvent('product-selected', { bubbles: true, detail: null }));
+        }
+        clearTimeout(timers.get(widget));
+        timers.set(widget, setTimeout(() => search(widget), DEBOUNCE_MS));
+    });
+
+    document.addEventListener('focusin', function (e) {
+        if (!e.target.classList.contains('product-autocomplete-input')) return;
+        const widget = e.target.closest('.product-autocomplete');
+        if (!parts(widget).hidden.value) search(widget);
+    });
+
+    document.addEventListener('keydown', function (e) {
+        if (!e.target.classList.contains('product-autocomplete-input')) return;
+        const widget = e.target.closest('.product-autocomplete');
+        const { menu } = parts(widget);
+        if (!menu.classList.contains('show')) return;
+        if (e.key === 'ArrowDown' || e.key === 'ArrowUp') {
+            e.preventDefault();
+            moveActive(widget, e.key === 'ArrowDown' ? 1 : -1);
+        } else if (e.key === 'Enter') {
+            const active = menu.querySelector('.dropdown-item.active');
+            if (active) {
+                e.preventDefault();
+                select(widget, active.productData);
+            }
+        } else if (e.key === 'Escape') {
+            hideMenu(widget);
+        }
+    });
+
+    document.addEventListener('mousedown', function (e) {
+        const item = e.target.closest('.product-autocomplete-menu .dropdown-item');
+        if (item) {
+            // mousedown so the choice lands before the input loses focus
+            e.preventDefault();
+            select(item.closest('.product-autocomplete'), item.productData);
+            return;
+        }
+        document.querySelectorAll('.product-autocomplete-menu.show').forEach(menu => {
+            if (!menu.closest('.product-autocomplete').contains(e.target)) {
+                hideMenu(menu.closest('.product-autocomplete'));
+            }
+        });
+    });
+
+    window.ProductAutocomplete = { clear: clear, availability: availability };
+})();
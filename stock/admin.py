@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import ProductCategory, ProductBrand, UnitType, Product
+from .models import ProductCategory, ProductBrand, UnitType, Product, StockBalance, StockMovement, StockSnapshot, CostLayer, ReorderSuggestion, PriceRevision, ProductPriceHistory
 
 
 @admin.register(ProductCategory)
@@ -32,11 +32,74 @@ class UnitTypeAdmin(admin.ModelAdmin):
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ['name', 'category', 'brand', 'unit_type', 'cost_price', 'selling_price', 'is_active']
+    list_display = ['name', 'sku', 'category', 'brand', 'unit_type', 'cost_price', 'selling_price', 'is_active']
     list_filter = ['category', 'brand', 'unit_type', 'is_active', 'created_at']
-    search_fields = ['name', 'description', 'category__name', 'brand__name']
+    search_fields = ['name', 'sku', 'description', 'category__name', 'brand__name']
     readonly_fields = ['created_at', 'updated_at']
 
 
-# Stock model removed - inventory is now calculated in real-time
+@admin.register(StockBalance)
+class StockBalanceAdmin(admin.ModelAdmin):
+    list_display = ['product', 'received_quantity', 'delivered_quantity', 'quantity', 'last_received_cost', 'updated_at']
+    search_fields = ['product__name']
+    list_select_related = ['product']
+    readonly_fields = ['product', 'received_quantity', 'delivered_quantity', 'quantity', 'last_received_cost', 'last_received_date', 'updated_at']
+
+
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    list_display = ['movement_date', 'product', 'movement_type', 'quantity', 'unit_cost', 'cost_amount', 'reference']
+    list_filter = ['movement_type', 'movement_date']
+    search_fields = ['product__name', 'reference']
+    list_select_related = ['product']
+    date_hierarchy = 'movement_date'
+    readonly_fields = ['product', 'movement_type', 'movement_date', 'quantity', 'unit_cost', 'cost_amount', 'reference', 'source_id', 'created_at']
+
+
+@admin.register(StockSnapshot)
+class StockSnapshotAdmin(admin.ModelAdmin):
+    list_display = ['snapshot_date', 'product', 'quantity']
+    list_filter = ['snapshot_date']
+    search_fields = ['product__name']
+    list_select_related = ['product']
+    readonly_fields = ['product', 'snapshot_date', 'quantity', 'created_at']
+
+
+@admin.register(CostLayer)
+class CostLayerAdmin(admin.ModelAdmin):
+    list_display = ['product', 'layer_date', 'unit_cost', 'quantity', 'remaining_quantity']
+    list_filter = ['layer_date']
+    search_fields = ['product__name']
+    list_select_related = ['product']
+    readonly_fields = ['product', 'movement', 'layer_date', 'unit_cost', 'quantity', 'remaining_quantity']
+
+
+@admin.register(ReorderSuggestion)
+class ReorderSuggestionAdmin(admin.ModelAdmin):
+    list_display = ['product', 'as_of', 'average_daily_demand', 'on_hand', 'days_of_cover', 'suggested_quantity']
+    list_filter = ['as_of']
+    search_fields = ['product__name']
+    list_select_related = ['product']
+    readonly_fields = [
+        'product', 'as_of', 'average_daily_demand', 'ewma_daily_demand', 'demand_std', 'on_hand',
+        'on_order', 'days_of_cover', 'reorder_point', 'suggested_quantity', 'computed_at',
+    ]
+
+
+class ProductPriceHistoryInline(admin.TabularInline):
+    model = ProductPriceHistory
+    fields = ['product', 'old_price', 'new_price']
+    readonly_fields = ['product', 'old_price', 'new_price']
+    can_delete = False
+    extra = 0
+
+
+@admin.register(PriceRevision)
+class PriceRevisionAdmin(admin.ModelAdmin):
+    list_display = ['created_at', 'field', 'change_type', 'value', 'round_to', 'description', 'product_count', 'created_by']
+    list_filter = ['field', 'change_type', 'created_at']
+    readonly_fields = ['field', 'change_type', 'value', 'round_to', 'description', 'product_count', 'created_by', 'created_at']
+    inlines = [ProductPriceHistoryInline]
+
+
 # StockAlert model removed - alerts are now calculated dynamically based on min_stock_level
@@ -0,0 +1,57 @@
+"""
+Compact product catalog for client-side filtering on order entry pages.
+
+The payload lists active products as rows of CATALOG_FIELDS with brand and
+category names in lookup tables. It is built once per catalog version
+(get_catalog_version(), bumped by stock.signals and StockBalance updates)
+and kept in the cache with a strong ETag (hash of the bytes), so serving it
+is a cache read and browsers revalidate with a 304. Purchase cost is left
+out; the purchase entry page asks for the variant with a cost_price column.
+"""
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Product, ProductBrand, ProductCategory, get_catalog_version
+
+CATALOG_FIELDS = ['id', 'name', 'brand_id', 'category_id', 'unit', 'selling_price', 'on_hand']
+PURCHASE_CATALOG_FIELDS = CATALOG_FIELDS + ['cost_price']
+# Payloads of old versions simply expire
+CATALOG_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def build_catalog(version, with_costs=False):
+    """Catalog payload (dict) for the current database state"""
+    fields = PURCHASE_CATALOG_FIELDS if with_costs else CATALOG_FIELDS
+    products = (
+        Product.objects.filter(is_active=True)
+        .with_stock()
+        .order_by('name')
+        .values_list('pk', 'name', 'brand_id', 'category_id', 'unit_type__code', 'selling_price', 'on_hand', 'cost_price')
+    )
+    return {
+        'version': version,
+        'fields': fields,
+        'brands': dict(ProductBrand.objects.values_list('pk', 'name')),
+        'categories': dict(ProductCategory.objects.values_list('pk', 'name')),
+        'products': [
+            [pk, name, brand_id, category_id, unit, str(selling_price), str(on_hand), str(cost_price)][:len(fields)]
+            for pk, name, brand_id, category_id, unit, selling_price, on_hand, cost_price in products
+        ],
+    }
+
+
+def get_catalog_payload(with_costs=False):
+    """(version, etag, JSON bytes) of the current catalog, built at most once per version"""
+    version = get_catalog_version()
+    cache_key = f"stock:{'purchase_catalog' if with_costs else 'catalog'}:{version}"
+    cached = cache.get(cache_key)
+    if cached is None:
+        content = json.dumps(build_catalog(version, with_costs), cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+        etag = '"%s"' % hashlib.sha256(content).hexdigest()[:32]
+        cached = (etag, content)
+        cache.set(cache_key, cached, CATALOG_CACHE_TIMEOUT)
+    etag, content = cached
+    return version, etag, content
@@ -0,0 +1,271 @@
+"""
+Inventory cost engine.
+
+Consumes the StockMovement journal in posting order and maintains, per
+product, FIFO cost layers (CostLayer) and a moving-average cost on
+StockBalance. Each movement is costed exactly once (StockMovement.cost_amount
+is set), so every run only processes movements posted since the last one.
+Delivered SalesOrderItem rows receive their cost of goods sold, so P&L and
+valuation reads never replay history.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Sum
+
+from .models import Product, StockBalance, StockMovement, CostLayer, get_costing_method
+
+MONEY = Decimal('0.01')
+UNIT_COST = Decimal('0.0001')
+
+
+class ProductCostPosition:
+    """Running cost position of one product while its movements are applied"""
+
+    def __init__(self, balance, layers, fallback_cost):
+        self.balance = balance
+        self.layers = layers
+        self.fallback_cost = fallback_cost
+        self.new_layers = []
+        self.changed_layers = set()
+        # Quantity issued beyond the open layers (oversold), which the next
+        # receipts fill before opening layers of their own. Costed quantity
+        # below what the open layers hold is exactly that backlog.
+        self.backlog = max(sum((layer.remaining_quantity for layer in layers), Decimal('0')) - balance.costed_quantity, Decimal('0'))
+
+    def receive(self, movement, unit_cost):
+        """
+        Stock coming in at unit_cost; returns the value added. Oversold
+        quantity is filled first, so only the rest stays open in the new layer.
+        """
+        value = (movement.quantity * unit_cost).quantize(MONEY)
+        filled = min(self.backlog, movement.quantity)
+        self.backlog -= filled
+        layer = CostLayer(
+            product_id=movement.product_id,
+            movement=movement,
+            layer_date=movement.movement_date,
+            unit_cost=unit_cost.quantize(UNIT_COST),
+            quantity=movement.quantity,
+            remaining_quantity=movement.quantity - filled,
+        )
+        if layer.remaining_quantity > 0:
+            self.layers.append(layer)
+        self.new_layers.append(layer)
+
+        balance = self.balance
+        quantity = balance.costed_quantity + movement.quantity
+        if balance.costed_quantity <= 0 or quantity <= 0:
+            balance.average_cost = unit_cost.quantize(UNIT_COST)
+            balance.average_value = (max(quantity, Decimal('0')) * unit_cost).quantize(MONEY)
+        else:
+            balance.average_value += value
+            balance.average_cost = (balance.average_value / quantity).quantize(UNIT_COST)
+        balance.costed_quantity = quantity
+        balance.fifo_value += (layer.remaining_quantity * unit_cost).quantize(MONEY)
+        return value, value
+
+    def issue(self, quantity, preferred_layers=()):
+        """
+        Take quantity out of stock; returns (fifo_cost, average_cost) of what left.
+        Layers in preferred_layers are consumed first, then the oldest open layers.
+        Stock issued beyond the open layers is costed at the average or fallback cost.
+        """
+        balance = self.balance
+        average_unit = balance.average_cost if balance.costed_quantity > 0 else self.fallback_cost
+        fifo_cost = Decimal('0')
+        remaining = quantity
+        ordered = list(preferred_layers) + [layer for layer in self.layers if layer not in preferred_layers]
+        for layer in ordered:
+            if remaining <= 0:
+                break
+            if layer.remaining_quantity <= 0:
+                continue
+            taken = min(layer.remaining_quantity, remaining)
+            layer.remaining_quantity -= taken
+            remaining -= taken
+            fifo_cost += taken * layer.unit_cost
+            if layer.pk:
+                self.changed_layers.add(layer)
+        fifo_value_out = fifo_cost.quantize(MONEY)
+        if remaining > 0:
+            # Oversold: no layer covers the rest, which later receipts fill
+            fifo_cost += remaining * average_unit
+            self.backlog += remaining
+        fifo_cost = fifo_cost.quantize(MONEY)
+        average_cost = (quantity * average_unit).quantize(MONEY)
+
+        balance.fifo_value -= fifo_value_out
+        balance.costed_quantity -= quantity
+        if balance.costed_quantity > 0:
+            balance.average_value = max(balance.average_value - average_cost, Decimal('0'))
+        else:
+            balance.average_value = Decimal('0')
+        self.layers = [layer for layer in self.layers if layer.remaining_quantity > 0]
+        return fifo_cost, average_cost
+
+
+def process_pending_movements(product_ids=None):
+    """
+    Cost every movement not costed yet, in posting order, optionally only for
+    the given products. Runs inside the caller's transaction with the
+    products' StockBalance rows locked. Returns the number of movements costed.
+    """
+    pending = StockMovement.objects.filter(cost_amount__isnull=True)
+    if product_ids is not None:
+        pending = pending.filter(product_id__in=list(product_ids))
+
+    with transaction.atomic():
+        movements = list(pending.order_by('pk'))
+        if not movements:
+            return 0
+        affected = {movement.product_id for movement in movements}
+        missing = affected - set(StockBalance.objects.filter(product_id__in=affected).values_list('product_id', flat=True))
+        if missing:
+            StockBalance.refresh(missing)
+        balances = StockBalance.objects.select_for_update().in_bulk(affected)
+        fallback_costs = dict(Product.objects.filter(pk__in=affected).values_list('pk', 'cost_price'))
+        open_layers = defaultdict(list)
+        for layer in CostLayer.objects.filter(product_id__in=affected, remaining_quantity__gt=0).select_related('movement'):
+            open_layers[layer.product_id].append(layer)
+
+        positions = {
+            product_id: ProductCostPosition(balances[product_id], open_layers[product_id], fallback_costs[product_id])
+            for product_id in affected
+        }
+        use_average = get_costing_method() == 'average'
+        sale_costs = SaleCostLedger()
+        sale_costs.prime(movements)
+        for movement in movements:
+            position = positions[movement.product_id]
+            if movement.movement_type == StockMovement.PURCHASE and movement.quantity > 0:
+                unit_cost = movement.unit_cost if movement.unit_cost is not None else position.fallback_cost
+                fifo_cost, average_cost = position.receive(movement, unit_cost)
+            elif movement.movement_type == StockMovement.SALE and movement.quantity > 0:
+                # Returned delivery comes back at the cost it went out at
+                unit_cost = sale_costs.unit_cost(movement) or position.balance.average_cost or position.fallback_cost
+                fifo_cost, average_cost = position.receive(movement, unit_cost)
+            else:
+                preferred = []
+                if movement.movement_type == StockMovement.PURCHASE:
+                    # A reversed receipt takes back its own layer first
+                    preferred = [
+                        layer for layer in position.layers
+                        if layer.movement and layer.movement.movement_type == StockMovement.PURCHASE
+                        and layer.movement.source_id == movement.source_id
+                    ]
+                fifo_cost, average_cost = position.issue(-movement.quantity, preferred)
+                fifo_cost, average_cost = -fifo_cost, -average_cost
+            movement.cost_amount = average_cost if use_average else fifo_cost
+            if movement.movement_type == StockMovement.SALE:
+                sale_costs.add(movement)
+
+        StockMovement.objects.bulk_update(movements, ['cost_amount'], batch_size=500)
+        for position in positions.values():
+            CostLayer.objects.bulk_create(position.new_layers, batch_size=500)
+            CostLayer.objects.bulk_update(position.changed_layers, ['remaining_quantity'], batch_size=500)
+        StockBalance.objects.bulk_update(
+            list(balances.values()), ['costed_quantity', 'average_cost', 'average_value', 'fifo_value']
+        )
+        sale_costs.update_line_costs()
+    return len(movements)
+
+
+class SaleCostLedger:
+    """Net quantity and cost per (sales order, product) for the sale movements in a run"""
+
+    def __init__(self):
+        self.totals = {}
+
+    def prime(self, movements):
+        """Load the totals of every sale movement's (order, product) with one grouped query"""
+        keys = {(movement.source_id, movement.product_id) for movement in movements
+                if movement.movement_type == StockMovement.SALE} - set(self.totals)
+        if not keys:
+            return
+        rows = StockMovement.objects.filter(
+            movement_type=StockMovement.SALE,
+            source_id__in={source_id for source_id, _ in keys},
+            product_id__in={product_id for _, product_id in keys},
+            cost_amount__isnull=False,
+        ).values('source_id', 'product_id').annotate(quantity=Sum('quantity'), cost=Sum('cost_amount'))
+        for key in keys:
+            self.totals[key] = [Decimal('0'), Decimal('0')]
+        for row in rows:
+            key = (row['source_id'], row['product_id'])
+            if key in keys:
+                self.totals[key] = [row['quantity'], row['cost']]
+
+    def load(self, key):
+        if key not in self.totals:
+            source_id, product_id = key
+            totals = StockMovement.objects.filter(
+                movement_type=StockMovement.SALE,
+                source_id=source_id,
+                product_id=product_id,
+                cost_amount__isnull=False,
+            ).aggregate(quantity=Sum('quantity'), cost=Sum('cost_amount'))
+            self.totals[key] = [totals['quantity'] or Decimal('0'), totals['cost'] or Decimal('0')]
+        return self.totals[key]
+
+    def unit_cost(self, movement):
+        """Cost per unit at which this order's stock of the product went out"""
+        quantity, cost = self.load((movement.source_id, movement.product_id))
+        if quantity >= 0:
+            return None
+        return cost / quantity
+
+    def add(self, movement):
+        totals = self.load((movement.source_id, movement.product_id))
+        totals[0] += movement.quantity
+        totals[1] += movement.cost_amount
+
+    def update_line_costs(self):
+        """Spread each order's net cost of goods sold over its lines for the product"""
+        from sales.models import SalesOrderItem
+
+        source_ids = {source_id for source_id, _ in self.totals if source_id}
+        if not source_ids:
+            return
+        lines = defaultdict(list)
+        for item in SalesOrderItem.objects.filter(sales_order_id__in=source_ids):
+            lines[(item.sales_order_id, item.product_id)].append(item)
+
+        changed = []
+        for key, (quantity, cost) in self.totals.items():
+            items = lines.get(key, [])
+            line_quantity = sum((item.quantity for item in items), Decimal('0'))
+            for item in items:
+                if quantity < 0 and line_quantity:
+                    item.cost_amount = (-cost * item.quantity / line_quantity).quantize(MONEY)
+                else:
+                    item.cost_amount = None
+                changed.append(item)
+        SalesOrderItem.objects.bulk_update(changed, ['cost_amount'], batch_size=500)
+
+
+def reset_costing():
+    """Discard all cost layers and costed amounts so the journal can be costed again"""
+    from sales.models import SalesOrderItem
+
+    with transaction.atomic():
+        CostLayer.objects.all().delete()
+        StockMovement.objects.update(cost_amount=None)
+        StockBalance.objects.update(
+            costed_quantity=Decimal('0'),
+            average_cost=Decimal('0'),
+            average_value=Decimal('0'),
+            fifo_value=Decimal('0'),
+        )
+        SalesOrderItem.objects.update(cost_amount=None)
+
+
+def get_cost_of_goods_sold(start_date, end_date):
+    """Cost of goods sold for sales orders delivered with an order date in the range"""
+    from sales.models import SalesOrderItem
+
+    return SalesOrderItem.objects.filter(
+        sales_order__status='delivered',
+        sales_order__order_date__range=[start_date, end_date],
+    ).aggregate(total=Sum('cost_amount'))['total'] or Decimal('0')
@@ -1,6 +1,9 @@
 from django import forms
+from django.forms.utils import flatatt
+from django.urls import reverse
 from django.utils import timezone
-from .models import Product, ProductCategory, ProductBrand, UnitType
+from django.utils.html import format_html
+from .models import Product, ProductCategory, ProductBrand, UnitType, PriceRevision
 
 
 class ProductCategoryForm(forms.ModelForm):
@@ -121,7 +124,7 @@ class ProductForm(forms.ModelForm):
     class Meta:
         model = Product
         fields = [
-            'name', 'category', 'brand', 'unit_type', 'description',
+            'name', 'sku', 'category', 'brand', 'unit_type', 'description',
             'cost_price', 'selling_price', 'min_stock_level', 'is_active'
         ]
         widgets = {
@@ -129,6 +132,10 @@ class ProductForm(forms.ModelForm):
                 'class': 'form-control',
                 'placeholder': 'Enter product name'
             }),
+            'sku': forms.TextInput(attrs={
+                'class': 'form-control',
+                'placeholder': 'Enter SKU (optional)'
+            }),
             'category': forms.Select(attrs={
                 'class': 'form-select'
             }),
@@ -167,6 +174,7 @@ class ProductForm(forms.ModelForm):
         }
         labels = {
             'name': 'Product Name',
+            'sku': 'SKU',
             'category': 'Category',
             'brand': 'Brand',
             'unit_type': 'Unit Type',
@@ -202,6 +210,10 @@ class ProductForm(forms.ModelForm):
         
         return selling_price
     
+    def clean_sku(self):
+        """Blank SKUs are stored as NULL so they don't collide"""
+        return (self.cleaned_data.get('sku') or '').strip() or None
+    
     def clean_min_stock_level(self):
         """Validate minimum stock level"""
         min_stock_level = self.cleaned_data.get('min_stock_level')
@@ -340,3 +352,280 @@ class StockReportForm(forms.Form):
             raise forms.ValidationError("From date cannot be after to date.")
         
         return cleaned_data
+
+
+class ProductImportForm(forms.Form):
+    """Upload of a CSV or XLSX product list for stock.importer"""
+    
+    file = forms.FileField(
+        widget=forms.ClearableFileInput(attrs={
+            'class': 'form-control',
+            'accept': '.csv,.xlsx'
+        }),
+        label='Product File',
+        help_text='CSV or Excel (.xlsx) with a header row'
+    )
+    
+    create_references = forms.BooleanField(
+        required=False,
+        initial=True,
+        widget=forms.CheckboxInput(attrs={
+            'class': 'form-check-input'
+        }),
+        label='Create missing categories, brands and units'
+    )
+    
+    def clean_file(self):
+        """Only CSV and XLSX files can be streamed"""
+        upload = self.cleaned_data.get('file')
+        if upload and not upload.name.lower().endswith(('.csv', '.xlsx')):
+            raise forms.ValidationError("Upload a .csv or .xlsx file.")
+        return upload
+
+
+class PriceRevisionForm(forms.Form):
+    """Bulk price change for the products of a category and/or brand"""
+    
+    category = forms.ModelChoiceField(
+        queryset=ProductCategory.objects.filter(is_active=True).order_by('name'),
+        required=False,
+        empty_label="All Categories",
+        widget=forms.Select(attrs={
+            'class': 'form-select'
+        }),
+        label='Category'
+    )
+    
+    brand = forms.ModelChoiceField(
+        queryset=ProductBrand.objects.filter(is_active=True).order_by('name'),
+        required=False,
+        empty_label="All Brands",
+        widget=forms.Select(attrs={
+            'class': 'form-select'
+        }),
+        label='Brand'
+    )
+    
+    include_inactive = forms.BooleanField(
+        required=False,
+        widget=forms.CheckboxInput(attrs={
+            'class': 'form-check-input'
+        }),
+        label='Include inactive products'
+    )
+    
+    field = forms.ChoiceField(
+        choices=PriceRevision.FIELD_CHOICES,
+        widget=forms.Select(attrs={
+            'class': 'form-select'
+        }),
+        label='Price'
+    )
+    
+    change_type = forms.ChoiceField(
+        choices=PriceRevision.CHANGE_CHOICES,
+        widget=forms.Select(attrs={
+            'class': 'form-select'
+        }),
+        label='Change'
+    )
+    
+    value = forms.DecimalField(
+        required=False,
+        max_digits=15,
+        decimal_places=4,
+        widget=forms.NumberInput(attrs={
+            'class': 'form-control',
+            'step': '0.01',
+            'placeholder': 'e.g. 7.5 or -20'
+        }),
+        label='Percentage / Amount'
+    )
+    
+    round_to = forms.DecimalField(
+        required=False,
+        max_digits=15,
+        decimal_places=2,
+        min_value=0.01,
+        widget=forms.NumberInput(attrs={
+            'class': 'form-control',
+            'step': '0.01',
+            'placeholder': 'e.g. 5'
+        }),
+        label='Round to Multiple of'
+    )
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        change_type = cleaned_data.get('change_type')
+        value = cleaned_data.get('value')
+        if change_type in ('percent', 'amount') and not value:
+            self.add_error('value', "Enter the percentage or amount to change prices by.")
+        if change_type == 'percent' and value is not None and value <= -100:
+            self.add_error('value', "A percentage cut must be less than 100%.")
+        if change_type == 'none':
+            cleaned_data['value'] = 0
+            if not cleaned_data.get('round_to'):
+                self.add_error('round_to', "Enter a rounding step or choose a price change.")
+        return cleaned_data
+    
+    def get_products(self):
+        """Products the revision applies to"""
+        products = Product.objects.all()
+        if not self.cleaned_data.get('include_inactive'):
+            products = products.filter(is_active=True)
+        if self.cleaned_data.get('category'):
+            products = products.filter(category=self.cleaned_data['category'])
+        if self.cleaned_data.get('brand'):
+            products = products.filter(brand=self.cleaned_data['brand'])
+        return products
+    
+    def get_description(self):
+        """Short summary of the product selection for the revision record"""
+        parts = [
+            str(self.cleaned_data['category']) if self.cleaned_data.get('category') else 'All categories',
+            str(self.cleaned_data['brand']) if self.cleaned_data.get('brand') else 'all brands',
+        ]
+        if self.cleaned_data.get('include_inactive'):
+            parts.append('including inactive')
+        return ', '.join(parts)
+
+
+class ProductAutocompleteWidget(forms.Widget):
+    """
+    Hidden product id plus a search box (static/js/product_autocomplete.js)
+    that filters the cached catalog payload in the browser, falling back to
+    the product search endpoint; availability is fetched from the batched
+    availability endpoint. Only the selected product is rendered,
+    looked up in the products dict shared with ProductChoiceField.
+    """
+
+    def __init__(self, attrs=None, search_url=None, catalog_url=None, availability_url=None):
+        super().__init__(attrs)
+        self.search_url = search_url
+        self.catalog_url = catalog_url
+        self.availability_url = availability_url
+        self.products = {}
+
+    def render(self, name, value, attrs=None, renderer=None):
+        value = self.format_value(value)
+        product = None
+        if value is not None:
+            try:
+                product = self.products.get(int(value))
+            except (TypeError, ValueError):
+                pass
+        hidden_attrs = {'type': 'hidden', 'name': name, 'value': value or ''}
+        if attrs and attrs.get('id'):
+            hidden_attrs['id'] = attrs['id']
+        text_attrs = {
+            'type': 'text',
+            'class': 'form-control product-autocomplete-input',
+            'placeholder': 'Search products...',
+            **self.attrs,
+            'value': f'{product.name} ({product.unit_type.code})' if product else '',
+            'autocomplete': 'off',
+        }
+        return format_html(
+            '<div class="product-autocomplete position-relative" data-search-url="{}" data-catalog-url="{}"'
+            ' data-availability-url="{}">'
+            '<input{}><input{}><div class="dropdown-menu w-100 product-autocomplete-menu"></div></div>',
+            self.search_url or reverse('stock:product_search_json'),
+            self.catalog_url or reverse('stock:product_catalog_json'),
+            self.availability_url or reverse('stock:product_availability_json'),
+            flatatt(hidden_attrs),
+            flatatt(text_attrs),
+        )
+
+
+class ProductChoiceField(forms.ModelChoiceField):
+    """
+    Product chooser for order lines. Submitted ids are resolved from a products
+    dict (filled in one in_bulk query by ProductFormSetMixin) instead of
+    rendering the catalog as options. Inactive products are rejected unless
+    the line already had that product (current_product_id).
+    """
+    widget = ProductAutocompleteWidget
+
+    def __init__(self, queryset=None, **kwargs):
+        if queryset is None:
+            queryset = Product.objects.select_related('brand', 'category', 'unit_type')
+        super().__init__(queryset, **kwargs)
+        self.current_product_id = None
+        self.use_products({})
+
+    def __deepcopy__(self, memo):
+        result = super().__deepcopy__(memo)
+        result.use_products({})
+        return result
+
+    def use_products(self, products):
+        self.products = products
+        self.widget.products = products
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        if isinstance(value, Product):
+            value = value.pk
+        try:
+            product_id = int(value)
+        except (TypeError, ValueError):
+            raise forms.ValidationError(self.error_messages['invalid_choice'], code='invalid_choice')
+        if product_id not in self.products:
+            self.products.update(self.queryset.in_bulk([product_id]))
+        product = self.products.get(product_id)
+        if product is None or (not product.is_active and product_id != self.current_product_id):
+            raise forms.ValidationError(self.error_messages['invalid_choice'], code='invalid_choice')
+        return product
+
+
+class ProductFormSetMixin:
+    """
+    Loads every product referenced by the formset, submitted or already on
+    the order lines, with a single in_bulk query and shares the result with
+    each form's ProductChoiceField.
+    """
+    product_field = 'product'
+
+    def get_products(self):
+        if not hasattr(self, '_products'):
+            product_ids = set()
+            if self.is_bound:
+                prefix, suffix = f'{self.prefix}-', f'-{self.product_field}'
+                for key, value in self.data.items():
+                    if key.startswith(prefix) and key.endswith(suffix) and str(value).isdigit():
+                        product_ids.add(int(value))
+            if self.initial_form_count():
+                product_ids.update(
+                    getattr(item, f'{self.product_field}_id') for item in self.get_queryset()
+                )
+            field = self.form.base_fields[self.product_field]
+            self._products = field.queryset.in_bulk(product_ids) if product_ids else {}
+        return self._products
+
+    def _construct_form(self, i, **kwargs):
+        form = super()._construct_form(i, **kwargs)
+        field = form.fields.get(self.product_field)
+        if isinstance(field, ProductChoiceField):
+            field.use_products(self.get_products())
+        return form
+
+
+class ProductLineFormSet(ProductFormSetMixin, forms.BaseInlineFormSet):
+    """Base inline formset for order lines with a ProductChoiceField"""
+
+    def get_lines(self):
+        """
+        Unsaved line instances the order should end up with, for the order
+        services: existing lines that are kept plus filled-in new ones.
+        Call after is_valid().
+        """
+        lines = []
+        for form in self.forms:
+            if form.instance.pk is None and not form.has_changed():
+                continue
+            if self.can_delete and self._should_delete_form(form):
+                continue
+            lines.append(form.save(commit=False))
+        return lines
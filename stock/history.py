@@ -0,0 +1,75 @@
+"""
+Stock movement history of one product with a running balance.
+
+Receipts and deliveries are read from the StockMovement journal, which
+already merges received purchase lines and delivered sales lines, newest
+first. Pages are fetched with keyset pagination on (movement_date, id)
+over the (product, movement_date, id) index, so every page costs one
+index range scan of page_size rows no matter how long the history is.
+
+The running balance of the first page comes from the latest snapshot plus
+the movements posted after it (Product.objects.with_stock_as_of()). Each
+cursor carries the position and the balance before it, signed so it cannot
+be forged, which lets later pages continue the balance without summing the
+rows they skip.
+"""
+from datetime import date
+from decimal import Decimal
+
+from django.core import signing
+from django.db.models import Q
+
+from .models import Product, StockMovement
+
+HISTORY_PAGE_SIZE = 50
+CURSOR_SALT = 'stock.history'
+
+
+def encode_cursor(movement, balance):
+    """Opaque cursor for the movements older than ``movement``"""
+    return signing.dumps([movement.movement_date.isoformat(), movement.pk, str(balance)], salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(cursor):
+    """(movement_date, id, balance) from a cursor; None when missing or invalid"""
+    if not cursor:
+        return None
+    try:
+        movement_date, pk, balance = signing.loads(cursor, salt=CURSOR_SALT)
+        return date.fromisoformat(movement_date), int(pk), Decimal(balance)
+    except (signing.BadSignature, TypeError, ValueError, ArithmeticError):
+        return None
+
+
+def movement_history(product, cursor=None, page_size=HISTORY_PAGE_SIZE):
+    """
+    One page of a product's movements, newest first. Returns a dict with
+    ``movements`` (each with a ``balance`` attribute: quantity on hand after
+    it), ``next_cursor`` for the older page (None on the last page) and
+    ``is_first_page``. An invalid cursor starts from the newest movement.
+    """
+    movements = StockMovement.objects.filter(product=product)
+    position = decode_cursor(cursor)
+    if position is not None:
+        movement_date, pk, balance = position
+        movements = movements.filter(
+            Q(movement_date__lt=movement_date) | Q(movement_date=movement_date, pk__lt=pk)
+        )
+    rows = list(movements.order_by('-movement_date', '-pk')[:page_size + 1])
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+
+    if position is None and rows:
+        # Nothing is newer than the first row, so its date covers the whole journal
+        balance = Product.objects.filter(pk=product.pk).with_stock_as_of(
+            rows[0].movement_date
+        ).values_list('journal_quantity', flat=True).get()
+    for movement in rows:
+        movement.balance = balance
+        balance -= movement.quantity
+
+    return {
+        'movements': rows,
+        'next_cursor': encode_cursor(rows[-1], balance) if has_more else None,
+        'is_first_page': position is None,
+    }
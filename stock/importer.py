@@ -0,0 +1,267 @@
+"""
+Bulk product import from CSV or XLSX price lists.
+
+Rows are streamed from the file (csv module, or openpyxl in read-only mode)
+and validated one chunk at a time, so memory stays flat whatever the file
+size. Categories, brands and unit types are resolved through in-memory maps
+loaded once. Each chunk is upserted on Product.sku with a single
+bulk_create(update_conflicts=True) in its own transaction, which also
+creates the references its rows name that do not exist yet, then
+re-indexed for search. Rows that fail validation are reported by row
+number and skipped, leaving nothing behind; the other rows are imported.
+"""
+import csv
+import io
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+from openpyxl import load_workbook
+
+from .models import Product, ProductCategory, ProductBrand, UnitType, bump_catalog_version
+from . import search
+
+IMPORT_COLUMNS = [
+    'sku', 'name', 'category', 'brand', 'unit', 'description',
+    'cost_price', 'selling_price', 'min_stock_level', 'is_active',
+]
+REQUIRED_COLUMNS = ['sku', 'name', 'unit']
+# Product fields overwritten when a row's SKU already exists
+UPDATE_FIELDS = [
+    'name', 'category', 'brand', 'unit_type', 'description',
+    'cost_price', 'selling_price', 'min_stock_level', 'is_active', 'updated_at',
+]
+IMPORT_BATCH_SIZE = 1000
+# Errors kept for display; all of them are counted
+MAX_REPORTED_ERRORS = 500
+
+MONEY = Decimal('0.01')
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'active'}
+FALSE_VALUES = {'0', 'false', 'no', 'n', 'inactive'}
+
+
+class ProductImportError(Exception):
+    """The file cannot be read as a product list at all (format or header)"""
+
+
+class ImportResult:
+    """Counts and per-row errors of one import run"""
+
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.error_count = 0
+        self.errors = []
+
+    @property
+    def imported(self):
+        return self.created + self.updated
+
+    def add_error(self, row_number, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((row_number, message))
+
+
+def normalize_header(header):
+    return [str(column or '').strip().lower().replace(' ', '_') for column in header]
+
+
+def read_csv(fileobj):
+    reader = csv.reader(io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline=''))
+    yield from reader
+
+
+def read_xlsx(fileobj):
+    workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        yield from workbook.active.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def read_rows(fileobj, filename):
+    """
+    Stream (row_number, {column: value}) pairs from a CSV or XLSX file,
+    row_number counting the header as row 1. Blank rows are skipped.
+    """
+    extension = filename.rsplit('.', 1)[-1].lower()
+    if extension == 'csv':
+        rows = read_csv(fileobj)
+    elif extension == 'xlsx':
+        rows = read_xlsx(fileobj)
+    else:
+        raise ProductImportError('Upload a .csv or .xlsx file.')
+
+    try:
+        header = normalize_header(next(rows))
+    except StopIteration:
+        raise ProductImportError('The file is empty.')
+    missing = [column for column in REQUIRED_COLUMNS if column not in header]
+    if missing:
+        raise ProductImportError(f"Missing required columns: {', '.join(missing)}")
+
+    for row_number, values in enumerate(rows, start=2):
+        if not any(value not in (None, '') for value in values):
+            continue
+        yield row_number, dict(zip(header, values))
+
+
+class ProductImporter:
+    """
+    Validates streamed rows and upserts them in batches of batch_size.
+    With create_references=False unknown categories, brands and units are
+    row errors instead of being created.
+    """
+
+    def __init__(self, batch_size=IMPORT_BATCH_SIZE, create_references=True):
+        self.batch_size = batch_size
+        self.create_references = create_references
+        self.categories = {name.lower(): pk for pk, name in ProductCategory.objects.values_list('pk', 'name')}
+        self.brands = {name.lower(): pk for pk, name in ProductBrand.objects.values_list('pk', 'name')}
+        self.units = {code.lower(): pk for pk, code in UnitType.objects.values_list('pk', 'code')}
+        self.reference_models = {
+            'unit_type_id': (self.units, UnitType),
+            'category_id': (self.categories, ProductCategory),
+            'brand_id': (self.brands, ProductBrand),
+        }
+        self.result = ImportResult()
+
+    def run(self, rows):
+        """Import (row_number, row) pairs; returns the ImportResult"""
+        batch = {}
+        for row_number, row in rows:
+            try:
+                product, references = self.build_product(row)
+            except ValueError as e:
+                self.result.add_error(row_number, str(e))
+                continue
+            # A SKU repeated within a batch keeps its last row
+            batch[product.sku] = (product, references)
+            if len(batch) >= self.batch_size:
+                self.save_batch(list(batch.values()))
+                batch = {}
+        if batch:
+            self.save_batch(list(batch.values()))
+        if self.result.imported:
+            bump_catalog_version()
+        return self.result
+
+    def save_batch(self, rows):
+        """Upsert (product, references) pairs, creating the references they name first"""
+        products = [product for product, references in rows]
+        skus = [product.sku for product in products]
+        with transaction.atomic():
+            self.create_missing_references([references for product, references in rows])
+            for product, references in rows:
+                for attname, value in references.items():
+                    lookup, _ = self.reference_models[attname]
+                    setattr(product, attname, lookup[value.lower()] if value else None)
+            existing = Product.objects.filter(sku__in=skus).count()
+            Product.objects.bulk_create(
+                products,
+                update_conflicts=True,
+                unique_fields=['sku'],
+                update_fields=UPDATE_FIELDS,
+            )
+            search.index_products(Product.objects.filter(sku__in=skus).values_list('pk', flat=True))
+        self.result.updated += existing
+        self.result.created += len(products) - existing
+
+    def create_missing_references(self, references):
+        """Create the categories, brands and units named in references that do not exist yet"""
+        for attname, (lookup, model) in self.reference_models.items():
+            missing = {}
+            for names in references:
+                value = names[attname]
+                if value and value.lower() not in lookup:
+                    missing.setdefault(value.lower(), value)
+            for key, value in missing.items():
+                if model is UnitType:
+                    lookup[key] = UnitType.objects.create(code=key, name=value).pk
+                else:
+                    lookup[key] = model.objects.create(name=value).pk
+
+    def build_product(self, row):
+        """
+        (unsaved Product, {foreign key attname: category/brand name or unit
+        code}) for a row; raises ValueError describing the first problem.
+        Nothing is written here: the references are set by save_batch().
+        """
+        sku = self.text(row, 'sku', max_length=64, required=True)
+        name = self.text(row, 'name', max_length=200, required=True)
+        unit_code = self.text(row, 'unit', max_length=20, required=True)
+        category = self.text(row, 'category', max_length=100)
+        brand = self.text(row, 'brand', max_length=100)
+        cost_price = self.decimal(row, 'cost_price')
+        selling_price = self.decimal(row, 'selling_price')
+        if selling_price and cost_price and selling_price < cost_price:
+            raise ValueError('Selling price cannot be less than cost price.')
+        now = timezone.now()
+        product = Product(
+            sku=sku,
+            name=name,
+            description=self.text(row, 'description'),
+            cost_price=cost_price,
+            selling_price=selling_price,
+            min_stock_level=self.decimal(row, 'min_stock_level', max_digits=10),
+            is_active=self.boolean(row, 'is_active'),
+            created_at=now,
+            updated_at=now,
+        )
+        references = {
+            'unit_type_id': self.check_reference(self.units, unit_code, 'unit'),
+            'category_id': self.check_reference(self.categories, category, 'category'),
+            'brand_id': self.check_reference(self.brands, brand, 'brand'),
+        }
+        return product, references
+
+    def check_reference(self, lookup, value, label):
+        """The category/brand name or unit code, unless it is unknown and may not be created"""
+        if value and value.lower() not in lookup and not self.create_references:
+            raise ValueError(f'Unknown {label} "{value}".')
+        return value
+
+    def text(self, row, column, max_length=None, required=False):
+        value = row.get(column)
+        value = '' if value is None else str(value).strip()
+        if required and not value:
+            raise ValueError(f'{column} is required.')
+        if max_length and len(value) > max_length:
+            raise ValueError(f'{column} is longer than {max_length} characters.')
+        return value
+
+    def decimal(self, row, column, max_digits=15):
+        value = row.get(column)
+        if value in (None, ''):
+            return Decimal('0')
+        if isinstance(value, float):
+            # Spreadsheet numbers arrive as binary floats
+            value = round(value, 2)
+        try:
+            number = Decimal(str(value).strip().replace(',', ''))
+        except InvalidOperation:
+            raise ValueError(f'{column} "{value}" is not a number.')
+        if not number.is_finite() or number < 0:
+            raise ValueError(f'{column} must be zero or more.')
+        if number != number.quantize(MONEY) or number >= Decimal(10) ** (max_digits - 2):
+            raise ValueError(f'{column} "{value}" does not fit {max_digits} digits with two decimal places.')
+        return number.quantize(MONEY)
+
+    def boolean(self, row, column):
+        value = row.get(column)
+        if value in (None, ''):
+            return True
+        if isinstance(value, bool):
+            return value
+        value = str(value).strip().lower()
+        if value in TRUE_VALUES:
+            return True
+        if value in FALSE_VALUES:
+            return False
+        raise ValueError(f'{column} "{value}" should be yes or no.')
+
+
+def import_products(fileobj, filename, **kwargs):
+    """Import a CSV/XLSX product list; returns an ImportResult"""
+    return ProductImporter(**kwargs).run(read_rows(fileobj, filename))
@@ -0,0 +1,110 @@
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, transaction
+
+from customers.models import Customer
+from purchases.models import PurchaseOrder, PurchaseOrderItem
+from sales.models import SalesOrder, SalesOrderItem
+from stock.models import Product, UnitType, StockBalance, InsufficientStockError
+from suppliers.models import Supplier
+
+
+class Command(BaseCommand):
+    help = (
+        'Deliver many open sales orders for one scratch product in parallel and report '
+        'throughput and whether any stock was oversold. Each worker thread uses its own '
+        'database connection, like concurrent gunicorn workers. Writes to the configured database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help='Parallel deliveries (default: 8)')
+        parser.add_argument('--orders', type=int, default=200, help='Open sales orders to deliver (default: 200)')
+        parser.add_argument('--stock', type=int, default=100, help='Units on hand before delivering (default: 100)')
+        parser.add_argument('--quantity', type=int, default=1, help='Units per order (default: 1)')
+        parser.add_argument('--keep', action='store_true', help='Keep the scratch product and orders')
+
+    def handle(self, *args, **options):
+        if min(options['workers'], options['orders'], options['quantity']) < 1 or options['stock'] < 0:
+            raise CommandError('--workers, --orders and --quantity must be positive, --stock not negative')
+
+        product, order_ids = self.create_fixtures(options['stock'], options['orders'], options['quantity'])
+        try:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+                outcomes = list(pool.map(self.deliver, order_ids))
+            elapsed = time.perf_counter() - started
+
+            counts = {outcome: outcomes.count(outcome) for outcome in ('delivered', 'rejected', 'skipped', 'error')}
+            balance = StockBalance.objects.get(product=product)
+            delivered_units = counts['delivered'] * options['quantity']
+            self.stdout.write(
+                f"{len(order_ids)} deliveries with {options['workers']} workers in {elapsed:.2f}s "
+                f"({len(order_ids) / elapsed:.1f}/s): {counts['delivered']} delivered, "
+                f"{counts['rejected']} rejected for stock, {counts['skipped']} already delivered, "
+                f"{counts['error']} database errors"
+            )
+            self.stdout.write(f"On hand: {balance.quantity} (expected {options['stock'] - delivered_units})")
+            if balance.quantity < 0 or delivered_units > options['stock']:
+                raise CommandError('Stock was oversold.')
+            if balance.quantity != options['stock'] - delivered_units:
+                raise CommandError('Stock balance does not match the deliveries.')
+            self.stdout.write(self.style.SUCCESS('No stock oversold.'))
+        finally:
+            if not options['keep']:
+                self.delete_fixtures(product)
+
+    def create_fixtures(self, stock, orders, quantity):
+        tag = uuid.uuid4().hex[:8].upper()
+        today = date.today()
+        with transaction.atomic():
+            unit, _ = UnitType.objects.get_or_create(code='pcs', defaults={'name': 'Pieces'})
+            product = Product.objects.create(name=f'Benchmark {tag}', unit_type=unit)
+            supplier = Supplier.objects.create(name=f'Benchmark {tag}')
+            customer = Customer.objects.create(name=f'Benchmark {tag}', customer_type='retail')
+            purchase = PurchaseOrder.objects.create(supplier=supplier, order_date=today, expected_date=today)
+            PurchaseOrderItem.objects.create(
+                purchase_order=purchase, product=product,
+                quantity=Decimal(stock), unit_price=Decimal('1.00'), total_price=Decimal(stock),
+            )
+            purchase.receive_goods()
+            sales = SalesOrder.objects.bulk_create([
+                SalesOrder(order_number=f'BENCH-{tag}-{index}', customer=customer, order_date=today)
+                for index in range(orders)
+            ])
+            SalesOrderItem.objects.bulk_create([
+                SalesOrderItem(
+                    sales_order=order, product=product,
+                    quantity=Decimal(quantity), unit_price=Decimal('1.00'), total_price=Decimal(quantity),
+                )
+                for order in sales
+            ])
+        return product, [order.pk for order in sales]
+
+    def deliver(self, order_id):
+        try:
+            order = SalesOrder.objects.get(pk=order_id)
+            return 'delivered' if order.mark_delivered() else 'skipped'
+        except InsufficientStockError:
+            return 'rejected'
+        except DatabaseError:
+            return 'error'
+        finally:
+            connection.close()
+
+    def delete_fixtures(self, product):
+        with transaction.atomic():
+            orders = SalesOrder.objects.filter(items__product=product)
+            customer_ids = set(orders.values_list('customer_id', flat=True))
+            purchases = PurchaseOrder.objects.filter(items__product=product)
+            supplier_ids = set(purchases.values_list('supplier_id', flat=True))
+            # Queryset deletes skip the stock postings of SalesOrder.delete()
+            SalesOrder.objects.filter(pk__in=list(orders.values_list('pk', flat=True))).delete()
+            PurchaseOrder.objects.filter(pk__in=list(purchases.values_list('pk', flat=True))).delete()
+            product.delete()
+            Customer.objects.filter(pk__in=customer_ids).delete()
+            Supplier.objects.filter(pk__in=supplier_ids).delete()
@@ -0,0 +1,31 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from stock.reorder import compute_reorder_suggestions
+
+
+class Command(BaseCommand):
+    help = 'Recompute reorder suggestions from delivered sales velocity'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--as-of',
+            type=date.fromisoformat,
+            help='Last day of sales history to use (YYYY-MM-DD), defaults to today',
+        )
+        parser.add_argument(
+            '--lookback',
+            type=int,
+            help='Days of sales history to read (default: STOCK_REORDER_LOOKBACK_DAYS)',
+        )
+
+    def handle(self, *args, **options):
+        lookback = options.get('lookback')
+        if lookback is not None and lookback < 1:
+            raise CommandError('--lookback must be at least 1 day')
+
+        count = compute_reorder_suggestions(as_of=options.get('as_of'), lookback_days=lookback)
+        self.stdout.write(
+            self.style.SUCCESS(f'Computed reorder suggestions for {count} products.')
+        )
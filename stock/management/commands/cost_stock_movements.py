@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from stock.costing import process_pending_movements, reset_costing
+
+
+class Command(BaseCommand):
+    help = 'Cost stock movements not costed yet (FIFO layers, moving average and sales line COGS)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Discard all costing and recost the whole journal',
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options['reset']:
+                self.stdout.write('Resetting inventory costing...')
+                reset_costing()
+            count = process_pending_movements()
+        self.stdout.write(
+            self.style.SUCCESS(f'Costed {count} stock movements.')
+        )
@@ -0,0 +1,49 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from stock.importer import IMPORT_BATCH_SIZE, ProductImportError, import_products
+
+
+class Command(BaseCommand):
+    help = 'Create or update products from a CSV or XLSX price list, matched on SKU'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or XLSX file with a header row')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=IMPORT_BATCH_SIZE,
+            help=f'Rows upserted per transaction (default: {IMPORT_BATCH_SIZE})',
+        )
+        parser.add_argument(
+            '--no-create',
+            action='store_true',
+            help='Reject rows with unknown categories, brands or units instead of creating them',
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if not path.is_file():
+            raise CommandError(f'{path} does not exist')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        with path.open('rb') as fileobj:
+            try:
+                result = import_products(
+                    fileobj, path.name,
+                    batch_size=options['batch_size'],
+                    create_references=not options['no_create'],
+                )
+            except ProductImportError as e:
+                raise CommandError(str(e))
+
+        for row_number, message in result.errors:
+            self.stderr.write(f'Row {row_number}: {message}')
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Imported {result.imported} products ({result.created} created, {result.updated} updated), '
+                f'{result.error_count} rows skipped.'
+            )
+        )
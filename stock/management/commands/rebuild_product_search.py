@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from stock import search
+
+
+class Command(BaseCommand):
+    help = 'Create the product search index if needed and rebuild it from all products'
+
+    def handle(self, *args, **options):
+        if search.search_backend() is None:
+            self.stdout.write(self.style.WARNING('This database has no search index support; searches use icontains.'))
+            return
+        self.stdout.write('Rebuilding product search index...')
+        search.ensure_search_index()
+        count = search.index_products()
+        self.stdout.write(
+            self.style.SUCCESS(f'Indexed {count} products.')
+        )
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from stock.models import StockBalance
+
+
+class Command(BaseCommand):
+    help = 'Recompute stock balances from received purchase orders and delivered sales orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--product',
+            type=int,
+            action='append',
+            dest='products',
+            help='Only rebuild the given product id (can be repeated)',
+        )
+
+    def handle(self, *args, **options):
+        product_ids = options.get('products')
+        self.stdout.write('Rebuilding stock balances...')
+        count = StockBalance.refresh(product_ids)
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt stock balances for {count} products.')
+        )
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from stock.models import StockMovement
+
+
+class Command(BaseCommand):
+    help = 'Regenerate the stock movement journal from received purchase orders and delivered sales orders'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Rebuilding stock movement journal...')
+        count = StockMovement.rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(f'Wrote {count} stock movements. Snapshots were cleared; run take_stock_snapshots to backfill them.')
+        )
@@ -0,0 +1,56 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from stock.models import StockSnapshot
+
+
+class Command(BaseCommand):
+    help = 'Take stock snapshot checkpoints, optionally backfilling daily or month-end dates'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date',
+            type=date.fromisoformat,
+            help='Checkpoint date (YYYY-MM-DD), defaults to today',
+        )
+        parser.add_argument(
+            '--since',
+            type=date.fromisoformat,
+            help='Backfill checkpoints from this date (YYYY-MM-DD) up to --date',
+        )
+        parser.add_argument(
+            '--period',
+            choices=['daily', 'monthly'],
+            default='monthly',
+            help='Checkpoint spacing when backfilling (default: monthly, on month ends)',
+        )
+
+    def handle(self, *args, **options):
+        end = options.get('date') or timezone.localdate()
+        since = options.get('since')
+        if since and since > end:
+            raise CommandError('--since must not be after --date')
+
+        dates = self.checkpoint_dates(since, end, options['period']) if since else [end]
+        # Oldest first, so each checkpoint builds on the previous one
+        for snapshot_date in dates:
+            count = StockSnapshot.take(snapshot_date)
+            self.stdout.write(f'{snapshot_date}: {count} products')
+        self.stdout.write(
+            self.style.SUCCESS(f'Took {len(dates)} stock snapshots.')
+        )
+
+    def checkpoint_dates(self, since, end, period):
+        dates = []
+        current = since
+        while current <= end:
+            if period == 'daily':
+                dates.append(current)
+                current += timedelta(days=1)
+            else:
+                next_month = (current.replace(day=1) + timedelta(days=32)).replace(day=1)
+                dates.append(min(next_month - timedelta(days=1), end))
+                current = next_month
+        return dates
@@ -1,21 +1,120 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Q, Sum, Count, Value, Case, When, OuterRef, Subquery, CharField, DecimalField, ExpressionWrapper
+from django.db.models.functions import Coalesce, Greatest
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured
+from django.core.cache import cache
 from django.utils import timezone
 from decimal import Decimal
+from collections import defaultdict
+import logging
+import time
 
-def get_low_stock_products():
+# Low stock alerts shown on the dashboard are cached briefly and dropped
+# whenever stock balances change (goods received, orders delivered, ...)
+LOW_STOCK_ALERTS_CACHE_KEY = 'stock:low_stock_alerts'
+LOW_STOCK_ALERTS_TIMEOUT = 60  # seconds
+LOW_STOCK_ALERTS_FEED_SIZE = 20
+
+# Stock status of a product, see ProductQuerySet.with_stock_status()
+STOCK_STATUS_IN = 'in_stock'
+STOCK_STATUS_LOW = 'low_stock'
+STOCK_STATUS_OUT = 'out_of_stock'
+
+logger = logging.getLogger(__name__)
+
+# Version of the order entry catalog payload (stock.catalog); bumped whenever
+# products, categories, brands, unit types or stock balances change
+CATALOG_VERSION_CACHE_KEY = 'stock:catalog_version'
+
+
+def get_low_stock_products(limit=None):
     """Helper function to get products with low stock based on min_stock_level"""
-    products = Product.objects.filter(is_active=True)
-    low_stock = []
-    for product in products:
-        qty = product.get_realtime_quantity()
-        if qty <= product.min_stock_level and product.min_stock_level > 0:
-            low_stock.append({
-                'product': product,
-                'current_quantity': qty,
-                'min_quantity': product.min_stock_level
-            })
-    return low_stock
+    products = Product.objects.low_stock().select_related('brand')
+    if limit is not None:
+        products = products[:limit]
+    return [
+        {
+            'product': product,
+            'current_quantity': product.on_hand,
+            'min_quantity': product.min_stock_level
+        }
+        for product in products
+    ]
+
+
+def get_low_stock_alerts(limit=5):
+    """Most severe low stock alerts, served from a short-lived cache"""
+    alerts = cache.get(LOW_STOCK_ALERTS_CACHE_KEY)
+    if alerts is None:
+        alerts = get_low_stock_products(limit=LOW_STOCK_ALERTS_FEED_SIZE)
+        cache.set(LOW_STOCK_ALERTS_CACHE_KEY, alerts, LOW_STOCK_ALERTS_TIMEOUT)
+    return alerts[:limit]
+
+
+def invalidate_low_stock_alerts():
+    """Drop the cached alert feed once the current transaction commits"""
+    transaction.on_commit(lambda: cache.delete(LOW_STOCK_ALERTS_CACHE_KEY))
+
+
+def get_catalog_version():
+    """Current catalog version, seeded from the clock when the cache has none"""
+    version = cache.get(CATALOG_VERSION_CACHE_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_CACHE_KEY, time.time_ns() // 1000, timeout=None)
+        version = cache.get(CATALOG_VERSION_CACHE_KEY)
+    return version
+
+
+def bump_catalog_version():
+    """Move to a new catalog version once the current transaction commits"""
+    def bump():
+        try:
+            cache.incr(CATALOG_VERSION_CACHE_KEY)
+        except ValueError:
+            get_catalog_version()
+    transaction.on_commit(bump)
+
+
+def get_costing_method():
+    """Inventory costing method from settings.STOCK_COSTING_METHOD: 'fifo' or 'average'"""
+    method = getattr(settings, 'STOCK_COSTING_METHOD', 'fifo')
+    if method not in ('fifo', 'average'):
+        raise ImproperlyConfigured("STOCK_COSTING_METHOD must be 'fifo' or 'average'")
+    return method
+
+
+class InsufficientStockError(Exception):
+    """
+    Posting would take products below zero on hand.
+    shortages maps product name to (requested, available) quantities.
+    """
+
+    def __init__(self, shortages):
+        self.shortages = shortages
+        super().__init__('Not enough stock: ' + '; '.join(
+            f'{name} ({requested} requested, {available} available)'
+            for name, (requested, available) in shortages.items()
+        ))
+
+
+def summarize_quantities(items):
+    """Total item quantities per product id, e.g. for an order's line items"""
+    totals = defaultdict(Decimal)
+    for item in items:
+        totals[item.product_id] += item.quantity
+    return dict(totals)
+
+
+def diff_quantities(before, after):
+    """Per-product quantity change between two summaries, zero changes dropped"""
+    changes = {}
+    for product_id in set(before) | set(after):
+        change = after.get(product_id, Decimal('0')) - before.get(product_id, Decimal('0'))
+        if change:
+            changes[product_id] = change
+    return changes
 
 
 class ProductCategory(models.Model):
@@ -72,8 +171,169 @@ class UnitType(models.Model):
         ]
 
 
+class ProductQuerySet(models.QuerySet):
+    def with_stock(self):
+        """
+        Annotate inventory figures in a single query:
+        received_quantity, delivered_quantity, on_hand (never negative, like
+        get_realtime_quantity), last_received_cost, unit_cost and stock_value.
+        Everything is read from the StockBalance join; unit_cost comes from the
+        cost engine (FIFO or moving average, see STOCK_COSTING_METHOD), falling
+        back to last_received_cost and then cost_price for uncosted stock.
+        """
+        quantity_field = DecimalField(max_digits=15, decimal_places=2)
+        zero = Value(Decimal('0'), output_field=quantity_field)
+
+        return self.annotate(
+            received_quantity=Coalesce(F('stock_balance__received_quantity'), zero),
+            delivered_quantity=Coalesce(F('stock_balance__delivered_quantity'), zero),
+            on_hand=Greatest(Coalesce(F('stock_balance__quantity'), zero), zero),
+            last_received_cost=F('stock_balance__last_received_cost'),
+        ).annotate(
+            unit_cost=Case(
+                When(
+                    stock_balance__costed_quantity__gt=0,
+                    then=ExpressionWrapper(
+                        F(f'stock_balance__{get_costing_method()}_value') / F('stock_balance__costed_quantity'),
+                        output_field=quantity_field,
+                    ),
+                ),
+                default=Coalesce(F('last_received_cost'), F('cost_price')),
+                output_field=quantity_field,
+            ),
+        ).annotate(
+            stock_value=ExpressionWrapper(F('on_hand') * F('unit_cost'), output_field=quantity_field),
+        )
+
+    def with_stock_status(self):
+        """
+        with_stock() plus stock_status: 'out_of_stock' (nothing on hand),
+        'low_stock' (at or below min_stock_level) or 'in_stock', computed in SQL
+        so it can be filtered and ordered on.
+        """
+        return self.with_stock().annotate(
+            stock_status=Case(
+                When(on_hand__lte=0, then=Value(STOCK_STATUS_OUT)),
+                When(on_hand__lte=F('min_stock_level'), then=Value(STOCK_STATUS_LOW)),
+                default=Value(STOCK_STATUS_IN),
+                output_field=CharField(),
+            ),
+        )
+
+    def with_availability(self, exclude_sales_order=None):
+        """
+        with_stock() plus committed_quantity (on open sales orders, status
+        'order'), on_order_quantity (on open purchase orders, status
+        'purchase-order') and available_to_promise (on_hand minus committed,
+        may be negative when open orders exceed stock), in the same query.
+        exclude_sales_order leaves that order's own lines out of the
+        committed figure, for showing availability while editing it.
+        """
+        from purchases.models import PurchaseOrderItem
+        from sales.models import SalesOrderItem
+
+        quantity_field = DecimalField(max_digits=15, decimal_places=2)
+        zero = Value(Decimal('0'), output_field=quantity_field)
+
+        committed = SalesOrderItem.objects.filter(product=OuterRef('pk'), sales_order__status='order')
+        if exclude_sales_order is not None:
+            committed = committed.exclude(sales_order=exclude_sales_order)
+        on_order = PurchaseOrderItem.objects.filter(product=OuterRef('pk'), purchase_order__status='purchase-order')
+
+        def total(items):
+            return Coalesce(Subquery(
+                items.order_by().values('product').annotate(total=Sum('quantity')).values('total'),
+                output_field=quantity_field,
+            ), zero)
+
+        return self.with_stock().annotate(
+            committed_quantity=total(committed),
+            on_order_quantity=total(on_order),
+        ).annotate(
+            available_to_promise=ExpressionWrapper(F('on_hand') - F('committed_quantity'), output_field=quantity_field),
+        )
+
+    def stock_summary(self):
+        """
+        Product count per stock status and total stock value of the queryset,
+        as one aggregate query: total_products, in_stock, low_stock,
+        out_of_stock and total_stock_value.
+        """
+        return self.with_stock_status().aggregate(
+            total_products=Count('pk'),
+            in_stock=Count('pk', filter=Q(stock_status=STOCK_STATUS_IN)),
+            low_stock=Count('pk', filter=Q(stock_status=STOCK_STATUS_LOW)),
+            out_of_stock=Count('pk', filter=Q(stock_status=STOCK_STATUS_OUT)),
+            total_stock_value=Coalesce(
+                Sum('stock_value'), Value(Decimal('0')), output_field=DecimalField(max_digits=15, decimal_places=2)
+            ),
+        )
+
+    def low_stock(self):
+        """
+        Active products at or below their min_stock_level, most severe first.
+        Filtering, ordering and any slicing all run in SQL against the
+        StockBalance join, annotating on_hand and shortage.
+        """
+        quantity_field = DecimalField(max_digits=15, decimal_places=2)
+        zero = Value(Decimal('0'), output_field=quantity_field)
+        return self.filter(
+            is_active=True,
+            min_stock_level__gt=0,
+        ).annotate(
+            on_hand=Greatest(Coalesce(F('stock_balance__quantity'), zero), zero),
+        ).filter(
+            on_hand__lte=F('min_stock_level'),
+        ).annotate(
+            shortage=ExpressionWrapper(F('min_stock_level') - F('on_hand'), output_field=quantity_field),
+            cover_ratio=ExpressionWrapper(F('on_hand') / F('min_stock_level'), output_field=quantity_field),
+        ).order_by('cover_ratio', '-shortage', 'name')
+
+    def with_stock_as_of(self, as_of):
+        """
+        Annotate inventory figures as they stood at the end of ``as_of``:
+        journal_quantity (may be negative), on_hand, unit_cost and stock_value,
+        like with_stock(). Reads the latest StockSnapshot on or before the date
+        plus the StockMovement rows posted after it, never the full history.
+        unit_cost is the latest receipt cost posted by then, else cost_price.
+        """
+        quantity_field = DecimalField(max_digits=15, decimal_places=2)
+        zero = Value(Decimal('0'), output_field=quantity_field)
+
+        snapshot_date = StockSnapshot.latest_date(as_of)
+        movements = StockMovement.objects.filter(product=OuterRef('pk'), movement_date__lte=as_of)
+        snapshot_quantity = zero
+        if snapshot_date is not None:
+            movements = movements.filter(movement_date__gt=snapshot_date)
+            snapshot_quantity = Coalesce(Subquery(
+                StockSnapshot.objects.filter(
+                    product=OuterRef('pk'), snapshot_date=snapshot_date
+                ).values('quantity')[:1]
+            ), zero)
+        movement_total = movements.order_by().values('product').annotate(total=Sum('quantity')).values('total')
+        latest_cost = StockMovement.objects.filter(
+            product=OuterRef('pk'),
+            movement_type=StockMovement.PURCHASE,
+            quantity__gt=0,
+            unit_cost__isnull=False,
+            movement_date__lte=as_of,
+        ).order_by('-movement_date', '-pk').values('unit_cost')[:1]
+
+        return self.annotate(
+            journal_quantity=ExpressionWrapper(
+                snapshot_quantity + Coalesce(Subquery(movement_total), zero), output_field=quantity_field
+            ),
+            unit_cost=Coalesce(Subquery(latest_cost), F('cost_price')),
+        ).annotate(
+            on_hand=Greatest(F('journal_quantity'), zero),
+        ).annotate(
+            stock_value=ExpressionWrapper(F('on_hand') * F('unit_cost'), output_field=quantity_field),
+        )
+
+
 class Product(models.Model):
     name = models.CharField(max_length=200)
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True, help_text="Supplier or internal product code; bulk imports match products on it")
     category = models.ForeignKey(ProductCategory, on_delete=models.SET_NULL, null=True, blank=True, related_name='products')
     brand = models.ForeignKey(ProductBrand, on_delete=models.SET_NULL, null=True, blank=True, related_name='products')
     unit_type = models.ForeignKey(UnitType, on_delete=models.PROTECT, related_name='products', help_text="Unit of measurement for this product")
@@ -85,32 +345,32 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ProductQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.name} ({self.brand})"
     
+    def get_stock_balance(self):
+        """
+        Return the StockBalance row for this product.
+        Rows missing for products that predate the table are rebuilt from transactions.
+        """
+        try:
+            return self.stock_balance
+        except StockBalance.DoesNotExist:
+            StockBalance.refresh([self.pk])
+            return StockBalance.objects.get(product=self)
+
     def get_realtime_quantity(self):
         """
-        Calculate inventory quantity in real-time from transactions.
-        Simple formula: Total Purchase Received - Total Sales Delivered
+        Current inventory quantity, read from the maintained StockBalance row.
+        Formula: Total Purchase Received - Total Sales Delivered
         """
+        if 'on_hand' in self.__dict__:
+            # Already annotated by Product.objects.with_stock()
+            return self.on_hand
         try:
-            from purchases.models import PurchaseOrderItem
-            from sales.models import SalesOrderItem
-            
-            # Sum quantities from purchase orders that are received
-            total_purchase_received = PurchaseOrderItem.objects.filter(
-                product=self,
-                purchase_order__status='goods-received'
-            ).aggregate(total=models.Sum('quantity'))['total'] or Decimal('0')
-            
-            # Sum quantities from sales orders that are delivered
-            total_sales_delivered = SalesOrderItem.objects.filter(
-                product=self,
-                sales_order__status='delivered'
-            ).aggregate(total=models.Sum('quantity'))['total'] or Decimal('0')
-            
-            # Simple calculation: purchase received - sales delivered
-            stock = total_purchase_received - total_sales_delivered
+            stock = self.get_stock_balance().quantity
             return max(Decimal('0'), stock)  # Ensure non-negative
             
         except Exception as e:
@@ -119,23 +379,33 @@ class Product(models.Model):
             logger.error(f"Error calculating realtime quantity for product {self.id}: {e}")
             return Decimal('0')
     
+    def get_available_quantity(self):
+        """
+        Available to promise: on-hand quantity less what open sales orders
+        have already committed. Negative when open orders exceed stock.
+        """
+        if 'available_to_promise' in self.__dict__:
+            # Already annotated by Product.objects.with_availability()
+            return self.available_to_promise
+        return Product.objects.with_availability().values_list('available_to_promise', flat=True).get(pk=self.pk)
+
     def get_total_quantity(self):
         """Alias for get_realtime_quantity for backward compatibility"""
         return self.get_realtime_quantity()
     
     def get_total_stock_value(self):
         """Calculate total stock value using real-time quantity"""
+        if 'stock_value' in self.__dict__:
+            # Already annotated by Product.objects.with_stock()
+            return self.stock_value
         try:
-            quantity = self.get_realtime_quantity()
-            # Use average unit cost from recent purchases if available
-            from purchases.models import PurchaseOrderItem
-            recent_purchases = PurchaseOrderItem.objects.filter(
-                product=self,
-                purchase_order__status='goods-received'
-            ).order_by('-purchase_order__order_date')[:1]
-            
-            if recent_purchases.exists():
-                unit_cost = recent_purchases.first().unit_price
+            balance = self.get_stock_balance()
+            quantity = max(Decimal('0'), balance.quantity)
+            # Use the cost engine's valuation, else the most recent received purchase price
+            if balance.costed_quantity > 0:
+                return (quantity * balance.get_unit_cost()).quantize(Decimal('0.01'))
+            if balance.last_received_cost is not None:
+                unit_cost = balance.last_received_cost
             else:
                 unit_cost = self.cost_price
             
@@ -159,8 +429,516 @@ class Product(models.Model):
         ]
 
 
-# Stock model removed - inventory is now calculated in real-time from transactions only
-# No pre-calculated stock values or manual adjustments
+class StockBalance(models.Model):
+    """
+    Per-product inventory totals maintained from transactions.
+    Updated in the same database transaction as order status changes;
+    rebuild with ``python manage.py rebuild_stock_balances``.
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='stock_balance')
+    received_quantity = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    delivered_quantity = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    quantity = models.DecimalField(max_digits=15, decimal_places=2, default=0, help_text="Received minus delivered")
+    last_received_cost = models.DecimalField(max_digits=15, decimal_places=2, null=True, blank=True, help_text="Unit price on the most recent received purchase order")
+    last_received_date = models.DateField(null=True, blank=True)
+    # Cost position maintained by stock.costing from the movement journal
+    costed_quantity = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    average_cost = models.DecimalField(max_digits=15, decimal_places=4, default=0, help_text="Moving-average unit cost")
+    average_value = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    fifo_value = models.DecimalField(max_digits=15, decimal_places=2, default=0, help_text="Value of the open FIFO cost layers")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.product.name} - {self.quantity}"
+
+    def get_unit_cost(self):
+        """Unit cost of costed stock under the configured costing method"""
+        if self.costed_quantity <= 0:
+            return None
+        if get_costing_method() == 'average':
+            return self.average_cost
+        return self.fifo_value / self.costed_quantity
+
+    @classmethod
+    def apply_deltas(cls, received=None, delivered=None, prevent_negative=False):
+        """
+        Add per-product quantity changes ({product_id: Decimal}) to the balances.
+        Each product is a single UPDATE with F() expressions; products without a
+        row yet are rebuilt from transactions, which already include the change.
+
+        With prevent_negative the rows are locked first and a decrease only
+        applies while enough is on hand (checked in the UPDATE itself, so
+        concurrent postings cannot both take the last units); otherwise
+        InsufficientStockError is raised and the transaction rolled back.
+        settings.STOCK_ALLOW_NEGATIVE lets such postings through with a warning.
+        """
+        received = received or {}
+        delivered = delivered or {}
+        product_ids = sorted(set(received) | set(delivered))
+        if not product_ids:
+            return
+        guard = prevent_negative and not settings.STOCK_ALLOW_NEGATIVE
+        decreasing = []
+        missing = []
+        with transaction.atomic():
+            if prevent_negative:
+                cls.lock(product_ids)
+            for product_id in product_ids:
+                received_change = received.get(product_id, Decimal('0'))
+                delivered_change = delivered.get(product_id, Decimal('0'))
+                change = received_change - delivered_change
+                balances = cls.objects.filter(product_id=product_id)
+                if change < 0:
+                    decreasing.append(product_id)
+                    if guard:
+                        balances = balances.filter(quantity__gte=-change)
+                updated = balances.update(
+                    received_quantity=F('received_quantity') + received_change,
+                    delivered_quantity=F('delivered_quantity') + delivered_change,
+                    quantity=F('quantity') + change,
+                    updated_at=timezone.now(),
+                )
+                if not updated:
+                    missing.append(product_id)
+            if missing:
+                # Also reached by guarded decreases without enough stock
+                cls.refresh(missing)
+            if prevent_negative and decreasing:
+                checked = [product_id for product_id in decreasing if product_id in missing] if guard else decreasing
+                shortages = {}
+                negative = cls.objects.filter(product_id__in=checked, quantity__lt=0).values_list(
+                    'product_id', 'product__name', 'quantity'
+                )
+                for product_id, name, quantity in negative:
+                    requested = delivered.get(product_id, Decimal('0')) - received.get(product_id, Decimal('0'))
+                    if guard:
+                        shortages[name] = (requested, quantity + requested)
+                    else:
+                        logger.warning("Stock of %s went negative (%s on hand)", name, quantity)
+                if shortages:
+                    raise InsufficientStockError(shortages)
+            invalidate_low_stock_alerts()
+            bump_catalog_version()
+
+    @classmethod
+    def lock(cls, product_ids):
+        """
+        Lock the balance rows of product_ids until the transaction ends
+        (SELECT ... FOR UPDATE, in product order so concurrent postings
+        cannot deadlock). SQLite ignores it; its writes are serialized.
+        """
+        return list(
+            cls.objects.select_for_update().filter(product_id__in=product_ids)
+            .order_by('product_id').values_list('product_id', flat=True)
+        )
+
+    @classmethod
+    def refresh(cls, product_ids=None):
+        """
+        Recompute balances from purchase and sales order items.
+        Pass product ids to limit the work, or None to rebuild every product.
+        Returns the number of balances written.
+        """
+        from purchases.models import PurchaseOrderItem
+        from sales.models import SalesOrderItem
+
+        products = Product.objects.all()
+        received_items = PurchaseOrderItem.objects.filter(purchase_order__status='goods-received')
+        delivered_items = SalesOrderItem.objects.filter(sales_order__status='delivered')
+        if product_ids is not None:
+            product_ids = list(product_ids)
+            products = products.filter(pk__in=product_ids)
+            received_items = received_items.filter(product_id__in=product_ids)
+            delivered_items = delivered_items.filter(product_id__in=product_ids)
+
+        received = dict(received_items.values('product_id').annotate(total=Sum('quantity')).values_list('product_id', 'total'))
+        delivered = dict(delivered_items.values('product_id').annotate(total=Sum('quantity')).values_list('product_id', 'total'))
+
+        now = timezone.now()
+        balances = []
+        for product_id in products.values_list('pk', flat=True):
+            received_qty = received.get(product_id) or Decimal('0')
+            delivered_qty = delivered.get(product_id) or Decimal('0')
+            balances.append(cls(
+                product_id=product_id,
+                received_quantity=received_qty,
+                delivered_quantity=delivered_qty,
+                quantity=received_qty - delivered_qty,
+                updated_at=now,
+            ))
+
+        with transaction.atomic():
+            cls.objects.bulk_create(
+                balances,
+                batch_size=500,
+                update_conflicts=True,
+                unique_fields=['product'],
+                update_fields=['received_quantity', 'delivered_quantity', 'quantity', 'updated_at'],
+            )
+            cls.refresh_last_received_cost(product_ids)
+            invalidate_low_stock_alerts()
+            bump_catalog_version()
+        return len(balances)
+
+    @classmethod
+    def refresh_last_received_cost(cls, product_ids=None):
+        """
+        Recompute last_received_cost/last_received_date from received purchase
+        order items with one UPDATE. Called when a purchase order is received,
+        cancelled or edited, so a cancelled receipt falls back to the previous one.
+        """
+        from purchases.models import PurchaseOrderItem
+
+        latest_receipt = PurchaseOrderItem.objects.filter(
+            product=OuterRef('product_id'),
+            purchase_order__status='goods-received'
+        ).order_by('-purchase_order__order_date', '-pk')
+
+        balances = cls.objects.all()
+        if product_ids is not None:
+            balances = balances.filter(product_id__in=list(product_ids))
+        return balances.update(
+            last_received_cost=Subquery(latest_receipt.values('unit_price')[:1]),
+            last_received_date=Subquery(latest_receipt.values('purchase_order__order_date')[:1]),
+        )
+
+    class Meta:
+        verbose_name = "Stock Balance"
+        verbose_name_plural = "Stock Balances"
+        indexes = [
+            models.Index(fields=['quantity']),
+        ]
+
+
+class StockMovement(models.Model):
+    """
+    Append-only journal of stock changes posted by purchase receipts and
+    sales deliveries. Rows are never edited: cancelling or editing an order
+    posts a reversing movement. Rebuild with ``python manage.py rebuild_stock_journal``.
+    """
+    PURCHASE = 'purchase'
+    SALE = 'sale'
+    MOVEMENT_TYPES = [
+        (PURCHASE, 'Purchase Receipt'),
+        (SALE, 'Sales Delivery'),
+    ]
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_movements')
+    movement_type = models.CharField(max_length=20, choices=MOVEMENT_TYPES)
+    movement_date = models.DateField(default=timezone.localdate)
+    quantity = models.DecimalField(max_digits=15, decimal_places=2, help_text="Signed change to stock on hand")
+    unit_cost = models.DecimalField(max_digits=15, decimal_places=2, null=True, blank=True, help_text="Purchase price for receipts")
+    reference = models.CharField(max_length=50, blank=True, help_text="Order number")
+    source_id = models.PositiveIntegerField(null=True, blank=True, help_text="Purchase or sales order id")
+    cost_amount = models.DecimalField(max_digits=15, decimal_places=2, null=True, blank=True, help_text="Signed inventory value change, set once costed by stock.costing")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.movement_date} {self.product.name} {self.quantity:+}"
+
+    @classmethod
+    def post(cls, movement_type, changes, reference='', source_id=None, unit_costs=None, movement_date=None):
+        """
+        Append one movement per product for the signed changes ({product_id: Decimal}),
+        dated ``movement_date`` (default today; orders pass their stock_date).
+        Snapshots already taken on or after the movement date are adjusted so
+        they stay consistent with the journal, and the new movements are costed.
+        """
+        return cls.post_many(movement_type, [(reference, source_id, changes, unit_costs, movement_date)])
+
+    @classmethod
+    def post_many(cls, movement_type, postings):
+        """
+        post() for many orders at once: ``postings`` is a list of
+        (reference, source_id, changes, unit_costs, movement_date) per order.
+        All movements are inserted with one bulk_create, then snapshots are
+        adjusted and the movements costed once for the products involved.
+        """
+        from .costing import process_pending_movements
+
+        movements = []
+        totals = defaultdict(Decimal)
+        dated_totals = defaultdict(lambda: defaultdict(Decimal))
+        for reference, source_id, changes, unit_costs, movement_date in postings:
+            movement_date = movement_date or timezone.localdate()
+            unit_costs = unit_costs or {}
+            for product_id, change in changes.items():
+                if not change:
+                    continue
+                totals[product_id] += change
+                dated_totals[movement_date][product_id] += change
+                movements.append(cls(
+                    product_id=product_id,
+                    movement_type=movement_type,
+                    movement_date=movement_date,
+                    quantity=change,
+                    unit_cost=unit_costs.get(product_id) if change > 0 else None,
+                    reference=reference,
+                    source_id=source_id,
+                ))
+        if not movements:
+            return []
+        with transaction.atomic():
+            cls.objects.bulk_create(movements)
+            for movement_date, changes in sorted(dated_totals.items()):
+                StockSnapshot.apply_backdated({product_id: change for product_id, change in changes.items() if change}, movement_date)
+            process_pending_movements(totals)
+        return movements
+
+    @classmethod
+    def rebuild(cls):
+        """
+        Regenerate the journal from received purchase orders and delivered
+        sales orders, dated by their stock_date like live postings: order
+        date, or delivery date when set for sales.
+        Existing movements and snapshots are discarded and the new journal is
+        costed from scratch. Returns the number of movements written.
+        """
+        from purchases.models import PurchaseOrderItem
+        from sales.models import SalesOrderItem
+        from .costing import reset_costing, process_pending_movements
+
+        receipts = PurchaseOrderItem.objects.filter(
+            purchase_order__status='goods-received'
+        ).values(
+            'product_id', 'purchase_order_id', 'purchase_order__order_number', 'purchase_order__order_date'
+        ).annotate(
+            total_quantity=Sum('quantity'),
+            total_value=Sum(F('quantity') * F('unit_price'), output_field=DecimalField(max_digits=15, decimal_places=2)),
+        ).order_by()
+        deliveries = SalesOrderItem.objects.filter(
+            sales_order__status='delivered'
+        ).values(
+            'product_id', 'sales_order_id', 'sales_order__order_number',
+            'sales_order__order_date', 'sales_order__delivery_date'
+        ).annotate(total_quantity=Sum('quantity')).order_by()
+
+        movements = []
+        for row in receipts:
+            if not row['total_quantity']:
+                continue
+            movements.append(cls(
+                product_id=row['product_id'],
+                movement_type=cls.PURCHASE,
+                movement_date=row['purchase_order__order_date'],
+                quantity=row['total_quantity'],
+                unit_cost=(row['total_value'] / row['total_quantity']).quantize(Decimal('0.01')),
+                reference=row['purchase_order__order_number'],
+                source_id=row['purchase_order_id'],
+            ))
+        for row in deliveries:
+            if not row['total_quantity']:
+                continue
+            movements.append(cls(
+                product_id=row['product_id'],
+                movement_type=cls.SALE,
+                movement_date=row['sales_order__delivery_date'] or row['sales_order__order_date'],
+                quantity=-row['total_quantity'],
+                reference=row['sales_order__order_number'],
+                source_id=row['sales_order_id'],
+            ))
+        movements.sort(key=lambda movement: (movement.movement_date, movement.movement_type != cls.PURCHASE))
+
+        with transaction.atomic():
+            reset_costing()
+            StockSnapshot.objects.all().delete()
+            cls.objects.all().delete()
+            cls.objects.bulk_create(movements, batch_size=500)
+            process_pending_movements()
+        return len(movements)
+
+    class Meta:
+        verbose_name = "Stock Movement"
+        verbose_name_plural = "Stock Movements"
+        ordering = ['movement_date', 'pk']
+        indexes = [
+            # Keyset pagination of a product's history (stock.history)
+            models.Index(fields=['product', 'movement_date', 'id']),
+            models.Index(fields=['movement_date']),
+            models.Index(fields=['movement_type', 'source_id']),
+            models.Index(fields=['product', 'id'], condition=models.Q(cost_amount__isnull=True), name='stock_movement_uncosted_idx'),
+        ]
+
+
+class StockSnapshot(models.Model):
+    """
+    Per-product quantity at the end of a checkpoint date, taken with
+    ``python manage.py take_stock_snapshots``. Stock as of a date is the
+    latest snapshot on or before it plus the movements posted after it.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_snapshots')
+    snapshot_date = models.DateField()
+    quantity = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.snapshot_date} {self.product.name} {self.quantity}"
+
+    @classmethod
+    def latest_date(cls, as_of):
+        """Most recent checkpoint date on or before ``as_of``, or None"""
+        return cls.objects.filter(snapshot_date__lte=as_of).aggregate(latest=models.Max('snapshot_date'))['latest']
+
+    @classmethod
+    def take(cls, snapshot_date):
+        """
+        Write a checkpoint for every product as of ``snapshot_date``, computed
+        from the previous checkpoint plus the movements since. Existing rows
+        for the date are replaced. Returns the number of rows written.
+        """
+        quantities = Product.objects.with_stock_as_of(snapshot_date).values_list('pk', 'journal_quantity')
+        snapshots = [
+            cls(product_id=product_id, snapshot_date=snapshot_date, quantity=quantity)
+            for product_id, quantity in quantities
+        ]
+        with transaction.atomic():
+            cls.objects.bulk_create(
+                snapshots,
+                batch_size=500,
+                update_conflicts=True,
+                unique_fields=['product', 'snapshot_date'],
+                update_fields=['quantity'],
+            )
+        return len(snapshots)
+
+    @classmethod
+    def apply_backdated(cls, changes, movement_date):
+        """Add movement changes to checkpoints dated on or after the movement"""
+        snapshot_dates = list(
+            cls.objects.filter(snapshot_date__gte=movement_date).values_list('snapshot_date', flat=True).distinct()
+        )
+        if not snapshot_dates:
+            return
+        # Products created after a checkpoint have no row for it yet
+        cls.objects.bulk_create(
+            [cls(product_id=product_id, snapshot_date=snapshot_date, quantity=Decimal('0'))
+             for snapshot_date in snapshot_dates for product_id in changes],
+            ignore_conflicts=True,
+        )
+        for product_id, change in changes.items():
+            cls.objects.filter(product_id=product_id, snapshot_date__gte=movement_date).update(
+                quantity=F('quantity') + change
+            )
+
+    class Meta:
+        verbose_name = "Stock Snapshot"
+        verbose_name_plural = "Stock Snapshots"
+        ordering = ['-snapshot_date']
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'snapshot_date'], name='unique_stock_snapshot_per_day'),
+        ]
+        indexes = [
+            models.Index(fields=['snapshot_date']),
+        ]
+
+
+class CostLayer(models.Model):
+    """
+    A FIFO cost layer: stock that came in at one unit cost (a purchase
+    receipt or a returned delivery), consumed oldest first. Maintained by stock.costing.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='cost_layers')
+    movement = models.ForeignKey(StockMovement, on_delete=models.SET_NULL, null=True, blank=True, related_name='cost_layers')
+    layer_date = models.DateField()
+    unit_cost = models.DecimalField(max_digits=15, decimal_places=4)
+    quantity = models.DecimalField(max_digits=15, decimal_places=2)
+    remaining_quantity = models.DecimalField(max_digits=15, decimal_places=2)
+
+    def __str__(self):
+        return f"{self.product.name} {self.remaining_quantity}/{self.quantity} @ {self.unit_cost}"
+
+    class Meta:
+        verbose_name = "Cost Layer"
+        verbose_name_plural = "Cost Layers"
+        ordering = ['layer_date', 'pk']
+        indexes = [
+            models.Index(fields=['product', 'layer_date'], condition=models.Q(remaining_quantity__gt=0), name='cost_layer_open_idx'),
+        ]
+
+
+class ReorderSuggestion(models.Model):
+    """
+    Demand velocity and reorder quantity for one product, written in bulk by
+    stock.reorder.compute_reorder_suggestions() from delivered sales history.
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name='reorder_suggestion')
+    as_of = models.DateField(help_text="Last day of sales history used")
+    average_daily_demand = models.DecimalField(max_digits=15, decimal_places=4, help_text="Moving average over the recent window")
+    ewma_daily_demand = models.DecimalField(max_digits=15, decimal_places=4, help_text="Exponentially weighted average over the full history")
+    demand_std = models.DecimalField(max_digits=15, decimal_places=4)
+    on_hand = models.DecimalField(max_digits=15, decimal_places=2)
+    on_order = models.DecimalField(max_digits=15, decimal_places=2, help_text="Open purchase order quantity")
+    days_of_cover = models.DecimalField(max_digits=10, decimal_places=1, null=True, blank=True, help_text="Empty when there is no demand")
+    reorder_point = models.DecimalField(max_digits=15, decimal_places=2)
+    suggested_quantity = models.DecimalField(max_digits=15, decimal_places=2)
+    computed_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.product.name}: order {self.suggested_quantity}"
+
+    class Meta:
+        verbose_name = "Reorder Suggestion"
+        verbose_name_plural = "Reorder Suggestions"
+        ordering = ['days_of_cover', '-suggested_quantity']
+        indexes = [
+            models.Index(fields=['suggested_quantity', 'days_of_cover']),
+        ]
+
+
+class PriceRevision(models.Model):
+    """
+    One bulk price change (stock.pricing.apply_price_revision): the rule that
+    was applied to which products. Per-product before/after prices are kept
+    in ProductPriceHistory.
+    """
+    FIELD_CHOICES = [
+        ('selling_price', 'Selling Price'),
+        ('cost_price', 'Cost Price'),
+    ]
+    CHANGE_CHOICES = [
+        ('percent', 'Percentage'),
+        ('amount', 'Fixed Amount'),
+        ('none', 'Rounding Only'),
+    ]
+
+    field = models.CharField(max_length=20, choices=FIELD_CHOICES)
+    change_type = models.CharField(max_length=10, choices=CHANGE_CHOICES)
+    value = models.DecimalField(max_digits=15, decimal_places=4, default=0, help_text="Percentage or amount added; negative to lower prices")
+    round_to = models.DecimalField(max_digits=15, decimal_places=2, null=True, blank=True, help_text="New prices are rounded to a multiple of this")
+    description = models.CharField(max_length=255, blank=True, help_text="Products the revision was applied to")
+    product_count = models.PositiveIntegerField(default=0)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.get_field_display()} revision of {self.created_at:%Y-%m-%d %H:%M}"
+
+    class Meta:
+        verbose_name = "Price Revision"
+        verbose_name_plural = "Price Revisions"
+        ordering = ['-created_at']
+
+
+class ProductPriceHistory(models.Model):
+    """Price of one product before and after a PriceRevision (field is on the revision)"""
+    revision = models.ForeignKey(PriceRevision, on_delete=models.CASCADE, related_name='changes')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='price_history')
+    old_price = models.DecimalField(max_digits=15, decimal_places=2)
+    new_price = models.DecimalField(max_digits=15, decimal_places=2)
+
+    def __str__(self):
+        return f"{self.product_id}: {self.old_price} -> {self.new_price}"
+
+    class Meta:
+        verbose_name = "Product Price History"
+        verbose_name_plural = "Product Price History"
+        indexes = [
+            models.Index(fields=['product', 'revision']),
+        ]
+
+
+# Stock model removed - inventory is now read from StockBalance, which is maintained from transactions
+# No manual adjustments
 
 
 # StockAlert model removed - alerts are now calculated dynamically based on min_stock_level
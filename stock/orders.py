@@ -0,0 +1,138 @@
+"""
+Writing an order header together with its lines, shared by the sales and
+purchase order services (sales.services, purchases.services).
+
+Line totals and the order total are computed in memory from the lines, the
+header is written once, new lines are inserted with one bulk_create, kept
+lines rewritten with one bulk_update and dropped lines deleted, so saving
+an order takes the same handful of queries whatever its number of lines.
+
+bulk_transition() moves many orders to a new status at once (dispatch-day
+deliveries, receiving a batch of purchase orders): one locked read of the
+orders in an allowed status, one read of their lines, one UPDATE of their
+status and one bulk stock posting, all in a single transaction.
+"""
+from collections import defaultdict
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+MONEY = Decimal('0.01')
+# Line fields written by the order forms; other columns (e.g. cost_amount) are left alone
+LINE_FIELDS = ['product', 'quantity', 'unit_price', 'total_price']
+
+
+def line_total(quantity, unit_price):
+    return (quantity * unit_price).quantize(MONEY, rounding=ROUND_HALF_UP)
+
+
+def validate_lines(lines):
+    """Raise ValidationError listing every line without a product, quantity or price"""
+    errors = []
+    for number, line in enumerate(lines, start=1):
+        if line.product_id is None:
+            errors.append(f'Line {number}: choose a product.')
+        elif line.quantity is None or line.quantity <= 0:
+            errors.append(f'Line {number}: quantity must be greater than 0.')
+        elif line.unit_price is None or line.unit_price < 0:
+            errors.append(f'Line {number}: unit price cannot be negative.')
+    if errors:
+        raise ValidationError(errors)
+
+
+def write_order(order, lines, order_field):
+    """
+    Save ``order`` so that ``lines`` (unsaved or existing item instances)
+    are exactly its items, with total_price and order.total_amount set from
+    them. ``order_field`` is the item's foreign key to the order. Stock is
+    not posted here; the services call sync_stock() afterwards.
+    """
+    validate_lines(lines)
+    for line in lines:
+        line.total_price = line_total(line.quantity, line.unit_price)
+    order.total_amount = sum((line.total_price for line in lines), Decimal('0'))
+
+    item_model = order._meta.get_field('items').related_model
+    adding = order._state.adding
+    # Callers' transaction when they have one; no savepoint needed
+    with transaction.atomic(savepoint=False):
+        order.save()
+        for line in lines:
+            setattr(line, order_field, order)
+        kept = [line for line in lines if line.pk is not None]
+        new = [line for line in lines if line.pk is None]
+        if not adding:
+            item_model.objects.filter(**{order_field: order}).exclude(
+                pk__in=[line.pk for line in kept]
+            ).delete()
+        if kept:
+            item_model.objects.bulk_update(kept, LINE_FIELDS)
+        if new:
+            item_model.objects.bulk_create(new)
+    return lines
+
+
+def parse_order_ids(values):
+    """Order ids from a bulk request's list of values; None unless all are ids"""
+    if not isinstance(values, list) or not all(str(value).isdigit() for value in values):
+        return None
+    return [int(value) for value in values]
+
+
+def bulk_transition(model, order_ids, status, sources, post_stock, refuse=None):
+    """
+    Move the orders among ``order_ids`` whose status is one of ``sources``
+    to ``status`` in one transaction. Orders are read locked, with the
+    source statuses filtered in SQL, in order date order together with their
+    items ({order id: [item]}). ``refuse(orders, items)`` may return
+    {order id: reason} for orders to leave as they are; the rest get one
+    UPDATE and are handed to ``post_stock(orders, items)`` as
+    [(id, order_number, previous status)].
+
+    Returns a report in the order of ``order_ids``: one dict per order with
+    ``id``, ``order_number``, ``status`` (after the call), ``changed`` and
+    ``error`` (None when changed).
+    """
+    order_ids = list(dict.fromkeys(int(pk) for pk in order_ids))
+    relation = model._meta.get_field('items')
+    order_field = relation.field.attname
+    status_labels = dict(model._meta.get_field('status').choices)
+
+    with transaction.atomic():
+        orders = list(
+            model.objects.select_for_update().filter(pk__in=order_ids, status__in=sources)
+            .order_by('order_date', 'pk').values_list('pk', 'order_number', 'status')
+        )
+        items = defaultdict(list)
+        for item in relation.related_model.objects.filter(**{f'{order_field}__in': [pk for pk, _, _ in orders]}).only(
+            order_field, 'product', 'quantity', 'unit_price'
+        ).order_by('pk'):
+            items[getattr(item, order_field)].append(item)
+
+        refused = refuse(orders, items) if refuse else {}
+        moved = [order for order in orders if order[0] not in refused]
+        if moved:
+            model.objects.filter(pk__in=[pk for pk, _, _ in moved], status__in=sources).update(
+                status=status, updated_at=timezone.now()
+            )
+            post_stock(moved, items)
+
+    report = {
+        pk: {'id': pk, 'order_number': number, 'status': status, 'changed': True, 'error': None}
+        for pk, number, _ in moved
+    }
+    for pk, number, previous in orders:
+        if pk in refused:
+            report[pk] = {'id': pk, 'order_number': number, 'status': previous, 'changed': False, 'error': refused[pk]}
+    skipped = [pk for pk in order_ids if pk not in report]
+    for pk, number, current in model.objects.filter(pk__in=skipped).values_list('pk', 'order_number', 'status'):
+        report[pk] = {
+            'id': pk, 'order_number': number, 'status': current, 'changed': False,
+            'error': f'Cannot change an order that is {status_labels.get(current, current)}.',
+        }
+    return [
+        report.get(pk) or {'id': pk, 'order_number': None, 'status': None, 'changed': False, 'error': 'Order not found.'}
+        for pk in order_ids
+    ]
@@ -0,0 +1,110 @@
+"""
+Bulk price revisions.
+
+A revision applies one rule to selling_price or cost_price of a filtered
+product set: a percentage or fixed change, optionally rounded to a multiple
+of round_to, never below zero. The new price is a single SQL expression of
+the current one, so the preview, the history rows and the UPDATE all come
+from the database without loading products; the whole revision runs in one
+transaction and only products whose price actually changes are touched.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Sum, Count, Value, DecimalField, ExpressionWrapper
+from django.db.models.functions import Coalesce, Greatest, Round
+from django.utils import timezone
+
+from .models import PriceRevision, ProductPriceHistory, bump_catalog_version
+
+PRICE_FIELDS = [field for field, _ in PriceRevision.FIELD_CHOICES]
+PREVIEW_SIZE = 50
+HISTORY_BATCH_SIZE = 2000
+
+
+def price_expression(field, change_type, value, round_to=None):
+    """SQL expression for the revised value of the product price field"""
+    if field not in PRICE_FIELDS:
+        raise ValueError(f'Unknown price field {field}')
+    price_field = DecimalField(max_digits=15, decimal_places=2)
+    price = F(field)
+    if change_type == 'percent':
+        price = ExpressionWrapper(
+            price * Value((Decimal('100') + value) / Decimal('100')), output_field=price_field
+        )
+    elif change_type == 'amount':
+        price = ExpressionWrapper(price + Value(value), output_field=price_field)
+    if round_to:
+        price = ExpressionWrapper(
+            Round(ExpressionWrapper(price / Value(round_to), output_field=price_field)) * Value(round_to),
+            output_field=price_field,
+        )
+    return Greatest(
+        Round(price, 2, output_field=price_field),
+        Value(Decimal('0'), output_field=price_field),
+        output_field=price_field,
+    )
+
+
+def changed_products(products, field, change_type, value, round_to=None):
+    """products annotated with new_price, limited to those whose price changes"""
+    return products.alias(
+        revised_price=price_expression(field, change_type, value, round_to)
+    ).exclude(revised_price=F(field)).annotate(
+        old_price=F(field), new_price=F('revised_price'),
+    )
+
+
+def preview_price_revision(products, field, change_type, value, round_to=None, limit=PREVIEW_SIZE):
+    """
+    Dry run: count and price totals of the products that would change, plus
+    the first ``limit`` of them by name with old_price and new_price.
+    Nothing is written.
+    """
+    changes = changed_products(products, field, change_type, value, round_to)
+    zero = Value(Decimal('0'), output_field=DecimalField(max_digits=15, decimal_places=2))
+    summary = changes.aggregate(
+        count=Count('pk'),
+        old_total=Coalesce(Sum('old_price'), zero),
+        new_total=Coalesce(Sum('new_price'), zero),
+    )
+    summary['sample'] = list(
+        changes.select_related('category', 'brand').order_by('name', 'pk')[:limit]
+    )
+    return summary
+
+
+def apply_price_revision(products, field, change_type, value, round_to=None, description='', user=None):
+    """
+    Reprice the products in one transaction: record old and new prices in
+    ProductPriceHistory, then a single UPDATE of the changed products.
+    Returns the PriceRevision.
+    """
+    with transaction.atomic():
+        changes = changed_products(products.select_for_update(), field, change_type, value, round_to)
+        rows = list(changes.order_by('pk').values_list('pk', 'old_price', 'new_price'))
+        revision = PriceRevision.objects.create(
+            field=field,
+            change_type=change_type,
+            value=value,
+            round_to=round_to or None,
+            description=description[:255],
+            product_count=len(rows),
+            created_by=user,
+        )
+        ProductPriceHistory.objects.bulk_create(
+            (
+                ProductPriceHistory(revision=revision, product_id=pk, old_price=old_price, new_price=new_price)
+                for pk, old_price, new_price in rows
+            ),
+            batch_size=HISTORY_BATCH_SIZE,
+        )
+        if rows:
+            products.alias(
+                revised_price=price_expression(field, change_type, value, round_to)
+            ).exclude(revised_price=F(field)).update(
+                **{field: price_expression(field, change_type, value, round_to)},
+                updated_at=timezone.now(),
+            )
+            bump_catalog_version()
+    return revision
@@ -0,0 +1,183 @@
+"""
+Reorder suggestion engine.
+
+Reads delivered sales as one (product, day, quantity) row per product and
+day, straight from a grouped query, and computes sales velocity for every
+active product at once with NumPy: a moving average and standard deviation
+over the recent window and an exponentially weighted average over the whole
+lookback. Days without sales count as zero demand. Each product's stock
+position (on hand plus open purchase orders) is compared with a reorder
+point of lead-time demand plus safety stock; products at or below it get a
+suggested quantity covering the lead time and review period. Results are
+stored in ReorderSuggestion so the suggestions page is a plain table read.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Product, StockBalance, ReorderSuggestion
+
+# Recent window of the moving average, and span of the weighted average
+MOVING_AVERAGE_DAYS = 28
+EWMA_SPAN_DAYS = 14
+# days_of_cover is DecimalField(max_digits=10, decimal_places=1)
+MAX_DAYS_OF_COVER = 99999999.9
+
+
+def load_daily_sales(start_date, end_date):
+    """
+    Delivered quantities as parallel arrays (product_ids, days, quantities),
+    one entry per product and day between start_date and end_date.
+    A sale counts on its delivery date, or its order date for instant sales.
+    """
+    from sales.models import SalesOrderItem
+
+    rows = (
+        SalesOrderItem.objects
+        .filter(sales_order__status='delivered')
+        .annotate(day=Coalesce('sales_order__delivery_date', 'sales_order__order_date'))
+        .filter(day__gte=start_date, day__lte=end_date)
+        .values_list('product_id', 'day')
+        .annotate(quantity=Sum('quantity'))
+        .order_by()
+    )
+    product_ids, days, quantities = [], [], []
+    for product_id, day, quantity in rows.iterator(chunk_size=10000):
+        product_ids.append(product_id)
+        days.append(day)
+        quantities.append(quantity)
+    return (
+        np.array(product_ids, dtype=np.int64),
+        np.array(days, dtype='datetime64[D]'),
+        np.array(quantities, dtype=np.float64),
+    )
+
+
+def sales_velocity(index, age, quantity, size, lookback_days, window_days=MOVING_AVERAGE_DAYS, span_days=EWMA_SPAN_DAYS):
+    """
+    Per-product daily demand statistics from sparse daily sales.
+
+    index holds each row's product position (0..size-1), age its distance in
+    days from the as-of date. Returns (moving average, standard deviation over
+    the window, exponentially weighted average), each an array of length size.
+    """
+    recent = age < window_days
+    window_sum = np.bincount(index[recent], weights=quantity[recent], minlength=size)
+    window_squares = np.bincount(index[recent], weights=quantity[recent] ** 2, minlength=size)
+    average = window_sum / window_days
+    std = np.sqrt(np.maximum(window_squares / window_days - average ** 2, 0))
+
+    alpha = 2 / (span_days + 1)
+    weights = alpha * (1 - alpha) ** age
+    # Scale up for the weight of days before the lookback, which are not read
+    ewma = np.bincount(index, weights=quantity * weights, minlength=size) / (1 - (1 - alpha) ** lookback_days)
+    return average, std, ewma
+
+
+def reorder_quantities(demand, std, on_hand, on_order, lead_time_days, review_days, service_factor):
+    """
+    Reorder point, suggested order quantity and days of cover per product.
+
+    Products whose stock position (on hand plus on order) is at or below the
+    reorder point are topped up to cover demand over the lead time and review
+    period plus safety stock; days of cover is NaN without demand.
+    """
+    safety_stock = service_factor * std * np.sqrt(lead_time_days)
+    reorder_point = demand * lead_time_days + safety_stock
+    target = demand * (lead_time_days + review_days) + safety_stock
+    position = on_hand + on_order
+    suggested = np.where(
+        (demand > 0) & (position <= reorder_point),
+        np.ceil(np.maximum(target - position, 0)),
+        0,
+    )
+    with np.errstate(divide='ignore', invalid='ignore'):
+        days_of_cover = np.where(demand > 0, np.maximum(on_hand, 0) / demand, np.nan)
+    return reorder_point, suggested, np.minimum(days_of_cover, MAX_DAYS_OF_COVER)
+
+
+def to_decimal(value, places):
+    return Decimal(f'{value:.{places}f}')
+
+
+def compute_reorder_suggestions(as_of=None, lookback_days=None):
+    """
+    Recompute ReorderSuggestion for all active products from sales up to
+    as_of (default today). Returns the number of products processed.
+    """
+    from purchases.models import PurchaseOrderItem
+
+    as_of = as_of or timezone.localdate()
+    lookback_days = lookback_days or settings.STOCK_REORDER_LOOKBACK_DAYS
+    lead_time_days = settings.STOCK_REORDER_LEAD_TIME_DAYS
+    review_days = settings.STOCK_REORDER_REVIEW_DAYS
+    service_factor = settings.STOCK_REORDER_SERVICE_FACTOR
+
+    ids = np.array(
+        Product.objects.filter(is_active=True).order_by('pk').values_list('pk', flat=True),
+        dtype=np.int64,
+    )
+    size = len(ids)
+
+    product_ids, days, quantities = load_daily_sales(as_of - timedelta(days=lookback_days - 1), as_of)
+    index = np.searchsorted(ids, product_ids)
+    # Drop sales of products that are no longer active
+    known = index < size
+    known[known] = ids[index[known]] == product_ids[known]
+    index = index[known]
+    age = (np.datetime64(as_of, 'D') - days[known]).astype(np.int64)
+    average, std, ewma = sales_velocity(index, age, quantities[known], size, lookback_days)
+
+    def per_product(pairs):
+        values = np.zeros(size)
+        pairs = list(pairs)
+        if pairs:
+            pair_ids = np.array([pk for pk, _ in pairs], dtype=np.int64)
+            positions = np.searchsorted(ids, pair_ids)
+            found = positions < size
+            found[found] = ids[positions[found]] == pair_ids[found]
+            values[positions[found]] = np.array([value for _, value in pairs], dtype=np.float64)[found]
+        return values
+
+    on_hand = per_product(StockBalance.objects.values_list('product_id', 'quantity'))
+    on_order = per_product(
+        PurchaseOrderItem.objects
+        .filter(purchase_order__status='purchase-order')
+        .values_list('product_id')
+        .annotate(quantity=Sum('quantity'))
+        .order_by()
+    )
+
+    # Follow a rising trend quickly, but don't drop the average on one quiet week
+    demand = np.maximum(average, ewma)
+    reorder_point, suggested, days_of_cover = reorder_quantities(
+        demand, std, on_hand, on_order, lead_time_days, review_days, service_factor,
+    )
+
+    computed_at = timezone.now()
+    suggestions = [
+        ReorderSuggestion(
+            product_id=int(ids[i]),
+            as_of=as_of,
+            average_daily_demand=to_decimal(average[i], 4),
+            ewma_daily_demand=to_decimal(ewma[i], 4),
+            demand_std=to_decimal(std[i], 4),
+            on_hand=to_decimal(on_hand[i], 2),
+            on_order=to_decimal(on_order[i], 2),
+            days_of_cover=None if np.isnan(days_of_cover[i]) else to_decimal(days_of_cover[i], 1),
+            reorder_point=to_decimal(reorder_point[i], 2),
+            suggested_quantity=to_decimal(suggested[i], 2),
+            computed_at=computed_at,
+        )
+        for i in range(size)
+    ]
+    with transaction.atomic():
+        ReorderSuggestion.objects.all().delete()
+        ReorderSuggestion.objects.bulk_create(suggestions, batch_size=2000)
+    return size
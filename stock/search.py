@@ -0,0 +1,187 @@
+"""
+Product search index covering name, brand, category and description.
+
+SQLite keeps an FTS5 table and PostgreSQL a table with a weighted tsvector
+plus a trigram index; other backends fall back to icontains lookups. The
+index is created after migrate, kept in sync by stock.signals on Product,
+ProductBrand and ProductCategory saves, and can be rebuilt with
+``python manage.py rebuild_product_search``.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+SEARCH_TABLE = 'stock_product_search'
+# Column weights for ranking: name, brand, category, description
+RANK_WEIGHTS = (10.0, 4.0, 2.0, 1.0)
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def search_backend():
+    """'fts5', 'postgres' or None when the database has no search index support"""
+    if connection.vendor == 'sqlite':
+        return 'fts5'
+    if connection.vendor == 'postgresql':
+        return 'postgres'
+    return None
+
+
+def tokenize(query):
+    return TOKEN_RE.findall((query or '').lower())
+
+
+def ensure_search_index():
+    """Create the search table if missing; a new table is filled from all products"""
+    backend = search_backend()
+    if backend is None:
+        return False
+    with connection.cursor() as cursor:
+        if SEARCH_TABLE in connection.introspection.table_names(cursor):
+            return False
+        if backend == 'fts5':
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5("
+                "name, brand, category, description, active UNINDEXED, "
+                "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+            )
+        else:
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            cursor.execute(
+                f'CREATE TABLE {SEARCH_TABLE} ('
+                'product_id bigint PRIMARY KEY, active boolean NOT NULL, '
+                'document text NOT NULL, search_vector tsvector NOT NULL)'
+            )
+            cursor.execute(f'CREATE INDEX {SEARCH_TABLE}_vector_idx ON {SEARCH_TABLE} USING gin (search_vector)')
+            cursor.execute(f'CREATE INDEX {SEARCH_TABLE}_trgm_idx ON {SEARCH_TABLE} USING gin (document gin_trgm_ops)')
+    index_products()
+    return True
+
+
+def index_products(product_ids=None):
+    """
+    Write index rows for the given product ids, or rebuild the whole index
+    when product_ids is None. Returns the number of products indexed.
+    """
+    from .models import Product
+
+    backend = search_backend()
+    if backend is None:
+        return 0
+    products = Product.objects.values_list('pk', 'name', 'brand__name', 'category__name', 'description', 'is_active')
+    if product_ids is not None:
+        product_ids = list(product_ids)
+        if not product_ids:
+            return 0
+        products = products.filter(pk__in=product_ids)
+        remove_products(product_ids)
+    else:
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+
+    rows = [
+        (pk, name, brand or '', category or '', description or '', is_active)
+        for pk, name, brand, category, description, is_active in products.iterator()
+    ]
+    with connection.cursor() as cursor:
+        if backend == 'fts5':
+            cursor.executemany(
+                f'INSERT INTO {SEARCH_TABLE} (rowid, name, brand, category, description, active) '
+                'VALUES (%s, %s, %s, %s, %s, %s)',
+                [(pk, name, brand, category, description, int(active)) for pk, name, brand, category, description, active in rows],
+            )
+        else:
+            cursor.executemany(
+                f'INSERT INTO {SEARCH_TABLE} (product_id, active, document, search_vector) VALUES ('
+                "%s, %s, %s, "
+                "setweight(to_tsvector('simple', %s), 'A') || setweight(to_tsvector('simple', %s), 'B') || "
+                "setweight(to_tsvector('simple', %s), 'C') || setweight(to_tsvector('simple', %s), 'D'))",
+                [
+                    (pk, active, ' '.join(filter(None, (name, brand, category))).lower(), name, brand, category, description)
+                    for pk, name, brand, category, description, active in rows
+                ],
+            )
+    return len(rows)
+
+
+def remove_products(product_ids):
+    backend = search_backend()
+    product_ids = list(product_ids)
+    if backend is None or not product_ids:
+        return
+    key = 'rowid' if backend == 'fts5' else 'product_id'
+    placeholders = ', '.join(['%s'] * len(product_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE {key} IN ({placeholders})', product_ids)
+
+
+def match_sql(query, active_only=True):
+    """
+    (sql, params) selecting matching product ids, best match first,
+    or None when the query has no searchable terms.
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return None
+    backend = search_backend()
+    if backend == 'fts5':
+        # Every term must match, the last one as a prefix while the user types
+        expression = ' '.join(f'"{token}"' for token in tokens[:-1])
+        expression = f'{expression} "{tokens[-1]}"*'.strip()
+        weights = ', '.join(str(weight) for weight in RANK_WEIGHTS)
+        sql = f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s'
+        if active_only:
+            sql += ' AND active = 1'
+        sql += f' ORDER BY bm25({SEARCH_TABLE}, {weights})'
+        return sql, [expression]
+    tsquery = ' & '.join(f'{token}:*' for token in tokens)
+    text = ' '.join(tokens)
+    sql = (
+        f'SELECT product_id FROM {SEARCH_TABLE} '
+        "WHERE (search_vector @@ to_tsquery('simple', %s) OR document %% %s)"
+    )
+    if active_only:
+        sql += ' AND active'
+    sql += " ORDER BY ts_rank(search_vector, to_tsquery('simple', %s)) DESC, similarity(document, %s) DESC"
+    return sql, [tsquery, text, tsquery, text]
+
+
+def search_product_ids(query, limit=10, active_only=True):
+    """Ids of the best matching products, best first"""
+    from .models import Product
+
+    if search_backend() is None:
+        products = filter_products(Product.objects.all(), query)
+        if active_only:
+            products = products.filter(is_active=True)
+        return list(products.order_by('name').values_list('pk', flat=True)[:limit])
+    statement = match_sql(query, active_only)
+    if statement is None:
+        return []
+    sql, params = statement
+    if limit is not None:
+        sql += ' LIMIT %s'
+        params = params + [limit]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def filter_products(queryset, query):
+    """Restrict a Product queryset to search matches (inactive products included)"""
+    if search_backend() is None:
+        for token in tokenize(query):
+            queryset = queryset.filter(
+                Q(name__icontains=token) | Q(brand__name__icontains=token)
+                | Q(category__name__icontains=token) | Q(description__icontains=token)
+            )
+        return queryset
+    statement = match_sql(query, active_only=False)
+    if statement is None:
+        return queryset
+    sql, params = statement
+    # The ranking ORDER BY is meaningless inside IN (...)
+    sql = sql.split(' ORDER BY ')[0]
+    return queryset.filter(pk__in=RawSQL(sql, params))
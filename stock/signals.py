@@ -0,0 +1,49 @@
+# Keep the product search index (stock.search) in sync with catalog edits
+# and move the order entry catalog (stock.catalog) to a new version.
+# Inventory figures are not maintained by signals - orders call sync_stock(),
+# and bulk StockBalance updates bump the catalog version themselves.
+from django.db import connection
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Product, ProductBrand, ProductCategory, UnitType, StockBalance, bump_catalog_version
+from . import search
+
+
+@receiver(post_save, sender=Product)
+def index_saved_product(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_products([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_deleted_product(sender, instance, **kwargs):
+    search.remove_products([instance.pk])
+
+
+@receiver(post_save, sender=ProductBrand)
+@receiver(post_save, sender=ProductCategory)
+def reindex_renamed_products(sender, instance, raw=False, created=False, **kwargs):
+    if not raw and not created:
+        search.index_products(instance.products.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductCategory)
+@receiver(post_delete, sender=ProductCategory)
+@receiver(post_save, sender=ProductBrand)
+@receiver(post_delete, sender=ProductBrand)
+@receiver(post_save, sender=UnitType)
+@receiver(post_delete, sender=UnitType)
+@receiver(post_save, sender=StockBalance)
+@receiver(post_delete, sender=StockBalance)
+def catalog_changed(sender, raw=False, **kwargs):
+    if not raw:
+        bump_catalog_version()
+
+
+def create_search_index(sender, **kwargs):
+    # Without committed migrations for this app, migrate may not have created the product table
+    if Product._meta.db_table in connection.introspection.table_names():
+        search.ensure_search_index()
@@ -0,0 +1,70 @@
+"""
+Test cases for available-to-promise quantities
+"""
+
+from django.test import TestCase
+from django.urls import reverse
+from decimal import Decimal
+
+from stock.models import Product
+from stock.test_balance import StockBalanceTestMixin
+
+
+class AvailableToPromiseTest(StockBalanceTestMixin, TestCase):
+    """Open sales orders commit stock, open purchase orders are on order"""
+
+    def setUp(self):
+        super().setUp()
+        self.create_purchase('100').receive_goods()
+        self.open_sale = self.create_sale('30')
+        self.create_sale('20').mark_delivered()
+        self.create_sale('5').cancel_order()
+        self.create_purchase('40')
+
+    def availability(self, **kwargs):
+        return Product.objects.with_availability(**kwargs).get(pk=self.product.pk)
+
+    def test_annotations(self):
+        product = self.availability()
+        self.assertEqual(product.on_hand, Decimal('80'))
+        self.assertEqual(product.committed_quantity, Decimal('30'))
+        self.assertEqual(product.on_order_quantity, Decimal('40'))
+        self.assertEqual(product.available_to_promise, Decimal('50'))
+        self.assertEqual(product.get_available_quantity(), Decimal('50'))
+
+    def test_overcommitted_stock_goes_negative(self):
+        self.create_sale('70')
+        self.assertEqual(self.product.get_available_quantity(), Decimal('-20'))
+        # On hand is still what is physically there
+        self.assertEqual(self.product.get_realtime_quantity(), Decimal('80'))
+
+    def test_exclude_order_being_edited(self):
+        self.assertEqual(self.availability(exclude_sales_order=self.open_sale).available_to_promise, Decimal('80'))
+
+    def test_products_without_orders(self):
+        other = Product.objects.create(name='Sand', unit_type=self.unit)
+        product = Product.objects.with_availability().get(pk=other.pk)
+        self.assertEqual(product.committed_quantity, Decimal('0'))
+        self.assertEqual(product.available_to_promise, Decimal('0'))
+
+    def test_batched_endpoint_uses_one_query(self):
+        others = Product.objects.bulk_create([Product(name=f'Extra {index}', unit_type=self.unit) for index in range(10)])
+        ids = ','.join(str(product.pk) for product in [self.product, *others])
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('stock:product_availability_json'), {'ids': ids})
+        results = response.json()['results']
+        self.assertEqual(len(results), 11)
+        row = {field: Decimal(value) for field, value in results[str(self.product.pk)].items()}
+        self.assertEqual(row, {
+            'on_hand': Decimal('80'), 'committed': Decimal('30'), 'on_order': Decimal('40'), 'available': Decimal('50'),
+        })
+
+    def test_endpoint_excludes_order_and_ignores_bad_ids(self):
+        response = self.client.get(reverse('stock:product_availability_json'), {
+            'ids': f'{self.product.pk},abc,,', 'exclude_order': self.open_sale.pk,
+        })
+        self.assertEqual(Decimal(response.json()['results'][str(self.product.pk)]['available']), Decimal('80'))
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('stock:product_availability_json'))
+        self.assertEqual(response.json(), {'results': {}})
@@ -0,0 +1,214 @@
+"""
+Test cases for the maintained StockBalance table
+"""
+
+from django.test import TestCase
+from django.core.management import call_command
+from django.contrib.auth.models import User
+from django.urls import reverse
+from decimal import Decimal
+from datetime import date
+from io import StringIO
+
+from stock.models import Product, UnitType, StockBalance
+from suppliers.models import Supplier
+from customers.models import Customer
+from purchases.models import PurchaseOrder, PurchaseOrderItem
+from sales.models import SalesOrder, SalesOrderItem
+
+
+class StockBalanceTestMixin:
+    """Shared fixtures for stock balance tests"""
+
+    def setUp(self):
+        self.unit = UnitType.objects.create(code='bag', name='Bag')
+        self.product = Product.objects.create(name='Cement', unit_type=self.unit, cost_price=Decimal('400.00'))
+        self.supplier = Supplier.objects.create(name='Test Supplier')
+        self.customer = Customer.objects.create(name='Test Customer', customer_type='retail')
+
+    def create_purchase(self, quantity, status='purchase-order', unit_price='450.00', order_date=None):
+        order = PurchaseOrder.objects.create(
+            supplier=self.supplier,
+            order_date=order_date or date(2025, 1, 10),
+            expected_date=date(2025, 1, 15),
+            status=status,
+        )
+        PurchaseOrderItem.objects.create(
+            purchase_order=order,
+            product=self.product,
+            quantity=Decimal(quantity),
+            unit_price=Decimal(unit_price),
+            total_price=Decimal(quantity) * Decimal(unit_price),
+        )
+        return order
+
+    def create_sale(self, quantity, status='order', order_date=None):
+        order = SalesOrder.objects.create(
+            order_number=f"SO-TEST-{SalesOrder.objects.count() + 1}",
+            customer=self.customer,
+            order_date=order_date or date(2025, 1, 20),
+            status=status,
+        )
+        SalesOrderItem.objects.create(
+            sales_order=order,
+            product=self.product,
+            quantity=Decimal(quantity),
+            unit_price=Decimal('500.00'),
+            total_price=Decimal(quantity) * Decimal('500.00'),
+        )
+        return order
+
+    def balance(self):
+        return StockBalance.objects.get(product=self.product)
+
+
+class StockBalanceModelTest(StockBalanceTestMixin, TestCase):
+    """Balances follow order status transitions"""
+
+    def test_receive_and_deliver_update_balance(self):
+        self.create_purchase('100').receive_goods()
+        self.create_sale('30').mark_delivered()
+
+        balance = self.balance()
+        self.assertEqual(balance.received_quantity, Decimal('100'))
+        self.assertEqual(balance.delivered_quantity, Decimal('30'))
+        self.assertEqual(balance.quantity, Decimal('70'))
+        self.assertEqual(self.product.get_realtime_quantity(), Decimal('70'))
+
+    def test_cancel_reverses_balance(self):
+        purchase = self.create_purchase('100')
+        purchase.receive_goods()
+        sale = self.create_sale('30')
+        sale.mark_delivered()
+
+        sale.cancel_order()
+        self.assertEqual(self.balance().quantity, Decimal('100'))
+
+        purchase.cancel_order()
+        self.assertEqual(self.balance().quantity, Decimal('0'))
+        self.assertEqual(self.balance().received_quantity, Decimal('0'))
+
+    def test_cancel_open_order_leaves_balance(self):
+        self.create_purchase('100').receive_goods()
+        self.create_sale('30').cancel_order()
+        self.assertEqual(self.balance().quantity, Decimal('100'))
+
+    def test_missing_balance_is_rebuilt_on_read(self):
+        self.create_purchase('40', status='goods-received')
+        self.assertFalse(StockBalance.objects.filter(product=self.product).exists())
+
+        self.assertEqual(self.product.get_realtime_quantity(), Decimal('40'))
+        self.assertTrue(StockBalance.objects.filter(product=self.product).exists())
+
+    def test_reads_are_single_lookup(self):
+        self.create_purchase('10').receive_goods()
+        product = Product.objects.get(pk=self.product.pk)
+        with self.assertNumQueries(1):
+            product.get_realtime_quantity()
+
+
+class RebuildStockBalancesCommandTest(StockBalanceTestMixin, TestCase):
+    """The rebuild command recomputes balances from source rows"""
+
+    def test_rebuild_corrects_drift(self):
+        self.create_purchase('100').receive_goods()
+        self.create_sale('25', status='delivered')
+        StockBalance.objects.filter(product=self.product).update(quantity=Decimal('999'))
+
+        out = StringIO()
+        call_command('rebuild_stock_balances', stdout=out)
+
+        self.assertIn('1 products', out.getvalue())
+        balance = self.balance()
+        self.assertEqual(balance.received_quantity, Decimal('100'))
+        self.assertEqual(balance.delivered_quantity, Decimal('25'))
+        self.assertEqual(balance.quantity, Decimal('75'))
+
+
+class StockBalanceViewTest(StockBalanceTestMixin, TestCase):
+    """Order views keep balances in sync"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.login(username='testuser', password='testpass123')
+
+    def test_purchase_update_to_received(self):
+        order = self.create_purchase('60')
+        item = order.items.get()
+        response = self.client.post(reverse('purchases:order_edit', args=[order.pk]), {
+            'supplier': self.supplier.pk,
+            'order_date': '2025-01-10',
+            'expected_date': '2025-01-15',
+            'status': 'goods-received',
+            'invoice_id': 'INV-1',
+            'notes': '',
+            'items-TOTAL_FORMS': '1',
+            'items-INITIAL_FORMS': '1',
+            'items-MIN_NUM_FORMS': '0',
+            'items-MAX_NUM_FORMS': '1000',
+            'items-0-id': item.pk,
+            'items-0-product': self.product.pk,
+            'items-0-quantity': '60',
+            'items-0-unit_price': '450.00',
+            'items-0-total_price': '27000.00',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.balance().quantity, Decimal('60'))
+
+    def test_deleting_delivered_sale_restores_stock(self):
+        self.create_purchase('50').receive_goods()
+        sale = self.create_sale('20')
+        sale.mark_delivered()
+        self.assertEqual(self.balance().quantity, Decimal('30'))
+
+        self.client.post(reverse('sales:order_delete', args=[sale.pk]))
+        self.assertEqual(self.balance().quantity, Decimal('50'))
+
+
+class LastReceivedCostTest(StockBalanceTestMixin, TestCase):
+    """last_received_cost follows the most recent received purchase order"""
+
+    def test_receive_sets_and_cancel_rolls_back(self):
+        older = self.create_purchase('10', unit_price='400.00', order_date=date(2025, 1, 1))
+        newer = self.create_purchase('10', unit_price='460.00', order_date=date(2025, 2, 1))
+        older.receive_goods()
+        self.assertEqual(self.balance().last_received_cost, Decimal('400.00'))
+
+        newer.receive_goods()
+        balance = self.balance()
+        self.assertEqual(balance.last_received_cost, Decimal('460.00'))
+        self.assertEqual(balance.last_received_date, date(2025, 2, 1))
+
+        newer.cancel_order()
+        balance = self.balance()
+        self.assertEqual(balance.last_received_cost, Decimal('400.00'))
+        self.assertEqual(balance.last_received_date, date(2025, 1, 1))
+
+    def test_delete_falls_back_to_previous_receipt(self):
+        self.create_purchase('10', unit_price='100.00', order_date=date(2025, 1, 1)).receive_goods()
+        newer = self.create_purchase('10', unit_price='200.00', order_date=date(2025, 2, 1))
+        newer.receive_goods()
+
+        newer.delete()
+        balance = self.balance()
+        self.assertEqual(balance.quantity, Decimal('10'))
+        self.assertEqual(balance.last_received_cost, Decimal('100.00'))
+        self.assertEqual(balance.last_received_date, date(2025, 1, 1))
+
+    def test_backdated_receipt_keeps_latest_cost(self):
+        self.create_purchase('10', unit_price='460.00', order_date=date(2025, 2, 1)).receive_goods()
+        self.create_purchase('10', unit_price='400.00', order_date=date(2025, 1, 1)).receive_goods()
+        self.assertEqual(self.balance().last_received_cost, Decimal('460.00'))
+
+    def test_stock_value_uses_maintained_cost(self):
+        self.create_purchase('10', unit_price='450.00').receive_goods()
+        product = Product.objects.get(pk=self.product.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(product.get_total_stock_value(), Decimal('4500.00'))
+
+    def test_rebuild_restores_cost(self):
+        self.create_purchase('10', unit_price='450.00').receive_goods()
+        StockBalance.objects.update(last_received_cost=None, last_received_date=None)
+        call_command('rebuild_stock_balances', stdout=StringIO())
+        self.assertEqual(self.balance().last_received_cost, Decimal('450.00'))
@@ -0,0 +1,87 @@
+"""
+Test cases for the versioned order entry catalog payload
+"""
+
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.urls import reverse
+from decimal import Decimal
+
+from stock.models import Product, ProductBrand, get_catalog_version
+from stock.catalog import get_catalog_payload
+from stock.test_balance import StockBalanceTestMixin
+
+
+class ProductCatalogTest(StockBalanceTestMixin, TestCase):
+    """Catalog payload is cached per version and revalidated with its ETag"""
+
+    def setUp(self):
+        cache.clear()
+        super().setUp()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.force_login(self.user)
+
+    def fetch(self, **headers):
+        return self.client.get(reverse('stock:product_catalog_json'), headers=headers)
+
+    def rows(self, response):
+        payload = response.json()
+        return {row[1]: dict(zip(payload['fields'], row)) for row in payload['products']}
+
+    def test_payload_lists_active_products(self):
+        brand = ProductBrand.objects.create(name='Holcim')
+        Product.objects.filter(pk=self.product.pk).update(brand=brand, selling_price=Decimal('520.00'))
+        Product.objects.create(name='Retired', unit_type=self.unit, is_active=False)
+
+        response = self.fetch()
+        self.assertEqual(response.status_code, 200)
+        rows = self.rows(response)
+        self.assertEqual(list(rows), ['Cement'])
+        self.assertEqual(rows['Cement']['unit'], 'bag')
+        self.assertEqual(rows['Cement']['selling_price'], '520.00')
+        self.assertEqual(response.json()['brands'][str(brand.pk)], 'Holcim')
+
+    def test_cost_price_only_in_purchase_catalog(self):
+        Product.objects.filter(pk=self.product.pk).update(cost_price=Decimal('430.00'))
+        self.assertNotIn('cost_price', self.fetch().json()['fields'])
+
+        response = self.client.get(reverse('stock:product_purchase_catalog_json'))
+        rows = self.rows(response)
+        self.assertEqual(rows['Cement']['cost_price'], '430.00')
+        self.assertEqual(rows['Cement']['selling_price'], self.rows(self.fetch())['Cement']['selling_price'])
+        self.assertNotEqual(response['ETag'], self.fetch()['ETag'])
+
+    def test_unchanged_catalog_revalidates_with_304(self):
+        response = self.fetch()
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('"'))
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertIn('private', response['Cache-Control'])
+
+        response = self.fetch(if_none_match=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_payload_built_once_per_version(self):
+        get_catalog_payload()
+        with self.assertNumQueries(0):
+            get_catalog_payload()
+
+    def test_catalog_edits_bump_version(self):
+        etag = self.fetch()['ETag']
+        version = get_catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = 'Portland Cement'
+            self.product.save()
+        self.assertGreater(get_catalog_version(), version)
+
+        response = self.fetch(if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Portland Cement', self.rows(response))
+
+    def test_stock_changes_bump_version(self):
+        self.assertEqual(self.rows(self.fetch())['Cement']['on_hand'], '0')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_purchase('40').receive_goods()
+        self.assertEqual(Decimal(self.rows(self.fetch())['Cement']['on_hand']), Decimal('40'))
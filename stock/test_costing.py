@@ -0,0 +1,171 @@
+"""
+Test cases for the FIFO / moving-average cost engine
+"""
+
+from django.test import TestCase, override_settings
+from django.core.management import call_command
+from django.contrib.auth.models import User
+from django.urls import reverse
+from decimal import Decimal
+from datetime import date
+from io import StringIO
+
+from stock.models import Product, StockMovement, CostLayer
+from stock.costing import process_pending_movements, get_cost_of_goods_sold
+from stock.test_balance import StockBalanceTestMixin
+
+
+class CostingTestMixin(StockBalanceTestMixin):
+    """Two receipts at different prices followed by a sale"""
+
+    def receive_two_lots(self):
+        self.create_purchase('10', unit_price='100.00', order_date=date(2025, 1, 1)).receive_goods()
+        self.create_purchase('10', unit_price='130.00', order_date=date(2025, 1, 5)).receive_goods()
+
+    def line_cost(self, sale):
+        return sale.items.get().cost_amount
+
+
+class FifoCostingTest(CostingTestMixin, TestCase):
+    """FIFO layers are consumed oldest first"""
+
+    def test_sale_consumes_oldest_layers(self):
+        self.receive_two_lots()
+        sale = self.create_sale('15')
+        sale.mark_delivered()
+
+        # 10 @ 100 + 5 @ 130
+        self.assertEqual(self.line_cost(sale), Decimal('1650.00'))
+        balance = self.balance()
+        self.assertEqual(balance.costed_quantity, Decimal('5'))
+        self.assertEqual(balance.fifo_value, Decimal('650.00'))
+        self.assertEqual(
+            list(CostLayer.objects.filter(remaining_quantity__gt=0).values_list('unit_cost', 'remaining_quantity')),
+            [(Decimal('130.0000'), Decimal('5'))],
+        )
+
+    def test_valuation_reads_maintained_value(self):
+        self.receive_two_lots()
+        self.create_sale('15').mark_delivered()
+
+        with self.assertNumQueries(1):
+            product = Product.objects.with_stock().get(pk=self.product.pk)
+        self.assertEqual(product.unit_cost, Decimal('130.00'))
+        self.assertEqual(product.stock_value, Decimal('650.00'))
+        self.assertEqual(Product.objects.get(pk=self.product.pk).get_total_stock_value(), Decimal('650.00'))
+
+    def test_cancelled_sale_returns_at_original_cost(self):
+        self.receive_two_lots()
+        sale = self.create_sale('15')
+        sale.mark_delivered()
+        sale.cancel_order()
+
+        self.assertIsNone(self.line_cost(sale))
+        balance = self.balance()
+        self.assertEqual(balance.costed_quantity, Decimal('20'))
+        self.assertEqual(balance.fifo_value, Decimal('2300.00'))
+
+    def test_cancelled_receipt_removes_its_own_layer(self):
+        self.create_purchase('10', unit_price='100.00').receive_goods()
+        newer = self.create_purchase('10', unit_price='130.00')
+        newer.receive_goods()
+        newer.cancel_order()
+
+        balance = self.balance()
+        self.assertEqual(balance.costed_quantity, Decimal('10'))
+        self.assertEqual(balance.fifo_value, Decimal('1000.00'))
+
+    @override_settings(STOCK_ALLOW_NEGATIVE=True)
+    def test_oversold_stock_is_costed_at_average(self):
+        self.create_purchase('10', unit_price='100.00').receive_goods()
+        sale = self.create_sale('12')
+        sale.mark_delivered()
+        self.assertEqual(self.line_cost(sale), Decimal('1200.00'))
+        self.assertEqual(self.balance().fifo_value, Decimal('0'))
+
+    @override_settings(STOCK_ALLOW_NEGATIVE=True)
+    def test_receipt_after_oversell_fills_the_shortfall(self):
+        self.create_sale('5').mark_delivered()
+        self.create_purchase('10', unit_price='2.00').receive_goods()
+
+        balance = self.balance()
+        self.assertEqual((balance.quantity, balance.costed_quantity), (Decimal('5'), Decimal('5')))
+        self.assertEqual(balance.fifo_value, Decimal('10.00'))
+        self.assertEqual(
+            list(CostLayer.objects.filter(remaining_quantity__gt=0).values_list('unit_cost', 'remaining_quantity')),
+            [(Decimal('2.0000'), Decimal('5'))],
+        )
+
+        # Recosting from the journal ends in the same position
+        call_command('cost_stock_movements', '--reset', stdout=StringIO())
+        self.assertEqual(self.balance().fifo_value, Decimal('10.00'))
+        self.assertEqual(CostLayer.objects.filter(remaining_quantity__gt=0).get().remaining_quantity, Decimal('5'))
+
+    def test_processing_is_incremental(self):
+        self.receive_two_lots()
+        self.assertFalse(StockMovement.objects.filter(cost_amount__isnull=True).exists())
+        self.assertEqual(process_pending_movements(), 0)
+
+    def test_cost_of_goods_sold_for_period(self):
+        self.receive_two_lots()
+        self.create_sale('5', order_date=date(2025, 1, 20)).mark_delivered()
+        self.create_sale('10', order_date=date(2025, 2, 3)).mark_delivered()
+
+        self.assertEqual(get_cost_of_goods_sold(date(2025, 1, 1), date(2025, 1, 31)), Decimal('500.00'))
+        # 5 @ 100 + 5 @ 130
+        self.assertEqual(get_cost_of_goods_sold(date(2025, 2, 1), date(2025, 2, 28)), Decimal('1150.00'))
+
+    def test_recost_command_reproduces_costs(self):
+        self.receive_two_lots()
+        sale = self.create_sale('15')
+        sale.mark_delivered()
+
+        out = StringIO()
+        call_command('cost_stock_movements', reset=True, stdout=out)
+
+        self.assertIn('Costed 3 stock movements', out.getvalue())
+        self.assertEqual(self.line_cost(sale), Decimal('1650.00'))
+        self.assertEqual(self.balance().fifo_value, Decimal('650.00'))
+
+
+@override_settings(STOCK_COSTING_METHOD='average')
+class AverageCostingTest(CostingTestMixin, TestCase):
+    """Moving-average cost"""
+
+    def test_sale_costed_at_moving_average(self):
+        self.receive_two_lots()
+        sale = self.create_sale('15')
+        sale.mark_delivered()
+
+        self.assertEqual(self.line_cost(sale), Decimal('1725.00'))
+        balance = self.balance()
+        self.assertEqual(balance.average_cost, Decimal('115.0000'))
+        self.assertEqual(balance.average_value, Decimal('575.00'))
+        self.assertEqual(Product.objects.with_stock().get(pk=self.product.pk).stock_value, Decimal('575.00'))
+
+    def test_receipt_after_sale_updates_average(self):
+        self.create_purchase('10', unit_price='100.00').receive_goods()
+        self.create_sale('5').mark_delivered()
+        self.create_purchase('5', unit_price='160.00').receive_goods()
+
+        self.assertEqual(self.balance().average_cost, Decimal('130.0000'))
+
+
+class ProfitLossCostOfGoodsSoldTest(CostingTestMixin, TestCase):
+    """The P&L report uses the cost of goods actually sold"""
+
+    def test_profit_loss_ignores_unsold_purchases(self):
+        user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.force_login(user)
+        self.receive_two_lots()
+        sale = self.create_sale('5', order_date=date(2025, 1, 20))
+        sale.total_amount = Decimal('2500.00')
+        sale.save()
+        sale.mark_delivered()
+
+        response = self.client.get(reverse('reports:profit_loss'), {
+            'start_date': '2025-01-01', 'end_date': '2025-01-31',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cost_of_goods_sold'], Decimal('500.00'))
+        self.assertEqual(response.context['gross_profit'], Decimal('2000.00'))
@@ -0,0 +1,135 @@
+"""
+Test cases for the oversell guard on delivery posting
+"""
+
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.core.management import call_command
+from django.contrib.auth.models import User
+from django.contrib.messages import get_messages
+from django.urls import reverse
+from decimal import Decimal
+from datetime import date
+from io import StringIO
+
+from stock.models import InsufficientStockError, StockBalance
+from sales.models import SalesOrder
+from stock.test_balance import StockBalanceTestMixin
+
+
+class DeliveryGuardTest(StockBalanceTestMixin, TestCase):
+    """Deliveries never take stock below zero"""
+
+    def setUp(self):
+        super().setUp()
+        self.create_purchase('10').receive_goods()
+
+    def messages(self, response):
+        return ' '.join(str(message) for message in get_messages(response.wsgi_request))
+
+    def test_delivery_beyond_stock_rejected(self):
+        order = self.create_sale('15')
+        with self.assertRaises(InsufficientStockError) as raised:
+            order.mark_delivered()
+        self.assertEqual(raised.exception.shortages, {'Cement': (Decimal('15'), Decimal('10'))})
+        self.assertIn('Cement (15', str(raised.exception))
+
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'order')
+        self.assertEqual(self.balance().quantity, Decimal('10'))
+
+    def test_last_units_delivered_once(self):
+        first = self.create_sale('10')
+        second = self.create_sale('10')
+        self.assertTrue(first.mark_delivered())
+        with self.assertRaises(InsufficientStockError):
+            second.mark_delivered()
+        self.assertEqual(self.balance().quantity, Decimal('0'))
+
+    def test_stale_order_is_not_delivered_twice(self):
+        order = self.create_sale('4')
+        stale = SalesOrder.objects.get(pk=order.pk)
+        self.assertTrue(order.mark_delivered())
+        self.assertFalse(stale.mark_delivered())
+        self.assertEqual(stale.status, 'delivered')
+        self.assertEqual(self.balance().quantity, Decimal('6'))
+
+    def test_rejected_delivery_leaves_instance_open(self):
+        order = self.create_sale('15')
+        with self.assertRaises(InsufficientStockError):
+            order.mark_delivered()
+        self.assertEqual(order.status, 'order')
+
+        self.create_purchase('5').receive_goods()
+        self.assertTrue(order.mark_delivered())
+        self.assertEqual(self.balance().quantity, Decimal('0'))
+
+    def test_delivery_keeps_concurrent_edits(self):
+        order = self.create_sale('4')
+        SalesOrder.objects.filter(pk=order.pk).update(notes='Deliver after 5pm')
+        self.assertTrue(order.mark_delivered())
+        order.refresh_from_db()
+        self.assertEqual((order.status, order.notes), ('delivered', 'Deliver after 5pm'))
+
+    def test_stale_order_is_not_cancelled_twice(self):
+        order = self.create_sale('4')
+        order.mark_delivered()
+        stale = SalesOrder.objects.get(pk=order.pk)
+        self.assertTrue(order.cancel_order())
+        self.assertFalse(stale.cancel_order())
+        self.assertEqual(stale.status, 'cancel')
+        self.assertEqual(self.balance().quantity, Decimal('10'))
+
+    def test_missing_balance_row_still_guarded(self):
+        StockBalance.objects.all().delete()
+        with self.assertRaises(InsufficientStockError):
+            self.create_sale('11').mark_delivered()
+        # Rolled back along with the rebuilt row
+        self.assertFalse(StockBalance.objects.exists())
+
+    @override_settings(STOCK_ALLOW_NEGATIVE=True)
+    def test_negative_stock_allowed_and_logged(self):
+        with self.assertLogs('stock.models', level='WARNING') as logs:
+            self.assertTrue(self.create_sale('15').mark_delivered())
+        self.assertIn('Cement', logs.output[0])
+        self.assertEqual(self.balance().quantity, Decimal('-5'))
+
+    def test_view_reports_shortage(self):
+        user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.force_login(user)
+        order = self.create_sale('15')
+        response = self.client.post(reverse('sales:mark_order_delivered', args=[order.pk]))
+        self.assertRedirects(response, reverse('sales:order_detail', args=[order.pk]), fetch_redirect_response=False)
+        self.assertIn('was not delivered', self.messages(response))
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'order')
+
+    def test_instant_sale_beyond_stock_not_created(self):
+        user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.force_login(user)
+        response = self.client.post(reverse('sales:instant_sales'), {
+            'customer_name': 'Walk-in',
+            'order_date': date(2025, 1, 20).isoformat(),
+            'sales_type': 'instant',
+            'items-TOTAL_FORMS': '1',
+            'items-INITIAL_FORMS': '0',
+            'items-MIN_NUM_FORMS': '0',
+            'items-MAX_NUM_FORMS': '1000',
+            'items-0-product': str(self.product.pk),
+            'items-0-quantity': '12',
+            'items-0-unit_price': '500.00',
+            'items-0-total_price': '6000.00',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Instant sale not completed', self.messages(response))
+        self.assertFalse(SalesOrder.objects.filter(sales_type='instant').exists())
+        self.assertEqual(self.balance().quantity, Decimal('10'))
+
+
+class DeliveryBenchmarkCommandTest(TransactionTestCase):
+    """Parallel deliveries through the benchmark command never oversell"""
+
+    def test_parallel_deliveries(self):
+        out = StringIO()
+        call_command('benchmark_deliveries', '--workers', '4', '--orders', '20', '--stock', '10', stdout=out)
+        self.assertIn('No stock oversold', out.getvalue())
+        self.assertFalse(SalesOrder.objects.exists())
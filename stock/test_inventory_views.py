@@ -0,0 +1,227 @@
+"""
+Test cases for the set-based inventory pages
+"""
+
+from django.test import TestCase, override_settings
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from decimal import Decimal
+from datetime import date
+
+from stock.models import Product, UnitType, get_low_stock_products, get_low_stock_alerts, LOW_STOCK_ALERTS_CACHE_KEY
+from suppliers.models import Supplier
+from customers.models import Customer
+from purchases.models import PurchaseOrder, PurchaseOrderItem
+from sales.models import SalesOrder, SalesOrderItem
+
+
+class InventoryFixtureMixin:
+    """Creates products with received and delivered quantities"""
+
+    def setUp(self):
+        self.unit = UnitType.objects.create(code='pcs', name='Pieces')
+        self.supplier = Supplier.objects.create(name='Test Supplier')
+        self.customer = Customer.objects.create(name='Test Customer', customer_type='retail')
+
+    def create_product(self, name, received='0', delivered='0', cost_price='10.00', purchase_price='12.00', min_stock_level='0'):
+        product = Product.objects.create(
+            name=name,
+            unit_type=self.unit,
+            cost_price=Decimal(cost_price),
+            selling_price=Decimal('20.00'),
+            min_stock_level=Decimal(min_stock_level),
+        )
+        if Decimal(received):
+            order = PurchaseOrder.objects.create(
+                supplier=self.supplier,
+                order_date=date(2025, 2, 1),
+                expected_date=date(2025, 2, 1),
+            )
+            PurchaseOrderItem.objects.create(
+                purchase_order=order,
+                product=product,
+                quantity=Decimal(received),
+                unit_price=Decimal(purchase_price),
+                total_price=Decimal(received) * Decimal(purchase_price),
+            )
+            order.receive_goods()
+        if Decimal(delivered):
+            order = SalesOrder.objects.create(
+                order_number=f"SO-{name}",
+                customer=self.customer,
+                order_date=date(2025, 2, 2),
+            )
+            SalesOrderItem.objects.create(
+                sales_order=order,
+                product=product,
+                quantity=Decimal(delivered),
+                unit_price=Decimal('20.00'),
+                total_price=Decimal(delivered) * Decimal('20.00'),
+            )
+            order.mark_delivered()
+        return product
+
+
+class WithStockQuerySetTest(InventoryFixtureMixin, TestCase):
+    """Product.objects.with_stock() annotations"""
+
+    def test_annotations_match_per_product_methods(self):
+        self.create_product('Received', received='50', delivered='20')
+        self.create_product('Never Bought', cost_price='7.00')
+
+        with self.assertNumQueries(1):
+            products = {p.name: p for p in Product.objects.with_stock()}
+
+        received = products['Received']
+        self.assertEqual(received.received_quantity, Decimal('50'))
+        self.assertEqual(received.delivered_quantity, Decimal('20'))
+        self.assertEqual(received.on_hand, Decimal('30'))
+        self.assertEqual(received.last_received_cost, Decimal('12.00'))
+        self.assertEqual(received.stock_value, Decimal('360.00'))
+
+        never_bought = products['Never Bought']
+        self.assertEqual(never_bought.on_hand, Decimal('0'))
+        self.assertIsNone(never_bought.last_received_cost)
+        self.assertEqual(never_bought.unit_cost, Decimal('7.00'))
+        self.assertEqual(never_bought.stock_value, Decimal('0'))
+
+        plain = Product.objects.get(name='Received')
+        self.assertEqual(plain.get_realtime_quantity(), received.on_hand)
+        self.assertEqual(plain.get_total_stock_value(), received.stock_value)
+
+    @override_settings(STOCK_ALLOW_NEGATIVE=True)
+    def test_on_hand_is_never_negative(self):
+        product = self.create_product('Oversold', received='5', delivered='8')
+        self.assertEqual(Product.objects.with_stock().get(pk=product.pk).on_hand, Decimal('0'))
+
+
+class InventoryPageQueryCountTest(InventoryFixtureMixin, TestCase):
+    """Stock pages issue a constant number of queries"""
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def assert_constant_queries(self, url_name):
+        for i in range(2):
+            self.create_product(f'Small {i}', received='10', delivered='1')
+        small = self.count_queries(reverse(url_name))
+        for i in range(8):
+            self.create_product(f'Large {i}', received='10', delivered='1')
+        large = self.count_queries(reverse(url_name))
+        self.assertEqual(small, large)
+
+    def test_stock_list(self):
+        self.assert_constant_queries('stock:stock_list')
+
+    def test_stock_report(self):
+        self.assert_constant_queries('stock:stock_report')
+
+    def test_stock_valuation_report(self):
+        self.assert_constant_queries('stock:stock_valuation_report')
+
+
+class StockListFilterTest(InventoryFixtureMixin, TestCase):
+    """Stock list filtering, sorting, pagination and summary run in SQL"""
+
+    def setUp(self):
+        super().setUp()
+        self.create_product('Healthy', received='50', min_stock_level='10')
+        self.create_product('Low', received='5', min_stock_level='10')
+        self.create_product('Empty', min_stock_level='10')
+
+    def get(self, **params):
+        response = self.client.get(reverse('stock:stock_list'), params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def names(self, response):
+        return [item['product'].name for item in response.context['stock_data']]
+
+    def test_summary_counts_in_one_query(self):
+        with self.assertNumQueries(1):
+            summary = Product.objects.filter(is_active=True).stock_summary()
+        self.assertEqual(summary['total_products'], 3)
+        self.assertEqual(summary['in_stock'], 1)
+        self.assertEqual(summary['low_stock'], 1)
+        self.assertEqual(summary['out_of_stock'], 1)
+        self.assertEqual(summary['total_stock_value'], Decimal('660.00'))
+
+    def test_filter_by_stock_status(self):
+        response = self.get(stock_status='low_stock')
+        self.assertEqual(self.names(response), ['Low'])
+        # Counters still describe the whole selection
+        self.assertEqual(response.context['out_of_stock'], 1)
+
+    def test_filter_by_quantity_and_value_ranges(self):
+        self.assertEqual(self.names(self.get(min_quantity='1', max_quantity='10')), ['Low'])
+        self.assertEqual(self.names(self.get(min_value='100')), ['Healthy'])
+        self.assertEqual(self.names(self.get(min_quantity='not-a-number')), ['Empty', 'Healthy', 'Low'])
+
+    def test_sort_by_quantity(self):
+        self.assertEqual(self.names(self.get(sort='-quantity')), ['Healthy', 'Low', 'Empty'])
+        self.assertEqual(self.names(self.get(sort='quantity')), ['Empty', 'Low', 'Healthy'])
+        self.assertEqual(self.names(self.get(sort='bogus')), ['Empty', 'Healthy', 'Low'])
+
+    def test_paginated(self):
+        for i in range(30):
+            Product.objects.create(name=f'Bulk {i:02d}', unit_type=self.unit)
+        response = self.get(sort='name')
+        self.assertTrue(response.context['is_paginated'])
+        self.assertEqual(len(response.context['stock_data']), 25)
+        self.assertEqual(response.context['total_products'], 33)
+        self.assertContains(response, '?page=2&sort=name')
+
+
+class LowStockTest(InventoryFixtureMixin, TestCase):
+    """Low stock detection and the cached alert feed"""
+
+    def setUp(self):
+        super().setUp()
+        cache.delete(LOW_STOCK_ALERTS_CACHE_KEY)
+
+    def test_low_stock_query_orders_by_severity(self):
+        self.create_product('Healthy', received='50', min_stock_level='10')
+        self.create_product('Half Covered', received='5', min_stock_level='10')
+        self.create_product('Out', min_stock_level='10')
+        self.create_product('No Minimum', received='1')
+
+        with self.assertNumQueries(1):
+            names = [p.name for p in Product.objects.low_stock()[:5]]
+        self.assertEqual(names, ['Out', 'Half Covered'])
+
+    def test_get_low_stock_products_limit(self):
+        for i in range(3):
+            self.create_product(f'Low {i}', min_stock_level='5')
+        alerts = get_low_stock_products(limit=2)
+        self.assertEqual(len(alerts), 2)
+        self.assertEqual(alerts[0]['current_quantity'], Decimal('0'))
+        self.assertEqual(alerts[0]['min_quantity'], Decimal('5'))
+
+    def test_alert_feed_is_cached_until_stock_changes(self):
+        product = self.create_product('Sand', received='2', min_stock_level='10')
+        self.assertEqual([a['product'].name for a in get_low_stock_alerts()], ['Sand'])
+
+        with self.assertNumQueries(0):
+            get_low_stock_alerts()
+
+        order = PurchaseOrder.objects.create(
+            supplier=self.supplier,
+            order_date=date(2025, 2, 3),
+            expected_date=date(2025, 2, 3),
+        )
+        PurchaseOrderItem.objects.create(
+            purchase_order=order,
+            product=product,
+            quantity=Decimal('100'),
+            unit_price=Decimal('12.00'),
+            total_price=Decimal('1200.00'),
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            order.receive_goods()
+
+        self.assertEqual(get_low_stock_alerts(), [])
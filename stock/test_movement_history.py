@@ -0,0 +1,99 @@
+"""
+Test cases for the keyset-paginated stock movement history
+"""
+
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.urls import reverse
+from decimal import Decimal
+from datetime import date, timedelta
+
+from stock.models import StockMovement, StockSnapshot
+from stock.history import movement_history
+from stock.test_balance import StockBalanceTestMixin
+
+
+class MovementHistoryTest(StockBalanceTestMixin, TestCase):
+    """History pages run newest first with a running balance"""
+
+    def add_movements(self, count, start=date(2025, 1, 1)):
+        """Alternating +10 receipts and -4 deliveries, two per day"""
+        StockMovement.objects.bulk_create([
+            StockMovement(
+                product=self.product,
+                movement_type=StockMovement.PURCHASE if index % 2 == 0 else StockMovement.SALE,
+                movement_date=start + timedelta(days=index // 2),
+                quantity=Decimal('10') if index % 2 == 0 else Decimal('-4'),
+                reference=f'REF-{index}',
+            )
+            for index in range(count)
+        ])
+
+    def test_running_balance_across_pages(self):
+        self.add_movements(25)
+        first = movement_history(self.product, page_size=10)
+        rows = first['movements']
+        self.assertTrue(first['is_first_page'])
+        self.assertEqual(rows[0].reference, 'REF-24')
+        self.assertEqual(rows[0].balance, Decimal('82'))
+        self.assertEqual(rows[1].balance, Decimal('72'))
+
+        second = movement_history(self.product, first['next_cursor'], page_size=10)
+        third = movement_history(self.product, second['next_cursor'], page_size=10)
+        self.assertFalse(second['is_first_page'])
+        self.assertEqual(second['movements'][0].reference, 'REF-14')
+        self.assertEqual(second['movements'][0].balance, rows[-1].balance - rows[-1].quantity)
+        self.assertEqual([movement.reference for movement in third['movements']], [f'REF-{index}' for index in range(4, -1, -1)])
+        self.assertEqual(third['movements'][-1].balance, Decimal('10'))
+        self.assertIsNone(third['next_cursor'])
+
+    def test_same_day_movements_not_skipped(self):
+        StockMovement.objects.bulk_create([
+            StockMovement(product=self.product, movement_type=StockMovement.PURCHASE,
+                          movement_date=date(2025, 1, 1), quantity=Decimal('1'), reference=f'REF-{index}')
+            for index in range(7)
+        ])
+        seen, cursor = [], None
+        while True:
+            page = movement_history(self.product, cursor, page_size=3)
+            seen += [movement.reference for movement in page['movements']]
+            cursor = page['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(seen, [f'REF-{index}' for index in range(6, -1, -1)])
+
+    def test_first_page_balance_uses_snapshot(self):
+        self.add_movements(4)
+        StockSnapshot.objects.create(product=self.product, snapshot_date=date(2025, 1, 1), quantity=Decimal('106'))
+        rows = movement_history(self.product)['movements']
+        self.assertEqual(rows[0].balance, Decimal('112'))
+        self.assertEqual([movement.balance for movement in rows], [Decimal('112'), Decimal('116'), Decimal('106'), Decimal('110')])
+
+    def test_later_page_query_count_is_constant(self):
+        self.add_movements(200)
+        cursor = movement_history(self.product, page_size=20)['next_cursor']
+        with self.assertNumQueries(1):
+            movement_history(self.product, cursor, page_size=20)
+
+    def test_tampered_cursor_restarts_from_newest(self):
+        self.add_movements(5)
+        page = movement_history(self.product, 'forged:cursor', page_size=2)
+        self.assertTrue(page['is_first_page'])
+        self.assertEqual(page['movements'][0].reference, 'REF-4')
+
+    def test_detail_pages_show_history(self):
+        user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.force_login(user)
+        purchase = self.create_purchase('100')
+        purchase.receive_goods()
+        self.create_sale('30').mark_delivered()
+
+        response = self.client.get(reverse('stock:stock_detail', args=[self.product.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, reverse('purchases:order_detail', args=[purchase.pk]))
+        self.assertEqual([movement.balance for movement in response.context['history']['movements']],
+                         [Decimal('70'), Decimal('100')])
+
+        response = self.client.get(reverse('stock:product_detail', args=[self.product.pk]), {'movements': 'bad'})
+        self.assertContains(response, 'Movement History')
+        self.assertEqual(len(response.context['history']['movements']), 2)
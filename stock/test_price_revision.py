@@ -0,0 +1,131 @@
+"""
+Test cases for bulk price revisions
+"""
+
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.models import User
+from django.db import connection
+from django.urls import reverse
+from decimal import Decimal
+
+from stock.models import Product, ProductCategory, ProductBrand, UnitType, PriceRevision, ProductPriceHistory
+from stock.forms import PriceRevisionForm
+from stock.pricing import preview_price_revision, apply_price_revision
+
+
+class PriceRevisionTest(TestCase):
+    """Revisions reprice products in SQL and record before/after prices"""
+
+    def setUp(self):
+        self.unit = UnitType.objects.create(code='bag', name='Bag')
+        self.binders = ProductCategory.objects.create(name='Binders')
+        self.steel = ProductCategory.objects.create(name='Steel')
+        self.cement = self.product('Cement', '450.00', self.binders)
+        self.lime = self.product('Lime', '99.99', self.binders)
+        self.rod = self.product('Rod', '95.00', self.steel)
+
+    def product(self, name, selling_price, category, **kwargs):
+        return Product.objects.create(
+            name=name, unit_type=self.unit, category=category,
+            selling_price=Decimal(selling_price), cost_price=Decimal('10.00'), **kwargs
+        )
+
+    def price(self, product, field='selling_price'):
+        return getattr(Product.objects.get(pk=product.pk), field)
+
+    def test_percentage_increase(self):
+        revision = apply_price_revision(
+            Product.objects.filter(category=self.binders), 'selling_price', 'percent', Decimal('7.5')
+        )
+        self.assertEqual(self.price(self.cement), Decimal('483.75'))
+        self.assertEqual(self.price(self.lime), Decimal('107.49'))
+        self.assertEqual(self.price(self.rod), Decimal('95.00'))
+        self.assertEqual(revision.product_count, 2)
+        history = {change.product_id: change for change in revision.changes.all()}
+        self.assertEqual(history[self.cement.pk].old_price, Decimal('450.00'))
+        self.assertEqual(history[self.cement.pk].new_price, Decimal('483.75'))
+
+    def test_amount_never_goes_below_zero(self):
+        apply_price_revision(Product.objects.all(), 'selling_price', 'amount', Decimal('-100'))
+        self.assertEqual(self.price(self.cement), Decimal('350.00'))
+        self.assertEqual(self.price(self.lime), Decimal('0'))
+        self.assertEqual(self.price(self.rod), Decimal('0'))
+
+    def test_rounding_only_records_changed_products(self):
+        revision = apply_price_revision(
+            Product.objects.all(), 'selling_price', 'none', Decimal('0'), round_to=Decimal('5')
+        )
+        self.assertEqual(self.price(self.lime), Decimal('100.00'))
+        self.assertEqual(self.price(self.cement), Decimal('450.00'))
+        self.assertEqual(revision.product_count, 1)
+        self.assertEqual(list(revision.changes.values_list('product_id', flat=True)), [self.lime.pk])
+
+    def test_cost_price_revision(self):
+        apply_price_revision(Product.objects.filter(pk=self.rod.pk), 'cost_price', 'percent', Decimal('-10'))
+        self.assertEqual(self.price(self.rod, 'cost_price'), Decimal('9.00'))
+        self.assertEqual(self.price(self.rod), Decimal('95.00'))
+
+    def test_preview_writes_nothing(self):
+        preview = preview_price_revision(Product.objects.all(), 'selling_price', 'amount', Decimal('1'))
+        self.assertEqual(preview['count'], 3)
+        self.assertEqual(preview['old_total'], Decimal('644.99'))
+        self.assertEqual(preview['new_total'], Decimal('647.99'))
+        self.assertEqual([product.name for product in preview['sample']], ['Cement', 'Lime', 'Rod'])
+        self.assertEqual(preview['sample'][0].new_price, Decimal('451.00'))
+        self.assertEqual(self.price(self.cement), Decimal('450.00'))
+        self.assertFalse(PriceRevision.objects.exists())
+
+    def test_single_update_for_all_products(self):
+        for index in range(50):
+            self.product(f'Tile {index}', '10.00', self.steel)
+        with CaptureQueriesContext(connection) as context:
+            revision = apply_price_revision(Product.objects.all(), 'selling_price', 'percent', Decimal('10'))
+        self.assertEqual(revision.product_count, 53)
+        updates = [query for query in context.captured_queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertLess(len(context.captured_queries), 10)
+
+    def test_form_validation(self):
+        form = PriceRevisionForm(data={'field': 'selling_price', 'change_type': 'percent'})
+        self.assertFalse(form.is_valid())
+        self.assertIn('value', form.errors)
+
+        form = PriceRevisionForm(data={'field': 'selling_price', 'change_type': 'percent', 'value': '-100'})
+        self.assertFalse(form.is_valid())
+
+        form = PriceRevisionForm(data={'field': 'selling_price', 'change_type': 'none'})
+        self.assertIn('round_to', form.errors)
+
+        brand = ProductBrand.objects.create(name='Holcim')
+        Product.objects.filter(pk=self.cement.pk).update(brand=brand)
+        self.product('Retired', '1.00', self.binders, is_active=False)
+        form = PriceRevisionForm(data={
+            'field': 'selling_price', 'change_type': 'amount', 'value': '5',
+            'category': self.binders.pk, 'brand': brand.pk,
+        })
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(list(form.get_products()), [Product.objects.get(pk=self.cement.pk)])
+        self.assertEqual(form.get_description(), 'Binders, Holcim')
+
+    def test_preview_then_apply_views(self):
+        user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.force_login(user)
+        data = {'field': 'selling_price', 'change_type': 'percent', 'value': '10', 'category': self.steel.pk}
+
+        response = self.client.post(reverse('stock:price_revision'), data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['preview']['count'], 1)
+        self.assertEqual(self.price(self.rod), Decimal('95.00'))
+
+        response = self.client.post(reverse('stock:price_revision'), {**data, 'apply': ''})
+        revision = PriceRevision.objects.get()
+        self.assertRedirects(response, reverse('stock:price_revision_detail', args=[revision.pk]))
+        self.assertEqual(revision.created_by, user)
+        self.assertEqual(self.price(self.rod), Decimal('104.50'))
+
+        response = self.client.get(reverse('stock:price_revision_detail', args=[revision.pk]))
+        self.assertContains(response, '104.50')
+        response = self.client.get(reverse('stock:price_revision_list'))
+        self.assertContains(response, 'Steel, all brands')
+        self.assertEqual(ProductPriceHistory.objects.count(), 1)
@@ -0,0 +1,182 @@
+"""
+Test cases for bulk product import from CSV and XLSX files
+"""
+
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.urls import reverse
+from decimal import Decimal
+from io import BytesIO, StringIO
+import tempfile
+
+from openpyxl import Workbook
+
+from stock.models import Product, ProductBrand, ProductCategory, UnitType
+from stock.importer import import_products
+from stock.search import search_product_ids
+
+HEADER = 'sku,name,category,brand,unit,cost_price,selling_price,is_active\n'
+
+
+def csv_file(*lines):
+    return BytesIO((HEADER + ''.join(line + '\n' for line in lines)).encode())
+
+
+class ProductImportTest(TestCase):
+    """Rows are upserted on SKU and problems reported per row"""
+
+    def setUp(self):
+        self.unit = UnitType.objects.create(code='bag', name='Bag')
+
+    def test_creates_products_and_references(self):
+        result = import_products(csv_file(
+            'CEM-1,Portland Cement,Binders,Holcim,bag,400,450,yes',
+            'ROD-10,Steel Rod 10mm,Steel,,KG,85.5,95,',
+        ), 'prices.csv')
+
+        self.assertEqual((result.created, result.updated, result.error_count), (2, 0, 0))
+        cement = Product.objects.get(sku='CEM-1')
+        self.assertEqual(cement.unit_type, self.unit)
+        self.assertEqual(cement.brand.name, 'Holcim')
+        self.assertEqual(cement.selling_price, Decimal('450'))
+        rod = Product.objects.get(sku='ROD-10')
+        self.assertEqual(rod.unit_type.code, 'kg')
+        self.assertIsNone(rod.brand)
+        self.assertTrue(rod.is_active)
+        self.assertEqual(ProductCategory.objects.count(), 2)
+        self.assertIn(cement.pk, search_product_ids('portland'))
+
+    def test_existing_sku_is_updated(self):
+        import_products(csv_file('CEM-1,Portland Cement,Binders,Holcim,bag,400,450,yes'), 'prices.csv')
+        product = Product.objects.get(sku='CEM-1')
+
+        result = import_products(csv_file(
+            'CEM-1,Portland Cement 50kg,Binders,Holcim,bag,420,480,no',
+            'CEM-2,White Cement,Binders,Holcim,bag,600,700,yes',
+        ), 'prices.csv')
+        self.assertEqual((result.created, result.updated), (1, 1))
+        product.refresh_from_db()
+        self.assertEqual(product.name, 'Portland Cement 50kg')
+        self.assertEqual(product.cost_price, Decimal('420'))
+        self.assertFalse(product.is_active)
+        self.assertEqual(ProductBrand.objects.count(), 1)
+
+    def test_invalid_rows_reported_and_skipped(self):
+        result = import_products(csv_file(
+            'CEM-1,Portland Cement,,,bag,400,450,yes',
+            'CEM-2,,,,bag,400,450,yes',
+            'CEM-3,Sand,,,bag,abc,450,yes',
+            'CEM-4,Gravel,,,bag,500,450,yes',
+            'CEM-5,Bricks,,,bag,1.005,2,yes',
+            'CEM-6,Tiles,,,bag,1,2,maybe',
+        ), 'prices.csv')
+
+        self.assertEqual(result.created, 1)
+        self.assertEqual([row for row, _ in result.errors], [3, 4, 5, 6, 7])
+        self.assertIn('name is required', result.errors[0][1])
+        self.assertIn('not a number', result.errors[1][1])
+        self.assertIn('less than cost price', result.errors[2][1])
+
+    def test_unknown_references_rejected_without_create(self):
+        result = import_products(csv_file(
+            'CEM-1,Portland Cement,,Holcim,bag,400,450,yes',
+        ), 'prices.csv', create_references=False)
+        self.assertEqual(result.errors, [(2, 'Unknown brand "Holcim".')])
+        self.assertFalse(ProductBrand.objects.exists())
+
+    def test_rejected_row_creates_no_references(self):
+        result = import_products(csv_file(
+            'CEM-1,Portland Cement,Binders,Holcim,sack,400,450,maybe',
+        ), 'prices.csv')
+        self.assertIn('should be yes or no', result.errors[0][1])
+        self.assertFalse(ProductCategory.objects.exists())
+        self.assertFalse(ProductBrand.objects.exists())
+        self.assertEqual(list(UnitType.objects.values_list('code', flat=True)), ['bag'])
+
+    def test_repeated_sku_keeps_last_row(self):
+        result = import_products(csv_file(
+            'CEM-1,First,,,bag,1,2,yes',
+            'CEM-1,Second,,,bag,1,2,yes',
+        ), 'prices.csv')
+        self.assertEqual(result.created, 1)
+        self.assertEqual(Product.objects.get(sku='CEM-1').name, 'Second')
+
+    def test_queries_grow_per_batch_not_per_row(self):
+        lines = [f'SKU-{index},Product {index},Binders,Holcim,bag,1,2,yes' for index in range(200)]
+        with CaptureQueriesContext(connection) as context:
+            result = import_products(csv_file(*lines), 'prices.csv', batch_size=100)
+        self.assertEqual(result.created, 200)
+        self.assertLess(len(context.captured_queries), 40)
+
+    def test_xlsx_file(self):
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(['SKU', 'Name', 'Unit', 'Cost Price', 'Selling Price'])
+        sheet.append(['CEM-1', 'Portland Cement', 'bag', 400.1, 450])
+        sheet.append([None, None, None, None, None])
+        sheet.append(['CEM-2', None, 'bag', 1, 2])
+        content = BytesIO()
+        workbook.save(content)
+        content.seek(0)
+
+        result = import_products(content, 'prices.xlsx')
+        self.assertEqual(result.created, 1)
+        self.assertEqual(result.errors, [(4, 'name is required.')])
+        self.assertEqual(Product.objects.get(sku='CEM-1').cost_price, Decimal('400.10'))
+
+    def test_import_page(self):
+        user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.force_login(user)
+        upload = SimpleUploadedFile('prices.csv', csv_file('CEM-1,Portland Cement,,,bag,400,450,yes').getvalue())
+        response = self.client.post(reverse('stock:product_import'), {'file': upload, 'create_references': 'on'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['result'].created, 1)
+
+        upload = SimpleUploadedFile('prices.txt', b'sku,name,unit\n')
+        response = self.client.post(reverse('stock:product_import'), {'file': upload})
+        self.assertFormError(response.context['form'], 'file', 'Upload a .csv or .xlsx file.')
+
+        upload = SimpleUploadedFile('prices.csv', b'sku,title\nA,B\n')
+        response = self.client.post(reverse('stock:product_import'), {'file': upload})
+        self.assertFormError(response.context['form'], 'file', 'Missing required columns: name, unit')
+
+    def test_management_command(self):
+        with tempfile.NamedTemporaryFile(suffix='.csv') as handle:
+            handle.write(csv_file('CEM-1,Portland Cement,,,bag,400,450,yes', 'CEM-2,,,,bag,1,2,yes').getvalue())
+            handle.flush()
+            out, err = StringIO(), StringIO()
+            call_command('import_products', handle.name, stdout=out, stderr=err)
+        self.assertIn('Imported 1 products', out.getvalue())
+        self.assertIn('Row 3: name is required.', err.getvalue())
+
+
+class ProductSkuFormTest(TestCase):
+    """Products saved from the product form without a SKU store NULL"""
+
+    def setUp(self):
+        self.unit = UnitType.objects.create(code='bag', name='Bag')
+
+    def data(self, sku):
+        return {
+            'name': 'Portland Cement', 'sku': sku, 'unit_type': self.unit.pk,
+            'cost_price': '400', 'selling_price': '450', 'min_stock_level': '0', 'is_active': 'on',
+        }
+
+    def test_blank_sku_on_create(self):
+        for sku in ('', '   '):
+            response = self.client.post(reverse('stock:product_create'), self.data(sku))
+            self.assertRedirects(response, reverse('stock:product_list'), fetch_redirect_response=False)
+        self.assertEqual(list(Product.objects.values_list('sku', flat=True)), [None, None])
+
+    def test_blank_sku_on_update(self):
+        product = Product.objects.create(name='Portland Cement', sku='CEM-1', unit_type=self.unit)
+        for sku in ('', '   '):
+            Product.objects.filter(pk=product.pk).update(sku='CEM-1')
+            response = self.client.post(reverse('stock:product_edit', args=[product.pk]), self.data(sku))
+            self.assertRedirects(response, reverse('stock:product_list'), fetch_redirect_response=False)
+            product.refresh_from_db()
+            self.assertIsNone(product.sku)
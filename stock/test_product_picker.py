@@ -0,0 +1,131 @@
+"""
+Test cases for the autocomplete product picker on order line formsets
+"""
+
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.models import User
+from django.db import connection
+from django.urls import reverse
+from decimal import Decimal
+
+from stock.models import Product, ProductCategory
+from sales.forms import SalesOrderItemFormSet
+from purchases.forms import PurchaseOrderItemFormSet
+from stock.test_balance import StockBalanceTestMixin
+
+
+class ProductPickerTest(StockBalanceTestMixin, TestCase):
+    """Order line forms resolve only the submitted products"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.force_login(self.user)
+
+    def add_products(self, count, **kwargs):
+        return Product.objects.bulk_create([
+            Product(name=f'Extra {index}', unit_type=self.unit, **kwargs) for index in range(count)
+        ])
+
+    def line_data(self, prefix, products, initial=0):
+        data = {
+            f'{prefix}-TOTAL_FORMS': str(len(products)),
+            f'{prefix}-INITIAL_FORMS': str(initial),
+            f'{prefix}-MIN_NUM_FORMS': '0',
+            f'{prefix}-MAX_NUM_FORMS': '1000',
+        }
+        for index, product in enumerate(products):
+            data.update({
+                f'{prefix}-{index}-product': str(product.pk),
+                f'{prefix}-{index}-quantity': '2',
+                f'{prefix}-{index}-unit_price': '10.00',
+            })
+        return data
+
+    def validation_queries(self, products):
+        formset = SalesOrderItemFormSet(self.line_data('items', products), prefix='items')
+        with CaptureQueriesContext(connection) as context:
+            self.assertTrue(formset.is_valid(), formset.errors)
+        return context.captured_queries
+
+    def test_validation_does_not_grow_with_catalog(self):
+        lines = self.add_products(3)
+        small_catalog = len(self.validation_queries(lines))
+        self.add_products(200)
+        self.assertEqual(len(self.validation_queries(lines)), small_catalog)
+
+    def test_submitted_products_loaded_in_one_query(self):
+        lines = self.add_products(5)
+        queries = self.validation_queries(lines)
+        product_selects = [
+            query for query in queries
+            if query['sql'].startswith('SELECT "stock_product"."id"') and 'INNER JOIN "stock_unittype"' in query['sql']
+        ]
+        self.assertEqual(len(product_selects), 1)
+
+    def test_inactive_product_rejected_on_new_line(self):
+        inactive = Product.objects.create(name='Retired', unit_type=self.unit, is_active=False)
+        formset = SalesOrderItemFormSet(self.line_data('items', [inactive]), prefix='items')
+        self.assertFalse(formset.is_valid())
+        self.assertIn('product', formset.forms[0].errors)
+
+    def test_existing_line_keeps_deactivated_product(self):
+        order = self.create_purchase('5')
+        item = order.items.get()
+        Product.objects.filter(pk=self.product.pk).update(is_active=False)
+
+        data = self.line_data('items', [self.product], initial=1)
+        data['items-0-id'] = str(item.pk)
+        formset = PurchaseOrderItemFormSet(data, instance=order, prefix='items')
+        self.assertTrue(formset.is_valid(), formset.errors)
+
+    def test_unknown_product_id_is_invalid(self):
+        data = self.line_data('items', [self.product])
+        data['items-0-product'] = '999999'
+        formset = SalesOrderItemFormSet(data, prefix='items')
+        self.assertFalse(formset.is_valid())
+
+    def test_create_page_does_not_render_catalog(self):
+        self.add_products(30)
+        for url_name, search_url in (
+            ('sales:order_create', 'stock:product_search_json'),
+            ('sales:instant_sales', 'stock:product_search_json'),
+            ('purchases:order_create', 'stock:product_purchase_search_json'),
+        ):
+            response = self.client.get(reverse(url_name))
+            self.assertEqual(response.status_code, 200)
+            self.assertNotContains(response, 'Extra 7')
+            self.assertContains(response, 'product-autocomplete')
+            self.assertContains(response, reverse(search_url))
+
+    def test_purchase_cost_only_on_purchase_entry(self):
+        for url_name in ('sales:order_create', 'sales:instant_sales'):
+            response = self.client.get(reverse(url_name))
+            self.assertNotContains(response, reverse('stock:product_purchase_search_json'))
+            self.assertNotContains(response, reverse('stock:product_purchase_catalog_json'))
+        response = self.client.get(reverse('purchases:order_create'))
+        self.assertContains(response, reverse('stock:product_purchase_catalog_json'))
+
+        response = self.client.get(reverse('stock:product_search_json'), {'q': 'cem'})
+        self.assertNotIn('cost_price', response.json()['results'][0])
+        response = self.client.get(reverse('stock:product_purchase_search_json'), {'q': 'cem'})
+        self.assertEqual(Decimal(response.json()['results'][0]['cost_price']), self.product.cost_price)
+
+    def test_edit_page_renders_selected_product(self):
+        order = self.create_purchase('5')
+        response = self.client.get(reverse('purchases:order_edit', args=[order.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'value="Cement (bag)"')
+
+    def test_search_endpoint_filters_by_category(self):
+        category = ProductCategory.objects.create(name='Binders')
+        Product.objects.create(name='White Cement', unit_type=self.unit, category=category)
+        self.add_products(3)
+
+        response = self.client.get(reverse('stock:product_search_json'), {'category': category.pk})
+        self.assertEqual([row['name'] for row in response.json()['results']], ['White Cement'])
+
+        response = self.client.get(reverse('stock:product_search_json'), {'category': category.pk, 'q': 'cem'})
+        results = response.json()['results']
+        self.assertEqual([row['name'] for row in results], ['White Cement'])
@@ -0,0 +1,127 @@
+"""
+Test cases for the reorder suggestion engine
+"""
+
+from django.test import TestCase, override_settings
+from django.core.management import call_command
+from django.urls import reverse
+from decimal import Decimal
+from datetime import date, timedelta
+from io import StringIO
+
+import numpy as np
+
+from stock.models import Product, ReorderSuggestion
+from stock.reorder import compute_reorder_suggestions, sales_velocity
+from stock.test_balance import StockBalanceTestMixin
+
+AS_OF = date(2025, 3, 31)
+
+
+@override_settings(
+    STOCK_REORDER_LOOKBACK_DAYS=365,
+    STOCK_REORDER_LEAD_TIME_DAYS=7,
+    STOCK_REORDER_REVIEW_DAYS=30,
+    STOCK_REORDER_SERVICE_FACTOR=1.65,
+)
+class ReorderSuggestionTest(StockBalanceTestMixin, TestCase):
+    """Suggestions follow delivered sales velocity and the stock position"""
+
+    def sell_daily(self, quantity, days):
+        for offset in range(days):
+            self.create_sale(quantity, order_date=AS_OF - timedelta(days=offset)).mark_delivered()
+
+    def suggestion(self, product=None):
+        return ReorderSuggestion.objects.get(product=product or self.product)
+
+    def test_steady_demand_below_reorder_point(self):
+        self.create_purchase('330').receive_goods()
+        self.sell_daily('10', 28)
+
+        self.assertEqual(compute_reorder_suggestions(as_of=AS_OF), 1)
+        suggestion = self.suggestion()
+        self.assertEqual(suggestion.average_daily_demand, Decimal('10.0000'))
+        self.assertEqual(suggestion.demand_std, Decimal('0.0000'))
+        self.assertEqual(suggestion.on_hand, Decimal('50.00'))
+        self.assertEqual(suggestion.days_of_cover, Decimal('5.0'))
+        self.assertEqual(suggestion.reorder_point, Decimal('70.00'))
+        # Ten a day over lead time plus review period, less stock on hand
+        self.assertEqual(suggestion.suggested_quantity, Decimal('320.00'))
+
+    def test_open_purchase_orders_count_towards_position(self):
+        self.create_purchase('330').receive_goods()
+        self.sell_daily('10', 28)
+        self.create_purchase('300')
+
+        compute_reorder_suggestions(as_of=AS_OF)
+        suggestion = self.suggestion()
+        self.assertEqual(suggestion.on_order, Decimal('300.00'))
+        self.assertEqual(suggestion.suggested_quantity, Decimal('0.00'))
+
+    def test_only_delivered_sales_in_lookback_count(self):
+        self.create_purchase('100').receive_goods()
+        self.create_sale('40', order_date=AS_OF)
+        self.create_sale('40', order_date=AS_OF).cancel_order()
+        self.create_sale('40', order_date=AS_OF - timedelta(days=400)).mark_delivered()
+        self.create_sale('40', order_date=AS_OF + timedelta(days=1)).mark_delivered()
+
+        compute_reorder_suggestions(as_of=AS_OF)
+        suggestion = self.suggestion()
+        self.assertEqual(suggestion.average_daily_demand, Decimal('0.0000'))
+        self.assertEqual(suggestion.ewma_daily_demand, Decimal('0.0000'))
+        self.assertIsNone(suggestion.days_of_cover)
+        self.assertEqual(suggestion.suggested_quantity, Decimal('0.00'))
+
+    def test_inactive_products_skipped_and_old_rows_replaced(self):
+        retired = Product.objects.create(name='Retired', unit_type=self.unit)
+        compute_reorder_suggestions(as_of=AS_OF)
+        self.assertTrue(ReorderSuggestion.objects.filter(product=retired).exists())
+
+        Product.objects.filter(pk=retired.pk).update(is_active=False)
+        self.assertEqual(compute_reorder_suggestions(as_of=AS_OF), 1)
+        self.assertFalse(ReorderSuggestion.objects.filter(product=retired).exists())
+
+    def test_query_count_does_not_grow_with_products(self):
+        Product.objects.bulk_create([Product(name=f'Extra {index}', unit_type=self.unit) for index in range(50)])
+        with self.assertNumQueries(8):
+            compute_reorder_suggestions(as_of=AS_OF)
+        self.assertEqual(ReorderSuggestion.objects.count(), 51)
+
+    def test_page_lists_products_to_order(self):
+        quiet = Product.objects.create(name='Quiet Product', unit_type=self.unit)
+        self.create_purchase('330').receive_goods()
+        self.sell_daily('10', 28)
+        compute_reorder_suggestions(as_of=AS_OF)
+
+        response = self.client.get(reverse('stock:reorder_suggestions'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row.product for row in response.context['suggestions']], [self.product])
+
+        response = self.client.get(reverse('stock:reorder_suggestions'), {'show': 'all'})
+        self.assertEqual([row.product for row in response.context['suggestions']], [self.product, quiet])
+
+    def test_management_command(self):
+        out = StringIO()
+        call_command('compute_reorder_suggestions', '--as-of', AS_OF.isoformat(), stdout=out)
+        self.assertIn('1 products', out.getvalue())
+        self.assertEqual(self.suggestion().as_of, AS_OF)
+
+
+class SalesVelocityTest(TestCase):
+    """Velocity statistics over sparse daily sales arrays"""
+
+    def test_constant_demand(self):
+        lookback = 60
+        age = np.arange(lookback)
+        index = np.zeros(lookback, dtype=np.int64)
+        average, std, ewma = sales_velocity(index, age, np.full(lookback, 4.0), 2, lookback)
+        np.testing.assert_allclose(average, [4, 0])
+        np.testing.assert_allclose(std, [0, 0])
+        np.testing.assert_allclose(ewma, [4, 0])
+
+    def test_recent_sales_weigh_more(self):
+        index = np.array([0, 1], dtype=np.int64)
+        age = np.array([1, 20])
+        average, std, ewma = sales_velocity(index, age, np.array([28.0, 28.0]), 2, 365)
+        np.testing.assert_allclose(average, [1, 1])
+        self.assertGreater(ewma[0], ewma[1])
@@ -0,0 +1,80 @@
+"""
+Test cases for the product search index and typeahead endpoint
+"""
+
+from django.test import TestCase
+from django.core.management import call_command
+from django.db import connection
+from django.urls import reverse
+from decimal import Decimal
+from io import StringIO
+
+from stock.models import Product, ProductBrand, ProductCategory, UnitType
+from stock.search import SEARCH_TABLE, search_product_ids
+
+
+class ProductSearchTest(TestCase):
+    """The search index follows catalog edits and ranks name matches first"""
+
+    def setUp(self):
+        self.unit = UnitType.objects.create(code='bag', name='Bag')
+        self.brand = ProductBrand.objects.create(name='Shah')
+        self.category = ProductCategory.objects.create(name='Cement')
+        self.cement = Product.objects.create(
+            name='Portland Cement 50kg', brand=self.brand, category=self.category,
+            unit_type=self.unit, selling_price=Decimal('520.00'),
+        )
+        self.sand = Product.objects.create(
+            name='River Sand', unit_type=self.unit, description='Mixes well with cement',
+        )
+
+    def names(self, query, **kwargs):
+        return [Product.objects.get(pk=pk).name for pk in search_product_ids(query, **kwargs)]
+
+    def test_matches_all_fields_with_name_ranked_first(self):
+        self.assertEqual(self.names('cement'), ['Portland Cement 50kg', 'River Sand'])
+        self.assertEqual(self.names('shah'), ['Portland Cement 50kg'])
+
+    def test_last_term_is_a_prefix(self):
+        self.assertEqual(self.names('portl'), ['Portland Cement 50kg'])
+        self.assertEqual(self.names('river s'), ['River Sand'])
+        self.assertEqual(self.names('"); DROP TABLE x; --'), [])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.sand.name = 'Coarse Sand'
+        self.sand.is_active = False
+        self.sand.save()
+        self.assertEqual(self.names('coarse'), [])
+        self.assertEqual(self.names('coarse', active_only=False), ['Coarse Sand'])
+
+        self.brand.name = 'Bashundhara'
+        self.brand.save()
+        self.assertEqual(self.names('bashundhara'), ['Portland Cement 50kg'])
+
+        self.cement.delete()
+        self.assertEqual(self.names('portland'), [])
+
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+        self.assertEqual(self.names('river'), [])
+
+        out = StringIO()
+        call_command('rebuild_product_search', stdout=out)
+        self.assertIn('Indexed 2 products', out.getvalue())
+        self.assertEqual(self.names('river'), ['River Sand'])
+
+    def test_typeahead_endpoint(self):
+        response = self.client.get(reverse('stock:product_search_json'), {'q': 'cem', 'limit': '1'})
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]['id'], self.cement.pk)
+        self.assertEqual(results[0]['brand'], 'Shah')
+        self.assertEqual(results[0]['unit'], 'bag')
+        self.assertEqual(Decimal(results[0]['on_hand']), Decimal('0'))
+
+    def test_product_list_search_uses_index(self):
+        response = self.client.get(reverse('stock:product_list'), {'search': 'shah'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([p.name for p in response.context['products']], ['Portland Cement 50kg'])
@@ -0,0 +1,188 @@
+"""
+Test cases for the stock movement journal and as-of-date inventory
+"""
+
+from django.test import TestCase, override_settings
+from django.core.management import call_command
+from django.contrib.auth.models import User
+from django.urls import reverse
+from decimal import Decimal
+from datetime import date
+from io import StringIO
+
+from stock.models import Product, StockMovement, StockSnapshot
+from stock.test_balance import StockBalanceTestMixin
+from purchases.services import transition_purchase_orders
+from sales.models import SalesOrderItem
+from sales.services import save_sales_order, transition_sales_orders
+
+
+class StockJournalPostingTest(StockBalanceTestMixin, TestCase):
+    """Order status changes append movements"""
+
+    def movements(self):
+        return list(StockMovement.objects.filter(product=self.product).values_list('movement_type', 'quantity', 'unit_cost'))
+
+    def test_receive_and_deliver_post_movements(self):
+        purchase = self.create_purchase('100', unit_price='450.00')
+        purchase.receive_goods()
+        self.create_sale('30').mark_delivered()
+
+        self.assertEqual(self.movements(), [
+            ('purchase', Decimal('100'), Decimal('450.00')),
+            ('sale', Decimal('-30'), None),
+        ])
+        movement = StockMovement.objects.first()
+        self.assertEqual(movement.reference, purchase.order_number)
+        self.assertEqual(movement.source_id, purchase.pk)
+        # Dated like rebuild() dates them, not by when the status changed
+        self.assertEqual(movement.movement_date, purchase.order_date)
+
+    def test_cancel_posts_reversal(self):
+        purchase = self.create_purchase('100')
+        purchase.receive_goods()
+        purchase.cancel_order()
+
+        self.assertEqual(self.movements(), [
+            ('purchase', Decimal('100'), Decimal('450.00')),
+            ('purchase', Decimal('-100'), None),
+        ])
+
+    def test_cancel_open_order_posts_nothing(self):
+        self.create_sale('5').cancel_order()
+        self.assertFalse(StockMovement.objects.exists())
+
+    @override_settings(STOCK_ALLOW_NEGATIVE=True)
+    def test_delete_posts_reversal(self):
+        sale = self.create_sale('20')
+        sale.mark_delivered()
+        sale_id = sale.pk
+        sale.delete()
+
+        reversal = StockMovement.objects.last()
+        self.assertEqual(reversal.quantity, Decimal('20'))
+        self.assertEqual(reversal.source_id, sale_id)
+
+    def test_rebuild_command_regenerates_journal(self):
+        self.create_purchase('100', status='goods-received', order_date=date(2025, 1, 10))
+        self.create_sale('30', status='delivered', order_date=date(2025, 1, 20))
+        StockSnapshot.objects.create(product=self.product, snapshot_date=date(2025, 1, 31), quantity=Decimal('999'))
+
+        out = StringIO()
+        call_command('rebuild_stock_journal', stdout=out)
+
+        self.assertIn('2 stock movements', out.getvalue())
+        self.assertFalse(StockSnapshot.objects.exists())
+        self.assertEqual(
+            list(StockMovement.objects.values_list('movement_date', 'quantity')),
+            [(date(2025, 1, 10), Decimal('100')), (date(2025, 1, 20), Decimal('-30'))],
+        )
+
+    def test_rebuild_keeps_as_of_quantities(self):
+        self.create_purchase('100', order_date=date(2025, 1, 10)).receive_goods()
+        transition_purchase_orders([self.create_purchase('50', order_date=date(2025, 2, 10)).pk], 'goods-received')
+        self.create_sale('30', order_date=date(2025, 1, 20)).mark_delivered()
+        cancelled = self.create_sale('5', order_date=date(2025, 1, 25))
+        cancelled.mark_delivered()
+        cancelled.cancel_order()
+        transition_sales_orders([self.create_sale('10', order_date=date(2025, 2, 15)).pk], 'delivered')
+        # Edited after delivery: delivered on a later date, one unit more
+        edited = self.create_sale('4', order_date=date(2025, 1, 22))
+        edited.mark_delivered()
+        edited.delivery_date = date(2025, 2, 20)
+        save_sales_order(edited, [SalesOrderItem(product=self.product, quantity=Decimal('5'), unit_price=Decimal('500.00'))])
+
+        days = [date(2025, 1, 9), date(2025, 1, 10), date(2025, 1, 22), date(2025, 1, 31), date(2025, 2, 19), date(2025, 2, 28)]
+
+        def on_hand():
+            return [Product.objects.with_stock_as_of(day).get(pk=self.product.pk).on_hand for day in days]
+
+        posted = on_hand()
+        self.assertEqual(posted, [Decimal('0'), Decimal('100'), Decimal('70'), Decimal('70'), Decimal('110'), Decimal('105')])
+        call_command('rebuild_stock_journal', stdout=StringIO())
+        self.assertEqual(on_hand(), posted)
+
+
+class StockAsOfTest(StockBalanceTestMixin, TestCase):
+    """Inventory as of a past date from snapshots plus movements"""
+
+    def setUp(self):
+        super().setUp()
+        self.post(StockMovement.PURCHASE, '100', date(2025, 1, 5), unit_cost='400.00')
+        self.post(StockMovement.SALE, '-30', date(2025, 1, 20))
+        self.post(StockMovement.PURCHASE, '50', date(2025, 2, 10), unit_cost='480.00')
+        self.post(StockMovement.SALE, '-10', date(2025, 2, 15))
+
+    def post(self, movement_type, quantity, movement_date, unit_cost=None):
+        costs = {self.product.pk: Decimal(unit_cost)} if unit_cost else None
+        StockMovement.post(movement_type, {self.product.pk: Decimal(quantity)}, unit_costs=costs, movement_date=movement_date)
+
+    def as_of(self, as_of):
+        return Product.objects.with_stock_as_of(as_of).get(pk=self.product.pk)
+
+    def test_as_of_without_snapshots(self):
+        product = self.as_of(date(2025, 1, 31))
+        self.assertEqual(product.on_hand, Decimal('70'))
+        self.assertEqual(product.unit_cost, Decimal('400.00'))
+        self.assertEqual(product.stock_value, Decimal('28000.00'))
+
+        self.assertEqual(self.as_of(date(2025, 2, 28)).on_hand, Decimal('110'))
+        self.assertEqual(self.as_of(date(2025, 2, 28)).unit_cost, Decimal('480.00'))
+
+    def test_before_any_movement_uses_cost_price(self):
+        product = self.as_of(date(2024, 12, 31))
+        self.assertEqual(product.on_hand, Decimal('0'))
+        self.assertEqual(product.unit_cost, Decimal('400.00'))
+
+    def test_snapshot_plus_delta_matches_full_scan(self):
+        expected = {d: self.as_of(d).on_hand for d in (date(2025, 1, 31), date(2025, 2, 12), date(2025, 3, 1))}
+
+        call_command('take_stock_snapshots', since=date(2025, 1, 1), date=date(2025, 2, 28), stdout=StringIO())
+        self.assertEqual(
+            list(StockSnapshot.objects.order_by('snapshot_date').values_list('snapshot_date', 'quantity')),
+            [(date(2025, 1, 31), Decimal('70')), (date(2025, 2, 28), Decimal('110'))],
+        )
+        # Snapshot rows are authoritative: older movements are not re-read
+        StockMovement.objects.filter(movement_date__lte=date(2025, 1, 31)).delete()
+        for as_of, quantity in expected.items():
+            self.assertEqual(self.as_of(as_of).on_hand, quantity)
+
+    def test_backdated_movement_adjusts_later_snapshots(self):
+        StockSnapshot.take(date(2025, 1, 31))
+        self.post(StockMovement.SALE, '-5', date(2025, 1, 25))
+
+        snapshot = StockSnapshot.objects.get(product=self.product, snapshot_date=date(2025, 1, 31))
+        self.assertEqual(snapshot.quantity, Decimal('65'))
+        self.assertEqual(self.as_of(date(2025, 1, 31)).on_hand, Decimal('65'))
+
+
+class StockReportAsOfViewTest(StockBalanceTestMixin, TestCase):
+    """Stock reports accept an as_of date"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.login(username='testuser', password='testpass123')
+        StockMovement.post(
+            StockMovement.PURCHASE, {self.product.pk: Decimal('40')},
+            unit_costs={self.product.pk: Decimal('450.00')}, movement_date=date(2025, 1, 5),
+        )
+
+    def test_stock_report_as_of(self):
+        response = self.client.get(reverse('stock:stock_report'), {'as_of': '2025-01-31'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['as_of'], date(2025, 1, 31))
+        item = response.context['report_data'][0]
+        self.assertEqual(item['quantity'], Decimal('40'))
+        self.assertEqual(item['value'], Decimal('18000.00'))
+
+    def test_valuation_report_as_of(self):
+        response = self.client.get(reverse('stock:stock_valuation_report'), {'as_of': '2025-01-01'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['valuation_data'], [])
+        self.assertEqual(response.context['total_value'], Decimal('0'))
+
+    def test_invalid_as_of_shows_current_stock(self):
+        response = self.client.get(reverse('stock:stock_report'), {'as_of': '2025-02-30'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.context['as_of'])
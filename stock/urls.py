@@ -14,6 +14,16 @@ urlpatterns = [
     # Product Management
     path('products/', views.ProductListView.as_view(), name='product_list'),
     path('products/create/', views.ProductCreateView.as_view(), name='product_create'),
+    path('products/import/', views.ProductImportView.as_view(), name='product_import'),
+    path('products/price-revision/', views.PriceRevisionView.as_view(), name='price_revision'),
+    path('products/price-revisions/', views.PriceRevisionListView.as_view(), name='price_revision_list'),
+    path('products/price-revisions/<int:pk>/', views.PriceRevisionDetailView.as_view(), name='price_revision_detail'),
+    path('products/search.json', views.product_search_json, name='product_search_json'),
+    path('products/catalog.json', views.product_catalog_json, name='product_catalog_json'),
+    # Variants with purchase cost, for the purchase entry page only
+    path('products/purchase-search.json', views.product_search_json, {'with_costs': True}, name='product_purchase_search_json'),
+    path('products/purchase-catalog.json', views.product_catalog_json, {'with_costs': True}, name='product_purchase_catalog_json'),
+    path('products/availability.json', views.product_availability_json, name='product_availability_json'),
     path('products/<int:pk>/', views.ProductDetailView.as_view(), name='product_detail'),
     path('products/<int:pk>/edit/', views.ProductUpdateView.as_view(), name='product_edit'),
     path('products/<int:pk>/delete/', views.ProductDeleteView.as_view(), name='product_delete'),
@@ -40,6 +50,7 @@ urlpatterns = [
     # Stock Management (now shows real-time inventory)
     path('stock/', views.StockListView.as_view(), name='stock_list'),
     path('stock/<int:pk>/', views.StockDetailView.as_view(), name='stock_detail'),
+    path('reorder-suggestions/', views.ReorderSuggestionListView.as_view(), name='reorder_suggestions'),
     # StockUpdateView removed - inventory is now real-time only
     
     # Stock Alerts
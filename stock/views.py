@@ -1,23 +1,35 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
+from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView, FormView
 from django.urls import reverse_lazy
 from django.db import models
 from django.db.models import Sum, Count, Q, F
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from django.contrib import messages
+from django.core.paginator import Paginator
+from django.http import HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
 from datetime import datetime, timedelta
 from decimal import Decimal
-from .models import ProductCategory, ProductBrand, UnitType, Product, get_low_stock_products
+from .models import (
+    ProductCategory, ProductBrand, UnitType, Product, ReorderSuggestion, PriceRevision, get_low_stock_products,
+    STOCK_STATUS_IN, STOCK_STATUS_LOW, STOCK_STATUS_OUT,
+)
+from .search import filter_products, search_product_ids
+from .catalog import get_catalog_payload
+from .importer import IMPORT_COLUMNS, ProductImportError, import_products
+from .pricing import preview_price_revision, apply_price_revision
+from .history import movement_history
 from .forms import (
     ProductForm, ProductCategoryForm, ProductBrandForm, UnitTypeForm, 
-    ProductSearchForm, StockReportForm
+    ProductSearchForm, StockReportForm, ProductImportForm, PriceRevisionForm
 )
 from sales.models import SalesOrderItem
 from purchases.models import PurchaseOrderItem
 
-
-
-
+PRODUCT_SEARCH_LIMIT = 10
+PRODUCT_SEARCH_MAX_LIMIT = 50
+PRODUCT_AVAILABILITY_MAX_IDS = 200
 
 
 class ProductListView(ListView):
@@ -46,10 +58,10 @@ class ProductListView(ListView):
         elif status == 'inactive':
             queryset = queryset.filter(is_active=False)
         
-        # Search by name
+        # Search name, brand, category and description through the search index
         search = self.request.GET.get('search')
         if search:
-            queryset = queryset.filter(name__icontains=search)
+            queryset = filter_products(queryset, search)
         
         return queryset.order_by('name')
     
@@ -64,7 +76,97 @@ class ProductListView(ListView):
         return context
 
 
-class ProductDetailView(DetailView):
+def product_search_json(request, with_costs=False):
+    """
+    Typeahead: top ranked active products for ?q=, at most ?limit= (default 10, max 50).
+    ?category= and ?brand= narrow the results; with either set, matches are listed
+    by name and an empty q lists the whole category or brand. Purchase cost is
+    only included for the purchase entry URL (``with_costs``).
+    """
+    try:
+        limit = min(max(int(request.GET.get('limit', PRODUCT_SEARCH_LIMIT)), 1), PRODUCT_SEARCH_MAX_LIMIT)
+    except ValueError:
+        limit = PRODUCT_SEARCH_LIMIT
+    query = request.GET.get('q', '')
+    category = request.GET.get('category', '')
+    brand = request.GET.get('brand', '')
+    if category.isdigit() or brand.isdigit():
+        matches = Product.objects.filter(is_active=True)
+        if category.isdigit():
+            matches = matches.filter(category_id=category)
+        if brand.isdigit():
+            matches = matches.filter(brand_id=brand)
+        if query.strip():
+            matches = filter_products(matches, query)
+        product_ids = list(matches.order_by('name').values_list('pk', flat=True)[:limit])
+    else:
+        product_ids = search_product_ids(query, limit=limit)
+    products = Product.objects.select_related('brand', 'category', 'unit_type').with_stock().in_bulk(product_ids)
+    results = [
+        {
+            'id': product.pk,
+            'name': product.name,
+            'brand': product.brand.name if product.brand else '',
+            'category': product.category.name if product.category else '',
+            'unit': product.unit_type.code,
+            'selling_price': str(product.selling_price),
+            'on_hand': str(product.on_hand),
+            **({'cost_price': str(product.cost_price)} if with_costs else {}),
+        }
+        for product in (products[pk] for pk in product_ids if pk in products)
+    ]
+    return JsonResponse({'results': results})
+
+
+def product_catalog_json(request, with_costs=False):
+    """
+    Active product catalog for client-side filtering on order entry pages,
+    with purchase cost only for the purchase entry URL (``with_costs``).
+    Browsers must revalidate each time; unchanged catalogs answer 304.
+    """
+    _, etag, content = get_catalog_payload(with_costs)
+    response = HttpResponse(content, content_type='application/json')
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return get_conditional_response(request, etag=etag, response=response)
+
+
+def product_availability_json(request):
+    """
+    Available-to-promise figures for the products in ?ids= (comma separated,
+    at most 200) in one query. ?exclude_order= leaves that sales order's own
+    lines out of the committed quantity, for the order being edited.
+    """
+    ids = [int(pk) for pk in request.GET.get('ids', '').split(',') if pk.strip().isdigit()]
+    ids = list(dict.fromkeys(ids))[:PRODUCT_AVAILABILITY_MAX_IDS]
+    exclude_order = request.GET.get('exclude_order', '')
+    rows = (
+        Product.objects.filter(pk__in=ids)
+        .with_availability(exclude_sales_order=int(exclude_order) if exclude_order.isdigit() else None)
+        .values_list('pk', 'on_hand', 'committed_quantity', 'on_order_quantity', 'available_to_promise')
+    ) if ids else []
+    results = {
+        pk: {
+            'on_hand': str(on_hand),
+            'committed': str(committed),
+            'on_order': str(on_order),
+            'available': str(available),
+        }
+        for pk, on_hand, committed, on_order, available in rows
+    }
+    return JsonResponse({'results': results})
+
+
+class MovementHistoryMixin:
+    """Adds a keyset-paginated page of the product's stock movements (?movements=<cursor>)"""
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['history'] = movement_history(self.object, self.request.GET.get('movements'))
+        return context
+
+
+class ProductDetailView(MovementHistoryMixin, DetailView):
     model = Product
     template_name = 'stock/product_detail.html'
 
@@ -103,6 +205,93 @@ class ProductUpdateView(UpdateView):
         return super().form_valid(form)
 
 
+class ProductImportView(FormView):
+    """Create or update products in bulk from an uploaded CSV/XLSX price list, matched on SKU"""
+    form_class = ProductImportForm
+    template_name = 'stock/product_import.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['columns'] = IMPORT_COLUMNS
+        return context
+
+    def form_valid(self, form):
+        upload = form.cleaned_data['file']
+        try:
+            result = import_products(
+                upload, upload.name, create_references=form.cleaned_data['create_references']
+            )
+        except ProductImportError as e:
+            form.add_error('file', str(e))
+            return self.form_invalid(form)
+        except Exception as e:
+            messages.error(self.request, f"Error importing products: {str(e)}")
+            return self.form_invalid(form)
+
+        if result.error_count:
+            messages.warning(self.request, f"Imported {result.imported} products; {result.error_count} rows were skipped.")
+        else:
+            messages.success(self.request, f"Imported {result.imported} products successfully!")
+        return self.render_to_response(self.get_context_data(form=form, result=result))
+
+
+class PriceRevisionView(FormView):
+    """
+    Bulk price change for a category/brand. Submitting previews the result
+    (nothing is saved); the Apply button reprices everything in one transaction.
+    """
+    form_class = PriceRevisionForm
+    template_name = 'stock/price_revision.html'
+
+    def form_valid(self, form):
+        rule = {
+            'field': form.cleaned_data['field'],
+            'change_type': form.cleaned_data['change_type'],
+            'value': form.cleaned_data['value'],
+            'round_to': form.cleaned_data['round_to'],
+        }
+        if 'apply' not in self.request.POST:
+            preview = preview_price_revision(form.get_products(), **rule)
+            return self.render_to_response(self.get_context_data(form=form, preview=preview))
+
+        try:
+            revision = apply_price_revision(
+                form.get_products(), description=form.get_description(),
+                user=self.request.user if self.request.user.is_authenticated else None, **rule,
+            )
+        except Exception as e:
+            messages.error(self.request, f"Error revising prices: {str(e)}")
+            return self.form_invalid(form)
+        messages.success(self.request, f"Prices of {revision.product_count} products revised successfully!")
+        return redirect('stock:price_revision_detail', revision.pk)
+
+
+class PriceRevisionListView(ListView):
+    """Past bulk price revisions"""
+    model = PriceRevision
+    template_name = 'stock/price_revision_list.html'
+    context_object_name = 'revisions'
+    paginate_by = 25
+
+    def get_queryset(self):
+        return PriceRevision.objects.select_related('created_by').order_by('-created_at')
+
+
+class PriceRevisionDetailView(DetailView):
+    """Before/after prices of one revision, paginated"""
+    model = PriceRevision
+    template_name = 'stock/price_revision_detail.html'
+    context_object_name = 'revision'
+    changes_per_page = 50
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        changes = self.object.changes.select_related('product').order_by('product__name', 'pk')
+        context['page_obj'] = Paginator(changes, self.changes_per_page).get_page(self.request.GET.get('page'))
+        context['changes'] = context['page_obj'].object_list
+        return context
+
+
 class ProductDeleteView(DeleteView):
     model = Product
     template_name = 'stock/product_confirm_delete.html'
@@ -110,69 +299,110 @@ class ProductDeleteView(DeleteView):
 
 
 class StockListView(ListView):
-    """List view for products with real-time inventory"""
+    """
+    Paginated list of active products with real-time inventory. Filtering
+    (search, category, brand, stock status, on-hand quantity and value
+    ranges), sorting and the summary counters all run in SQL.
+    """
     model = Product
     template_name = 'stock/stock_list.html'
     context_object_name = 'products'
-    
+    paginate_by = 25
+
+    # ?sort= values; ties are broken by name
+    SORT_FIELDS = {
+        'name': 'name',
+        'quantity': 'on_hand',
+        'value': 'stock_value',
+        'status': 'stock_status',
+        'category': 'category__name',
+    }
+    DEFAULT_SORT = 'name'
+
+    def get_base_queryset(self):
+        """Active products narrowed by search, category and brand"""
+        queryset = Product.objects.filter(is_active=True)
+        params = self.request.GET
+        if params.get('search'):
+            queryset = filter_products(queryset, params['search'])
+        if params.get('category', '').isdigit():
+            queryset = queryset.filter(category_id=params['category'])
+        if params.get('brand', '').isdigit():
+            queryset = queryset.filter(brand_id=params['brand'])
+        return queryset
+
+    def get_decimal_param(self, name):
+        try:
+            value = Decimal(self.request.GET.get(name, ''))
+        except (ArithmeticError, ValueError):
+            return None
+        return value if value.is_finite() else None
+
+    def get_sort(self):
+        sort = self.request.GET.get('sort', self.DEFAULT_SORT)
+        if sort.lstrip('-') not in self.SORT_FIELDS:
+            sort = self.DEFAULT_SORT
+        return sort
+
     def get_queryset(self):
-        return Product.objects.filter(is_active=True).select_related('category', 'brand')
-    
+        queryset = self.get_base_queryset().select_related('category', 'brand', 'unit_type').with_stock_status()
+
+        status = self.request.GET.get('stock_status')
+        if status in (STOCK_STATUS_IN, STOCK_STATUS_LOW, STOCK_STATUS_OUT):
+            queryset = queryset.filter(stock_status=status)
+        for param, lookup in (
+            ('min_quantity', 'on_hand__gte'),
+            ('max_quantity', 'on_hand__lte'),
+            ('min_value', 'stock_value__gte'),
+            ('max_value', 'stock_value__lte'),
+        ):
+            value = self.get_decimal_param(param)
+            if value is not None:
+                queryset = queryset.filter(**{lookup: value})
+
+        sort = self.get_sort()
+        field = self.SORT_FIELDS[sort.lstrip('-')]
+        ordering = f'-{field}' if sort.startswith('-') else field
+        return queryset.order_by(ordering, 'name', 'pk')
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        products = self.get_queryset()
-        
-        # Calculate summary statistics using real-time inventory
-        stock_data = []
-        total_products = 0
-        in_stock = 0
-        low_stock = 0
-        out_of_stock = 0
-        total_stock_value = Decimal('0')
-        
-        for product in products:
-            qty = product.get_realtime_quantity()
-            total_products += 1
-            
-            # Calculate total stock value
-            total_stock_value += product.get_total_stock_value()
-            
-            if qty <= 0:
-                out_of_stock += 1
-                status = 'out_of_stock'
-            elif qty <= product.min_stock_level:
-                low_stock += 1
-                status = 'low_stock'
-            else:
-                in_stock += 1
-                status = 'in_stock'
-            
-            stock_data.append({
+
+        context['stock_data'] = [
+            {
                 'product': product,
-                'quantity': qty,
-                'status': status
-            })
-        
-        context.update({
-            'stock_data': stock_data,
-            'total_products': total_products,
-            'in_stock': in_stock,
-            'low_stock': low_stock,
-            'out_of_stock': out_of_stock,
-            'total_stock_value': total_stock_value,
-        })
-        
+                'quantity': product.on_hand,
+                'value': product.stock_value,
+                'status': product.stock_status,
+            }
+            for product in context['products']
+        ]
+        # Counters cover the search/category/brand selection, not the status or range filters
+        context.update(self.get_base_queryset().stock_summary())
+
+        params = self.request.GET.copy()
+        params.pop('page', None)
+        context['query_params'] = params.urlencode()
+        params.pop('sort', None)
+        context['filter_params'] = params.urlencode()
+        context['current_sort'] = self.get_sort()
+        context['current'] = {
+            name: self.request.GET.get(name, '')
+            for name in ('search', 'category', 'brand', 'stock_status', 'min_quantity', 'max_quantity', 'min_value', 'max_value')
+        }
+        context['categories'] = ProductCategory.objects.filter(is_active=True).order_by('name')
+        context['brands'] = ProductBrand.objects.filter(is_active=True).order_by('name')
         return context
 
 
-class StockDetailView(DetailView):
-    """Show product details with real-time inventory"""
+class StockDetailView(MovementHistoryMixin, DetailView):
+    """Show product details with real-time inventory and movement history"""
     model = Product
     template_name = 'stock/stock_detail.html'
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        product = self.get_object()
+        product = self.object
         context['current_qty'] = product.get_realtime_quantity()
         context['total_value'] = product.get_total_stock_value()
         return context
@@ -181,6 +411,38 @@ class StockDetailView(DetailView):
 # StockUpdateView removed - inventory is now real-time only
 
 
+class ReorderSuggestionListView(ListView):
+    """
+    Stored reorder suggestions (python manage.py compute_reorder_suggestions),
+    products closest to running out first. Only products with a suggested
+    quantity are listed unless ?show=all.
+    """
+    model = ReorderSuggestion
+    template_name = 'stock/reorder_suggestions.html'
+    context_object_name = 'suggestions'
+    paginate_by = 25
+
+    def get_queryset(self):
+        queryset = ReorderSuggestion.objects.select_related(
+            'product', 'product__category', 'product__brand', 'product__unit_type'
+        )
+        if self.request.GET.get('show') != 'all':
+            queryset = queryset.filter(suggested_quantity__gt=0)
+        if self.request.GET.get('search'):
+            queryset = queryset.filter(product__in=filter_products(Product.objects.all(), self.request.GET['search']))
+        return queryset.order_by(F('days_of_cover').asc(nulls_last=True), '-suggested_quantity', 'product__name')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['show_all'] = self.request.GET.get('show') == 'all'
+        context['search'] = self.request.GET.get('search', '')
+        context['latest'] = ReorderSuggestion.objects.order_by('-computed_at').first()
+        params = self.request.GET.copy()
+        params.pop('page', None)
+        context['query_params'] = params.urlencode()
+        return context
+
+
 
 
 # Category Management Views
@@ -305,6 +567,14 @@ class ProductBrandDeleteView(DeleteView):
 # To adjust inventory, create purchase orders (to increase) or cancel sales (to decrease)
 
 
+def get_report_as_of(request):
+    """Report date from the ``as_of`` GET parameter (YYYY-MM-DD), or None for current stock"""
+    try:
+        return parse_date(request.GET.get('as_of', ''))
+    except ValueError:
+        return None
+
+
 class StockReportView(ListView):
     """Stock report using real-time inventory"""
     model = Product
@@ -312,7 +582,7 @@ class StockReportView(ListView):
     context_object_name = 'products'
     
     def get_queryset(self):
-        queryset = Product.objects.filter(is_active=True).select_related('category', 'brand')
+        queryset = Product.objects.filter(is_active=True).select_related('category', 'brand', 'unit_type')
         
         # Apply filters from form if provided
         category = self.request.GET.get('category')
@@ -323,26 +593,33 @@ class StockReportView(ListView):
         if brand:
             queryset = queryset.filter(brand_id=brand)
         
-        return queryset
+        as_of = get_report_as_of(self.request)
+        if as_of:
+            return queryset.with_stock_as_of(as_of)
+        return queryset.with_stock()
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        products = self.get_queryset()
+        products = context['products']
         
         report_data = []
         for product in products:
-            qty = product.get_realtime_quantity()
-            value = product.get_total_stock_value()
+            qty = product.on_hand
             status = 'out_of_stock' if qty <= 0 else 'low_stock' if qty <= product.min_stock_level else 'in_stock'
             
             report_data.append({
                 'product': product,
                 'quantity': qty,
-                'value': value,
+                'value': product.stock_value,
                 'status': status
             })
         
         context['report_data'] = report_data
+        context['categories'] = ProductCategory.objects.filter(is_active=True).order_by('name')
+        context['brands'] = ProductBrand.objects.filter(is_active=True).order_by('name')
+        context['current_category'] = self.request.GET.get('category', '')
+        context['current_brand'] = self.request.GET.get('brand', '')
+        context['as_of'] = get_report_as_of(self.request)
         return context
 
 
@@ -353,29 +630,32 @@ class StockValuationReportView(ListView):
     context_object_name = 'products'
     
     def get_queryset(self):
-        return Product.objects.filter(is_active=True).select_related('category', 'brand')
+        queryset = Product.objects.filter(is_active=True).select_related('category', 'brand', 'unit_type')
+        as_of = get_report_as_of(self.request)
+        if as_of:
+            return queryset.with_stock_as_of(as_of)
+        return queryset.with_stock()
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        products = self.get_queryset()
+        products = context['products']
         
-        total_value = 0
+        total_value = Decimal('0')
         valuation_data = []
         for product in products:
-            qty = product.get_realtime_quantity()
-            value = product.get_total_stock_value()
-            total_value += value
+            total_value += product.stock_value
             
-            if qty > 0:
+            if product.on_hand > 0:
                 valuation_data.append({
                     'product': product,
-                    'quantity': qty,
-                    'unit_cost': product.cost_price,
-                    'total_value': value
+                    'quantity': product.on_hand,
+                    'unit_cost': product.unit_cost,
+                    'total_value': product.stock_value
                 })
         
         context['valuation_data'] = valuation_data
         context['total_value'] = total_value
+        context['as_of'] = get_report_as_of(self.request)
         return context
 
 
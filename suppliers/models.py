@@ -1,10 +1,12 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.utils import timezone
 from decimal import Decimal
 
+from core.ledgers import BalanceHolderMixin, LedgerBalanceMixin
 
-class Supplier(models.Model):
+
+class Supplier(BalanceHolderMixin, models.Model):
     name = models.CharField(max_length=200)
     contact_person = models.CharField(max_length=100, blank=True)
     phone = models.CharField(max_length=20, blank=True)
@@ -20,28 +22,30 @@ class Supplier(models.Model):
         return self.name
     
     def set_opening_balance(self, amount, user=None):
-        """Set opening balance and create ledger entry"""
-        self.opening_balance = amount
-        self.current_balance = amount
-        self.save()
-        
-        # Create opening balance ledger entry
-        SupplierLedger.objects.create(
-            supplier=self,
-            transaction_type='opening_balance',
-            amount=amount,
-            description=f"Opening balance set to ৳{amount}",
-            reference="OPENING",
-            transaction_date=timezone.now(),
-            created_by=user
-        )
+        """Set opening balance, replacing the opening balance ledger entry"""
+        with transaction.atomic():
+            self.opening_balance = amount
+            self.save(update_fields=['opening_balance', 'updated_at'])
+
+            # The ledger entries post the change to current_balance
+            SupplierLedger.objects.filter(supplier=self, transaction_type='opening_balance').delete()
+            SupplierLedger.objects.create(
+                supplier=self,
+                transaction_type='opening_balance',
+                amount=amount,
+                description=f"Opening balance set to ৳{amount}",
+                reference="OPENING",
+                transaction_date=timezone.now(),
+                created_by=user
+            )
+        self.refresh_from_db(fields=['current_balance'])
 
     class Meta:
         verbose_name = "Supplier"
         verbose_name_plural = "Suppliers"
 
 
-class SupplierLedger(models.Model):
+class SupplierLedger(LedgerBalanceMixin, models.Model):
     TRANSACTION_TYPES = [
         ('opening_balance', 'Opening Balance'),
         ('purchase', 'Purchase'),
@@ -58,6 +62,17 @@ class SupplierLedger(models.Model):
         ('other', 'Other'),
     ]
     
+    # Effect of each transaction type on Supplier.current_balance (see core.ledgers);
+    # commission entries are informational
+    BALANCE_PARTY = 'supplier'
+    BALANCE_SIGNS = {
+        'opening_balance': 1,
+        'purchase': 1,
+        'adjustment': 1,
+        'payment': -1,
+        'return': -1,
+    }
+
     supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE)
     transaction_type = models.CharField(max_length=20, choices=TRANSACTION_TYPES)
     amount = models.DecimalField(max_digits=15, decimal_places=2)
@@ -74,5 +89,9 @@ class SupplierLedger(models.Model):
     class Meta:
         verbose_name = "Supplier Ledger"
         verbose_name_plural = "Supplier Ledgers"
+        indexes = [
+            models.Index(fields=['supplier', 'transaction_date']),
+            models.Index(fields=['transaction_date']),
+        ]
 
 
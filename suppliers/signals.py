@@ -0,0 +1,12 @@
+# Take deleted ledger entries back out of Supplier.current_balance (core.ledgers);
+# saves post themselves in SupplierLedger.save().
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from core.ledgers import ledger_entry_deleted
+from .models import SupplierLedger
+
+
+@receiver(post_delete, sender=SupplierLedger)
+def unpost_deleted_entry(sender, instance, **kwargs):
+    ledger_entry_deleted(sender, instance)
@@ -5,6 +5,7 @@ from django.db.models import Q, Sum
 from django.utils import timezone
 from django.contrib import messages
 from decimal import Decimal
+from core.ledgers import signed_amount
 from .models import Supplier, SupplierLedger
 from .forms import SupplierForm, SupplierLedgerForm, SetOpeningBalanceForm
 from purchases.models import PurchaseOrder
@@ -84,9 +85,18 @@ class SupplierLedgerCreateView(CreateView):
     def form_valid(self, form):
         form.instance.supplier_id = self.kwargs['supplier_id']
         form.instance.created_by = self.request.user
-        return super().form_valid(form)
+        response = super().form_valid(form)
 
+        # Saving the entry posted it to the supplier's balance
+        supplier = form.instance.supplier
+        supplier.refresh_from_db(fields=['current_balance'])
+        messages.success(
+            self.request,
+            f'Ledger entry created successfully for {supplier.name}. '
+            f'New balance: ৳{supplier.current_balance}'
+        )
 
+        return response
 
 
 class SupplierLedgerDetailView(DetailView):
@@ -120,18 +130,10 @@ class SupplierLedgerDetailView(DetailView):
         # Manual Ledger Entries
         ledger_entries = SupplierLedger.objects.filter(supplier=supplier).order_by('-transaction_date')
         for entry in ledger_entries:
-            if entry.transaction_type == 'purchase':
-                debit = entry.amount
-                credit = Decimal('0.00')
-            elif entry.transaction_type == 'payment':
-                debit = Decimal('0.00')
-                credit = entry.amount
-            elif entry.transaction_type == 'opening_balance':
-                debit = entry.amount if entry.amount > 0 else Decimal('0.00')
-                credit = abs(entry.amount) if entry.amount < 0 else Decimal('0.00')
-            else:
-                debit = entry.amount if entry.amount > 0 else Decimal('0.00')
-                credit = abs(entry.amount) if entry.amount < 0 else Decimal('0.00')
+            # Same effect as on current_balance: payments and returns are credits
+            amount = signed_amount(SupplierLedger, entry.transaction_type, entry.amount)
+            debit = amount if amount > 0 else Decimal('0.00')
+            credit = -amount if amount < 0 else Decimal('0.00')
             
             transactions.append({
                 'date': entry.transaction_date.date(),